@@ -68,8 +68,8 @@ deployment = ManagedOnlineDeployment(
     model=model,
     environment=env,
     code_configuration=CodeConfiguration(
-        code=".",            # directory containing score.py and model file
-        scoring_script="score.py",
+        code="..",           # repository root: score.py imports the feature plan from src/
+        scoring_script="deployment/score.py",
     ),
     instance_type="Standard_DS2_v2",
     instance_count=1,
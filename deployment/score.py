@@ -1,14 +1,49 @@
 # deployment/score.py
 
 import json
-import joblib
 import numpy as np
-import pandas as pd
 import os
+import sys
+
+# The deployment code root is the repository root, so src/ is importable
+SCORE_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.abspath(os.path.join(SCORE_DIR, ".."))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from src.batching import DEFAULT_MAX_BATCH_ROWS, MicroBatcher
+from src.explain import DEFAULT_TOP_K, explanation_rows, top_contributions
+from src.instrumentation import METRICS, stage
+from src.predictor import BoosterPredictor
+from src.request_formats import ColumnIndex, binary_format, decompress
+from src.response_formats import NDJSON_CONTENT_TYPE, RESPONSE_FORMATS, encode_ndjson, encode_results
+from src.result_cache import DEFAULT_TTL_SECONDS, PredictionCache, file_fingerprint
+from src.thresholding import THRESHOLD_CONFIG_FILENAME, load_threshold_config
+from src.tree_ensemble import TreeEnsemble
+# pandas (and src.feature_engineering) are imported only for raw-readout requests, see load_feature_plan()
+
+try:  # provided by azureml-inference-server-http; needed only to stream NDJSON responses
+    from azureml.contrib.services.aml_response import AMLResponse
+except ImportError:
+    AMLResponse = None
 
 model = None
-BEST_THRESHOLD = 0.51
+PREDICTOR = None
+BATCHER = None
+CACHE = None
+BEST_THRESHOLD = None  # from threshold_config.json in init()
 FEATURE_COLS = None
+FEATURE_PLAN = None
+COLUMN_INDEX = None
+# Response layout when the request does not set "response" (e.g. binary bodies)
+RESPONSE_FORMAT = os.getenv("SCORE_RESPONSE_FORMAT", "rows")
+STREAM_CHUNK_ROWS = int(os.getenv("SCORE_STREAM_CHUNK_ROWS", "4096"))
+# Features per row returned for {"explain": true}
+EXPLAIN_TOP_K = int(os.getenv("SCORE_EXPLAIN_TOP_K", str(DEFAULT_TOP_K)))
+# Per-path (Saabas) attributions instead of exact TreeSHAP: ~4x faster, approximate
+EXPLAIN_APPROX = os.getenv("SCORE_EXPLAIN_APPROX", "0") == "1"
+# Model format to serve: pickled XGBClassifier, native UBJSON booster or exported tree arrays
+SCORE_BACKENDS = {"xgboost", "native", "arrays"}
 
 def init():
     # global model, FEATURE_COLS
@@ -22,14 +57,49 @@ def init():
     # print("Model loaded from", model_path)
     # print("Loaded", len(FEATURE_COLS), "feature columns.")
     # print("Using BEST_THRESHOLD =", BEST_THRESHOLD)
-    global model, FEATURE_COLS
+    global model, PREDICTOR, BATCHER, CACHE, BEST_THRESHOLD, FEATURE_COLS, FEATURE_PLAN, COLUMN_INDEX
 
     # Where Azure ML mounts the registered model
     model_dir = os.getenv("AZUREML_MODEL_DIR", ".")
-    model_path = os.path.join(model_dir, "xgb_pdm_finetuned.pkl")
 
-    print(f"Loading model from: {model_path}")
-    model = joblib.load(model_path)
+    backend = os.getenv("SCORE_BACKEND", "xgboost")
+    if backend not in SCORE_BACKENDS:
+        raise ValueError(f"Unknown SCORE_BACKEND '{backend}'; expected one of {', '.join(sorted(SCORE_BACKENDS))}.")
+
+    if backend == "arrays":
+        # Exported tree arrays (scripts/export_serving_model.py): NumPy only, no xgboost / sklearn
+        model_path = _find_file("xgb_pdm_finetuned.npz", model_dir, SCORE_DIR)
+        print(f"Loading tree arrays from: {model_path}")
+        model = None
+        PREDICTOR = TreeEnsemble.load(model_path)
+        print(f"Tree arrays: {PREDICTOR.n_trees} trees, depth {PREDICTOR.max_depth}, "
+              f"{PREDICTOR.n_features} features")
+    elif backend == "native":
+        # Native UBJSON booster (scripts/export_serving_model.py): no unpickling, no sklearn wrapper
+        import xgboost
+
+        model_path = _find_file("xgb_pdm_finetuned.ubj", model_dir, SCORE_DIR)
+        print(f"Loading native booster from: {model_path}")
+        model = xgboost.Booster(model_file=model_path)
+        PREDICTOR = BoosterPredictor(model)
+        print(f"Booster: {PREDICTOR.n_features} features, nthread={PREDICTOR.nthread}")
+    else:
+        import joblib  # unpickling the model imports xgboost + scikit-learn
+
+        model_path = os.path.join(model_dir, "xgb_pdm_finetuned.pkl")
+        print(f"Loading model from: {model_path}")
+        model = joblib.load(model_path)
+
+        # Predict on the native booster (in-place, float32), threads sized for the SKU
+        PREDICTOR = BoosterPredictor(model)
+        print(f"Booster: {PREDICTOR.n_features} features, nthread={PREDICTOR.nthread}, "
+              f"native in-place prediction: {PREDICTOR.native}")
+
+    # Cost-optimal decision threshold (scripts/search_threshold.py); a threshold_config.json
+    # registered with the model takes precedence over the one next to score.py
+    threshold_config_path = _find_file(THRESHOLD_CONFIG_FILENAME, model_dir, SCORE_DIR)
+    BEST_THRESHOLD = load_threshold_config(threshold_config_path)
+    print(f"Loaded threshold from: {threshold_config_path}")
 
     # feature_cols.json should live next to score.py in your deployment folder
     feature_cols_path = os.path.join(os.path.dirname(__file__), "feature_cols.json")
@@ -39,37 +109,260 @@ def init():
         FEATURE_COLS = json.load(f)
 
     print(f"Loaded {len(FEATURE_COLS)} feature columns.")
+    COLUMN_INDEX = ColumnIndex(FEATURE_COLS)
+
+    # Startup-optimized mode: raw-readout support (pandas + feature plan) is set up on
+    # the first raw request instead of here
+    FEATURE_PLAN = None
+    if os.getenv("SCORE_FAST_START", "0") != "1":
+        load_feature_plan()
+
+    if PREDICTOR.n_features != len(FEATURE_COLS):
+        raise ValueError(f"Model expects {PREDICTOR.n_features} features, feature_cols.json has {len(FEATURE_COLS)}.")
+
+    PREDICTOR.warm_up()
+    METRICS.reset()  # warm-up is not traffic
+
+    # Per-stage timing: PDM_METRICS=1 (or json for one log line per stage), see src/instrumentation.py
+    if METRICS.enabled:
+        print(f"Stage metrics on: json_logs={METRICS.json_logs}, track_memory={METRICS.track_memory}")
+
+    # Optional micro-batching of concurrent requests (off unless a max wait is configured).
+    # A batcher from an earlier init() is stopped so its worker thread does not leak.
+    if BATCHER is not None:
+        BATCHER.close()
+        BATCHER = None
+    max_wait_ms = float(os.getenv("SCORE_BATCH_MAX_WAIT_MS", "0"))
+    if max_wait_ms > 0:
+        max_batch_rows = int(os.getenv("SCORE_BATCH_MAX_ROWS", str(DEFAULT_MAX_BATCH_ROWS)))
+        BATCHER = MicroBatcher(PREDICTOR.predict_proba, max_batch_rows=max_batch_rows, max_wait_ms=max_wait_ms)
+        print(f"Micro-batching on: max_wait_ms={max_wait_ms}, max_batch_rows={max_batch_rows}")
+
+    # Optional prediction cache for unchanged feature vectors (off unless SCORE_CACHE_MAX_ENTRIES > 0;
+    # responses carry "cached" only when it is on). Versioned by model content + threshold:
+    # a different model clears it.
+    max_entries = int(os.getenv("SCORE_CACHE_MAX_ENTRIES", "0"))
+    if max_entries > 0:
+        if CACHE is None:
+            CACHE = PredictionCache(max_entries, float(os.getenv("SCORE_CACHE_TTL_S", str(DEFAULT_TTL_SECONDS))))
+        CACHE.set_version(f"model={file_fingerprint(model_path)};threshold={BEST_THRESHOLD}")
+        print(f"Prediction cache on: max_entries={CACHE.max_entries}, ttl_s={CACHE.ttl_seconds}, "
+              f"version={CACHE.version}")
+    else:
+        CACHE = None
+
     print(f"BEST_THRESHOLD = {BEST_THRESHOLD}")
 
+
+def _find_file(filename, *directories):
+    """Path of `filename` in the first directory that has it."""
+    for directory in directories:
+        path = os.path.join(directory, filename)
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(f"{filename} not found in: {list(directories)}")
+
+
+def load_feature_plan():
+    """Precompiled plan for raw-readout requests (scripts/compile_feature_plan.py), loaded once."""
+    global FEATURE_PLAN
+    if FEATURE_PLAN is not None:
+        return FEATURE_PLAN
+
+    from src.feature_engineering import FeaturePlan
+
+    feature_plan_path = os.path.join(os.path.dirname(__file__), "feature_plan.json")
+    if os.path.exists(feature_plan_path):
+        plan = FeaturePlan.load(feature_plan_path)
+    else:
+        plan = FeaturePlan.from_feature_columns(FEATURE_COLS)
+    if plan.feature_columns != FEATURE_COLS:
+        raise ValueError("feature_plan.json does not match feature_cols.json; recompile the plan.")
+    print(f"Feature plan: {len(plan.counter_cols)} counters, "
+          f"{len(plan.histogram_groups)} histogram groups, "
+          f"{len(plan.spec_categories)} spec columns.")
+    FEATURE_PLAN = plan
+    return FEATURE_PLAN
+
+
+def features_from_raw(data):
+    """
+    Compute the feature matrix for a raw request:
+    {"readouts": [{"vehicle_id": ..., "time_step": ..., "171_0": ..., ...}, ...],
+     "specifications": [{"vehicle_id": ..., "Spec_0": "Cat1", ...}, ...]}   # optional
+    All vehicles in the request are featurized together.
+    """
+    import pandas as pd
+
+    plan = load_feature_plan()
+    df_oper = pd.DataFrame(data["readouts"])
+    df_spec = pd.DataFrame(data["specifications"]) if data.get("specifications") else None
+
+    return plan.transform(df_oper, df_spec)
+
+
+def parse_request(raw_data):
+    """
+    Decode a request body: a JSON string / bytes / dict, optionally compressed,
+    or a binary NumPy / Arrow matrix (returned directly as a float32 array).
+    """
+    if isinstance(raw_data, (bytes, bytearray)):
+        raw_data = decompress(bytes(raw_data))
+        if binary_format(raw_data):
+            return COLUMN_INDEX.from_binary(raw_data)
+
+    # Accept both JSON string and dict
+    if isinstance(raw_data, (str, bytes)):
+        return json.loads(raw_data)
+    return raw_data
+
+
+def predict_proba(X):
+    """
+    P(failure) per row, plus a mask of rows served from the prediction cache
+    (None when the cache is off). Misses go through the micro-batcher if enabled.
+    """
+    predict = BATCHER.predict if BATCHER is not None else PREDICTOR.predict_proba
+    if CACHE is None:
+        return predict(X), None
+
+    with stage("score", "cache_lookup"):
+        keys = CACHE.keys_for(X)
+        proba, cached = CACHE.lookup(keys)
+    if not cached.all():
+        miss = np.flatnonzero(~cached)
+        proba[miss] = predict(X[miss])
+        CACHE.store([keys[i] for i in miss], proba[miss])
+    return proba, cached
+
+
+def cache_stats():
+    """Hit rate, eviction / expiration counters and size of the prediction cache (None if off)."""
+    return CACHE.stats() if CACHE is not None else None
+
+
+def batching_stats():
+    """Queue depth, batch-size distribution and added wait of the micro-batcher (None if off)."""
+    return BATCHER.stats() if BATCHER is not None else None
+
+
+def explain_top_k(data):
+    """Number of features to explain per row for the request's "explain" field (None: off)."""
+    explain = data.get("explain") if isinstance(data, dict) else None
+    if explain is None or explain is False:
+        return None
+    top_k = EXPLAIN_TOP_K if explain is True else int(explain)
+    return top_k if top_k > 0 else None
+
+
+def explain(X, top_k):
+    """
+    Top-k feature contributions per row: TreeSHAP values in log-odds from the booster
+    (src/explain.py), with the feature values they were computed for.
+    """
+    if not hasattr(PREDICTOR, "contributions"):
+        raise ValueError("explain is not supported by SCORE_BACKEND=arrays; use xgboost or native.")
+    indices, values = top_contributions(PREDICTOR.contributions(X, approx=EXPLAIN_APPROX), top_k)
+    return explanation_rows(indices, values, FEATURE_COLS, X)
+
+
+def iter_ndjson(X, vehicle_ids=None, chunk_rows=None, top_k=None):
+    """
+    Score `X` in chunks of `chunk_rows` rows and yield each chunk's results as NDJSON
+    lines, so the response never holds more than one chunk. An error mid-stream is
+    reported as a final {"error": ...} line (the status has already been sent).
+    """
+    chunk_rows = chunk_rows or STREAM_CHUNK_ROWS
+    try:
+        for start in range(0, len(X), chunk_rows):
+            stop = start + chunk_rows
+            with stage("score", "predict"):
+                proba, cached = predict_proba(X[start:stop])
+            explanations = None
+            if top_k:
+                with stage("score", "explain"):
+                    explanations = explain(X[start:stop], top_k)
+            with stage("score", "serialize"):
+                yield encode_ndjson(
+                    proba, BEST_THRESHOLD, vehicle_ids[start:stop] if vehicle_ids is not None else None, cached,
+                    explanations,
+                )
+    except Exception as e:
+        error_message = f"Error during scoring: {str(e)}"
+        print(error_message)
+        yield json.dumps({"error": error_message}) + "\n"
+
+
+def stream_response(X, vehicle_ids=None, top_k=None):
+    """Chunked NDJSON response (a plain string outside the Azure ML inference server)."""
+    lines = iter_ndjson(X, vehicle_ids, top_k=top_k)
+    if AMLResponse is None:
+        return "".join(lines)
+    return AMLResponse(lines, 200, {"Content-Type": NDJSON_CONTENT_TYPE})
+
+
+def _service_gauges():
+    """Cache and micro-batcher counters as flat gauges for the metrics export."""
+    gauges = {}
+    for name, stats in (("cache", cache_stats()), ("batcher", batching_stats())):
+        for key, value in (stats or {}).items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                gauges[f"{name}_{key}"] = value
+    return gauges
+
+
+def metrics_text():
+    """Stage timings plus cache / batcher gauges in the Prometheus text format."""
+    return METRICS.prometheus_text(gauges=_service_gauges())
+
+
+def metrics_snapshot():
+    """Stage timings (count, mean / p50 / p95 / p99 / max ms) plus cache and batcher stats."""
+    return {"stages": METRICS.snapshot(), "cache": cache_stats(), "batching": batching_stats()}
+
+
 def run(raw_data):
     try:
-        # Accept both JSON string and dict
-        if isinstance(raw_data, (str, bytes)):
-            data = json.loads(raw_data)
-        else:
-            data = raw_data
+        with stage("score", "parse"):
+            data = parse_request(raw_data)
 
-        if "data" not in data:
-            return json.dumps({"error": "Request JSON must contain a 'data' field."})
+        # Metrics request: {"metrics": "json"} or {"metrics": "prometheus"}
+        if isinstance(data, dict) and "metrics" in data:
+            if data["metrics"] == "prometheus":
+                return metrics_text()
+            return json.dumps({"metrics": metrics_snapshot()})
 
-        df = pd.DataFrame(data["data"])
+        vehicle_ids = None
+        layout = RESPONSE_FORMAT
+        if isinstance(data, np.ndarray):
+            X = data
+        else:
+            layout = data.get("response", layout)
+            if "readouts" in data:
+                # Raw mode: per-time-step readouts (+ specs), features computed here
+                with stage("score", "features"):
+                    vehicle_ids, X = features_from_raw(data)
+            else:
+                # Rows, columnar or base64 binary payload -> float32 matrix in FEATURE_COLS order
+                with stage("score", "decode"):
+                    X = COLUMN_INDEX.from_request(data)
 
-        # Reorder / subset to FEATURE_COLS
-        df = df[FEATURE_COLS]
+        if layout not in RESPONSE_FORMATS:
+            raise ValueError(f"Unsupported response format '{layout}'. Expected one of: {list(RESPONSE_FORMATS)}")
+        top_k = explain_top_k(data)
+        if layout == "ndjson":
+            return stream_response(X, vehicle_ids, top_k)
 
-        proba = model.predict_proba(df)[:, 1]
-        labels = (proba >= BEST_THRESHOLD).astype(int)
+        with stage("score", "predict"):
+            proba, cached = predict_proba(X)
 
-        results = [
-            {
-                "failure_probability": float(p),
-                "failure_imminent": bool(l),
-                "threshold_used": BEST_THRESHOLD,
-            }
-            for p, l in zip(proba, labels)
-        ]
+        explanations = None
+        if top_k:
+            with stage("score", "explain"):
+                explanations = explain(X, top_k)
 
-        return json.dumps({"results": results})
+        with stage("score", "serialize"):
+            return encode_results(proba, BEST_THRESHOLD, vehicle_ids, cached, layout, explanations)
 
     except Exception as e:
         error_message = f"Error during scoring: {str(e)}"
@@ -1,7 +1,16 @@
-import pandas as pd
 import json
+import os
+import sys
+
 import requests
 
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, ".."))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from src.feature_io import read_feature_matrix
+
 # Fill with values from Azure ML Studio
 SCORING_URL = "https://scania-pdm-20251123130737.westeurope.inference.ml.azure.com/score" #"<endpoint-scoring-url>"
 API_KEY = "<primary-key>"
@@ -12,21 +21,20 @@ headers = {
 }
 
 # Example payload
-# 1. Load features CSV
+# 1. Load only the model feature columns (memory-mapped; .arrow, .parquet or .csv)
 # Adjust path if needed
-df = pd.read_csv("/home/azureuser/cloudfiles/code/users/rammekjaer/train_vehicle_features.csv")
-
-# 2. Drop non-feature columns
-drop_cols = ["vehicle_id", "in_study_repair"]
-feature_cols = [c for c in df.columns if c not in drop_cols]
+X, _, _ = read_feature_matrix(
+    "/home/azureuser/cloudfiles/code/users/rammekjaer/train_vehicle_features.arrow",
+    feature_cols_path=os.path.join(SCRIPT_DIR, "feature_cols.json"),
+)
 
-# 3. Pick a random row
-sample_row = df.sample(n=1, random_state=42)[feature_cols].iloc[0]
+# 2. Pick a random row
+sample_row = X.sample(n=1, random_state=42).iloc[0]
 
-# 4. Convert to the payload format expected by score.py
+# 3. Convert to the payload format expected by score.py (float32 -> JSON floats)
 payload = {
     "data": [
-        sample_row.to_dict()
+        sample_row.astype(float).to_dict()
     ]
 }
 response = requests.post(SCORING_URL, headers=headers, data=json.dumps(payload))
@@ -0,0 +1,161 @@
+"""
+Offline batch scoring of a feature file with the deployed model.
+
+Uses the same model file, feature_cols.json and decision threshold as
+deployment/score.py. The feature file (.arrow, .parquet or .csv) is streamed in
+chunks; chunks are scored concurrently on a thread pool (XGBoost releases the GIL)
+and written in input order to a columnar output with
+
+    vehicle_id, failure_probability, failure_imminent
+
+At most 2 x --workers chunks are in flight, so memory is bounded by the chunk size,
+not by the file size. Throughput (rows/s) is reported as chunks complete.
+
+Run from the repository root, e.g.:
+
+    python scripts/batch_score.py --input test_vehicle_features.arrow --output fleet_scores.parquet
+    python scripts/batch_score.py --input fleet.csv --output fleet_scores.arrow \\
+        --model-dir ./model --chunk-rows 50000 --workers 4
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Deque, Tuple
+
+import joblib
+import numpy as np
+import pandas as pd
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, ".."))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from src.feature_io import ChunkedTableWriter, iter_feature_table, load_feature_cols, read_column_names
+from src.predictor import BoosterPredictor, serving_threads
+from src.thresholding import THRESHOLD_CONFIG_FILENAME, load_threshold_config
+
+DEPLOYMENT_DIR = os.path.join(REPO_ROOT, "deployment")
+MODEL_FILENAME = "xgb_pdm_finetuned.pkl"
+VEHICLE_COL = "vehicle_id"
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Score a feature file offline with the deployed model.")
+    parser.add_argument("--input", required=True, help="Feature file (.arrow, .parquet or .csv).")
+    parser.add_argument("--output", required=True, help="Scores file (.arrow, .parquet or .csv).")
+    parser.add_argument(
+        "--model-dir",
+        default=os.getenv("AZUREML_MODEL_DIR", "."),
+        help=f"Directory containing {MODEL_FILENAME} (default: $AZUREML_MODEL_DIR or .).",
+    )
+    parser.add_argument(
+        "--feature-cols",
+        default=os.path.join(DEPLOYMENT_DIR, "feature_cols.json"),
+        help="Ordered model feature list (default: deployment/feature_cols.json).",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=None,
+        help="Decision threshold (default: best_threshold of --threshold-config).",
+    )
+    parser.add_argument(
+        "--threshold-config",
+        default=os.path.join(DEPLOYMENT_DIR, THRESHOLD_CONFIG_FILENAME),
+        help="Threshold config used by score.py (default: deployment/threshold_config.json).",
+    )
+    parser.add_argument("--chunk-rows", type=int, default=100_000, help="Rows per chunk (default: 100000).")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Chunks scored concurrently; the CPUs are split between them "
+             "(default: the CPUs available to this process).",
+    )
+    return parser.parse_args(argv)
+
+
+def score_chunk(
+    predictor: BoosterPredictor,
+    df: pd.DataFrame,
+    feature_cols,
+    threshold: float,
+) -> Tuple[pd.DataFrame, int]:
+    """Output rows for one chunk of the feature file."""
+    X = np.ascontiguousarray(df[feature_cols].to_numpy(dtype=np.float32))
+    proba = predictor.predict_proba(X).astype(np.float32)
+
+    out = pd.DataFrame({
+        "failure_probability": proba,
+        "failure_imminent": proba.astype(np.float64) >= threshold,
+    })
+    if VEHICLE_COL in df.columns:
+        out.insert(0, VEHICLE_COL, df[VEHICLE_COL].to_numpy())
+    return out, len(df)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    feature_cols = load_feature_cols(args.feature_cols)
+    threshold = args.threshold if args.threshold is not None else load_threshold_config(args.threshold_config)
+
+    model_path = os.path.join(args.model_dir, MODEL_FILENAME)
+    print(f"Loading model from: {model_path}")
+    model = joblib.load(model_path)
+
+    cpus = serving_threads()
+    workers = args.workers or cpus
+    predictor = BoosterPredictor(model, nthread=max(1, cpus // workers))
+    if predictor.n_features != len(feature_cols):
+        raise ValueError(f"Model expects {predictor.n_features} features, "
+                         f"{args.feature_cols} has {len(feature_cols)}.")
+    predictor.warm_up()
+
+    available = read_column_names(args.input)
+    missing = [c for c in feature_cols if c not in available]
+    if missing:
+        raise ValueError(f"{args.input} is missing {len(missing)} model features, e.g. {missing[:5]}")
+    columns = ([VEHICLE_COL] if VEHICLE_COL in available else []) + feature_cols
+
+    print(f"Scoring {args.input} → {args.output} "
+          f"(chunk_rows={args.chunk_rows}, workers={workers}, nthread/worker={predictor.nthread}, "
+          f"threshold={threshold})")
+
+    chunks = iter_feature_table(args.input, columns=columns, chunk_rows=args.chunk_rows,
+                                float32_columns=feature_cols)
+    in_flight: Deque[Future] = deque()
+    n_rows = n_positive = 0
+    start = time.perf_counter()
+
+    def drain_one(writer: ChunkedTableWriter) -> None:
+        nonlocal n_rows, n_positive
+        out, rows = in_flight.popleft().result()
+        writer.write(out)
+        n_rows += rows
+        n_positive += int(out["failure_imminent"].sum())
+        elapsed = time.perf_counter() - start
+        print(f"  {n_rows:>12,} rows  {elapsed:8.1f}s  {n_rows / elapsed:>10,.0f} rows/s")
+
+    with ThreadPoolExecutor(max_workers=workers) as pool, ChunkedTableWriter(args.output) as writer:
+        for df in chunks:
+            in_flight.append(pool.submit(score_chunk, predictor, df, feature_cols, threshold))
+            if len(in_flight) >= 2 * workers:
+                drain_one(writer)
+        while in_flight:
+            drain_one(writer)
+
+    elapsed = time.perf_counter() - start
+    rate = n_rows / elapsed if elapsed > 0 else float("nan")
+    print(f"\nScored {n_rows:,} rows in {elapsed:.2f}s ({rate:,.0f} rows/s); "
+          f"{n_positive:,} flagged failure_imminent.")
+    print(f"Saved scores to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Memory report for loading the raw TRAIN split and building its features, with and
+without the declared raw schema (src/raw_schema.py).
+
+Each mode runs in a fresh Python process that reads the operational readouts, TTE and
+specifications CSVs and runs `build_train_features`, like
+scripts/build_train_val_test_features.py:
+
+- untyped: `pd.read_csv` without options (float64 sensors, int64 ids, object specs)
+- typed:   `raw_read_options` (float32 histogram bins, int32 ids, categorical specs,
+           only the needed columns)
+
+Reported per mode: peak RSS after loading and after the feature build (VmHWM), the
+in-memory size of each table, and the load / build wall times.
+
+Run from the repository root, e.g.:
+
+    # Local copies of the TRAIN files (e.g. from the raw data cache or ADLS)
+    python scripts/benchmark_raw_memory.py --oper train_operational_readouts.csv \\
+        --tte train_tte.csv --spec train_specifications.csv
+
+    # Synthetic TRAIN split with the SCANIA column layout
+    python scripts/benchmark_raw_memory.py --synthetic-vehicles 5000 --steps 60
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, ".."))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from src.raw_schema import COUNTER_COLS, TARGET_COL, TIME_COL, VEHICLE_COL
+
+MODES = ["untyped", "typed"]
+# Bins per histogram family in the SCANIA readouts
+SYNTHETIC_HISTOGRAMS = {"167": 10, "272": 10, "291": 11, "158": 10, "459": 20, "397": 36}
+
+# Runs in the fresh process; prints one JSON line with its measurements
+CHILD = """
+import json, sys, time
+sys.path.insert(0, {repo_root!r})
+import pandas as pd
+from src.feature_engineering import build_train_features
+from src.raw_schema import COUNTER_COLS, infer_histogram_groups, raw_read_options
+
+def peak_rss_mb():
+    try:  # VmHWM: ru_maxrss would include the parent's peak inherited across fork + exec
+        with open("/proc/self/status") as f:
+            return next(int(l.split()[1]) for l in f if l.startswith("VmHWM")) / 1024.0
+    except (OSError, StopIteration):
+        return None
+
+paths = {paths!r}
+t0 = time.perf_counter()
+tables = {{}}
+for kind, path in paths.items():
+    options = {{}}
+    if {typed!r}:
+        options = raw_read_options(kind, pd.read_csv(path, nrows=0).columns)
+    tables[kind] = pd.read_csv(path, **options)
+t_load = time.perf_counter()
+rss_load = peak_rss_mb()
+
+columns = list(tables["oper"].columns)
+features, _, _ = build_train_features(
+    tables["oper"], tables["tte"], tables["spec"],
+    [c for c in COUNTER_COLS if c in columns], infer_histogram_groups(columns),
+)
+t_build = time.perf_counter()
+print("MEMORY " + json.dumps({{
+    "load_s": t_load - t0,
+    "build_s": t_build - t_load,
+    "peak_rss_load_mb": rss_load,
+    "peak_rss_build_mb": peak_rss_mb(),
+    "table_mb": {{k: float(df.memory_usage(deep=True).sum()) / 1024 ** 2 for k, df in tables.items()}},
+    "oper_dtypes": {{str(k): int(v) for k, v in tables["oper"].dtypes.astype(str).value_counts().items()}},
+    "features_shape": list(features.shape),
+}}))
+"""
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Peak RSS of the TRAIN raw load + feature build, untyped vs typed.")
+    parser.add_argument("--oper", default=None, help="TRAIN operational readouts CSV (default: synthetic).")
+    parser.add_argument("--tte", default=None, help="TRAIN TTE CSV.")
+    parser.add_argument("--spec", default=None, help="TRAIN specifications CSV.")
+    parser.add_argument("--synthetic-vehicles", type=int, default=5000, help="Vehicles of the synthetic split.")
+    parser.add_argument("--steps", type=int, default=60, help="Mean readouts per synthetic vehicle.")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES, help="Modes to run (default: both).")
+    parser.add_argument("--out", default="benchmark_raw_memory.json", help="Output JSON file.")
+    args = parser.parse_args(argv)
+    given = [p is not None for p in (args.oper, args.tte, args.spec)]
+    if any(given) and not all(given):
+        parser.error("give all of --oper, --tte and --spec, or none for a synthetic split")
+    return args
+
+
+def write_synthetic_split(out_dir: str, n_vehicles: int, steps: int, seed: int = 0) -> Dict[str, str]:
+    """Raw TRAIN CSVs with the SCANIA layout: cumulative counters and histogram bins, 8 specs."""
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(max(1, steps // 2), steps + steps // 2 + 1, n_vehicles)
+    ids = np.arange(n_vehicles)
+    vehicle = np.repeat(ids, lengths)
+    starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    step = np.arange(len(vehicle)) - starts
+    n = len(vehicle)
+
+    oper = {VEHICLE_COL: vehicle, TIME_COL: np.round(step * 2.5 + rng.random(n) * 2.0, 1)}
+    for col in COUNTER_COLS:
+        base = np.repeat(rng.uniform(1e5, 1e7, n_vehicles), lengths)
+        oper[col] = np.round(base + np.cumsum(rng.exponential(500.0, n)) - np.repeat(
+            np.cumsum(rng.exponential(500.0, n_vehicles)), lengths), 1)
+    for prefix, n_bins in SYNTHETIC_HISTOGRAMS.items():
+        for k in range(n_bins):
+            values = np.floor(np.repeat(rng.uniform(0, 1e4, n_vehicles), lengths) * (1.0 + step / steps))
+            values[rng.random(n) < 0.02] = np.nan
+            oper[f"{prefix}_{k}"] = values
+
+    paths = {kind: os.path.join(out_dir, f"train_{kind}.csv") for kind in ("oper", "tte", "spec")}
+    pd.DataFrame(oper).to_csv(paths["oper"], index=False)
+    pd.DataFrame({
+        VEHICLE_COL: ids,
+        "length_of_study_time_step": lengths * 2.5,
+        TARGET_COL: (rng.random(n_vehicles) < 0.1).astype(int),
+    }).to_csv(paths["tte"], index=False)
+    pd.DataFrame({VEHICLE_COL: ids, **{
+        f"Spec_{i}": np.array([f"Cat{j}" for j in range(12)])[rng.integers(0, 12, n_vehicles)] for i in range(8)
+    }}).to_csv(paths["spec"], index=False)
+    return paths
+
+
+def format_mb(value) -> str:
+    return f"{value:.0f}" if value is not None else "n/a"
+
+
+def run_mode(mode: str, paths: Dict[str, str]) -> Dict:
+    code = CHILD.format(repo_root=REPO_ROOT, paths=paths, typed=mode == "typed")
+    proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{mode} failed:\n{proc.stdout[-2000:]}{proc.stderr[-2000:]}")
+    line = next(l for l in proc.stdout.splitlines() if l.startswith("MEMORY "))
+    return json.loads(line[len("MEMORY "):])
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.oper:
+            paths = {"oper": args.oper, "tte": args.tte, "spec": args.spec}
+        else:
+            print(f"Writing synthetic TRAIN split ({args.synthetic_vehicles} vehicles, "
+                  f"~{args.steps} readouts each) ...")
+            paths = write_synthetic_split(tmp_dir, args.synthetic_vehicles, args.steps)
+        sizes_mb = {kind: os.path.getsize(path) / 1024 ** 2 for kind, path in paths.items()}
+        print("CSV sizes (MB): " + ", ".join(f"{k}={v:.1f}" for k, v in sizes_mb.items()))
+
+        results = {}
+        print(f"\n{'mode':>8} {'oper MB':>8} {'spec MB':>8} {'load s':>7} {'RSS load MB':>12} "
+              f"{'build s':>8} {'RSS build MB':>13}")
+        for mode in args.modes:
+            r = run_mode(mode, paths)
+            results[mode] = r
+            print(f"{mode:>8} {r['table_mb']['oper']:>8.1f} {r['table_mb']['spec']:>8.2f} {r['load_s']:>7.2f} "
+                  f"{format_mb(r['peak_rss_load_mb']):>12} {r['build_s']:>8.2f} "
+                  f"{format_mb(r['peak_rss_build_mb']):>13}")
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "data": "synthetic" if not args.oper else {k: os.path.abspath(v) for k, v in paths.items()},
+            "synthetic_vehicles": None if args.oper else args.synthetic_vehicles,
+            "csv_mb": sizes_mb,
+            "pandas": pd.__version__,
+        },
+        "results": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved memory report → {args.out}")
+
+
+if __name__ == "__main__":
+    main()
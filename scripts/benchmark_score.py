@@ -0,0 +1,327 @@
+"""
+In-process latency / throughput benchmark for deployment/score.py.
+
+Imports the scoring module, calls `init()` against a local model (or a synthetic
+XGBoost model trained on random data with the columns of feature_cols.json) and
+drives `run()` at several batch sizes and payload formats. No network or Azure
+access is needed.
+
+Reports p50 / p95 / p99 latency, rows per second and peak RSS per case, and writes
+everything to JSON so runs can be compared between commits.
+
+Run from the repository root, e.g.:
+
+    python scripts/benchmark_score.py                              # synthetic model
+    python scripts/benchmark_score.py --model-dir ./model --out bench_main.json
+    python scripts/benchmark_score.py --formats rows columnar npy --batch-sizes 1 100
+    python scripts/benchmark_score.py --out bench_new.json --compare bench_main.json
+    SCORE_BACKEND=arrays python scripts/benchmark_score.py --formats npy   # NumPy tree arrays
+"""
+
+import argparse
+import base64
+import importlib.util
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, ".."))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from src.feature_engineering import FeaturePlan
+from src.feature_io import load_feature_cols
+from src.predictor import save_native_model
+from src.result_cache import DEFAULT_MAX_ENTRIES
+from src.tree_ensemble import export_tree_ensemble
+
+DEPLOYMENT_DIR = os.path.join(REPO_ROOT, "deployment")
+MODEL_FILENAME = "xgb_pdm_finetuned.pkl"
+NATIVE_FILENAME = "xgb_pdm_finetuned.ubj"
+ENSEMBLE_FILENAME = "xgb_pdm_finetuned.npz"
+
+PAYLOAD_FORMATS = ["rows", "columnar", "npy", "npy_b64", "arrow", "readouts"]
+DEFAULT_FORMATS = ["rows", "columnar", "npy", "readouts"]
+DEFAULT_BATCH_SIZES = [1, 10, 100, 1000]
+
+
+# --------------------------------------------------------------------------------------
+# Environment
+# --------------------------------------------------------------------------------------
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process so far (MB), if the platform reports it."""
+    try:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024  # bytes on macOS, KB on Linux
+    except ImportError:
+        pass
+    try:
+        import psutil
+
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / 1024 ** 2
+    except ImportError:
+        return None
+
+
+def git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                             capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def train_synthetic_model(feature_cols: List[str], out_dir: str, n_estimators: int, max_depth: int,
+                          seed: int = 0) -> str:
+    """
+    XGBClassifier on random data with the model's column names, saved like the registered
+    model. Tree count / depth set the prediction cost; accuracy is irrelevant here.
+    """
+    import joblib
+    from xgboost import XGBClassifier
+
+    X = synthetic_feature_matrix(feature_cols, 5000, seed)
+    rng = np.random.default_rng(seed)
+    y = (X[:, 0] + rng.normal(0, 1, len(X)) > 0).astype(int)
+
+    model = XGBClassifier(n_estimators=n_estimators, max_depth=max_depth, learning_rate=0.1,
+                          tree_method="hist", random_state=seed)
+    model.fit(pd.DataFrame(X, columns=feature_cols), y)
+
+    path = os.path.join(out_dir, MODEL_FILENAME)
+    joblib.dump(model, path)
+    # Native booster and tree arrays next to it, for runs with SCORE_BACKEND=native / arrays
+    save_native_model(model, os.path.join(out_dir, NATIVE_FILENAME))
+    export_tree_ensemble(model).save(os.path.join(out_dir, ENSEMBLE_FILENAME))
+    return path
+
+
+def load_score_module(model_dir: str):
+    """Import deployment/score.py as a fresh module and run its init()."""
+    os.environ["AZUREML_MODEL_DIR"] = model_dir
+    spec = importlib.util.spec_from_file_location("score", os.path.join(DEPLOYMENT_DIR, "score.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.init()
+    return module
+
+
+# --------------------------------------------------------------------------------------
+# Synthetic inputs
+# --------------------------------------------------------------------------------------
+
+def synthetic_feature_matrix(feature_cols: List[str], n_rows: int, seed: int = 0) -> np.ndarray:
+    """Random float32 features: one-hot spec columns in {0, 1}, the rest lognormal with ~5% NaN."""
+    rng = np.random.default_rng(seed)
+    X = rng.lognormal(mean=3.0, sigma=1.5, size=(n_rows, len(feature_cols))).astype(np.float32)
+    X[rng.random(X.shape) < 0.05] = np.nan
+    spec = np.array([c.startswith("Spec_") for c in feature_cols])
+    X[:, spec] = rng.integers(0, 2, size=(n_rows, int(spec.sum())))
+    return X
+
+
+def synthetic_readouts(plan: FeaturePlan, n_vehicles: int, steps_per_vehicle: int, seed: int = 0):
+    """Raw readouts (+ specs) for `n_vehicles`, in the layout expected by a 'readouts' request."""
+    rng = np.random.default_rng(seed)
+    n = n_vehicles * steps_per_vehicle
+    data = {
+        plan.vehicle_col: np.repeat(np.arange(n_vehicles), steps_per_vehicle),
+        plan.time_col: np.tile(np.arange(steps_per_vehicle, dtype=float) * 5.0, n_vehicles),
+    }
+    for c in plan.counter_cols:
+        data[c] = np.cumsum(rng.exponential(100.0, n))
+    for cols in plan.histogram_groups.values():
+        for c in cols:
+            data[c] = rng.poisson(50, n).astype(float)
+    readouts = pd.DataFrame(data).to_dict(orient="records")
+
+    specs = [
+        {plan.vehicle_col: v, **{c: rng.choice(list(cats)) for c, cats in plan.spec_categories.items()}}
+        for v in range(n_vehicles)
+    ]
+    return readouts, specs
+
+
+def build_payload(fmt: str, X: np.ndarray, feature_cols: List[str], plan: FeaturePlan,
+                  steps_per_vehicle: int):
+    """Request body for `run()` in payload format `fmt` (n_rows = len(X))."""
+    if fmt == "rows":
+        df = pd.DataFrame(X, columns=feature_cols).astype(object).where(lambda d: d.notna(), None)
+        return json.dumps({"data": df.to_dict(orient="records")})
+    if fmt == "columnar":
+        values = np.where(np.isnan(X), None, X.astype(object)).tolist()
+        return json.dumps({"columns": feature_cols, "values": values})
+    if fmt in ("npy", "npy_b64"):
+        buf = io.BytesIO()
+        np.save(buf, X)
+        if fmt == "npy":
+            return buf.getvalue()
+        return json.dumps({"payload": base64.b64encode(buf.getvalue()).decode("ascii"), "format": "npy"})
+    if fmt == "arrow":
+        import pyarrow as pa
+
+        table = pa.Table.from_pandas(pd.DataFrame(X, columns=feature_cols), preserve_index=False)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+    if fmt == "readouts":
+        readouts, specs = synthetic_readouts(plan, len(X), steps_per_vehicle)
+        return json.dumps({"readouts": readouts, "specifications": specs})
+    raise ValueError(f"Unknown payload format '{fmt}'. Expected one of: {PAYLOAD_FORMATS}")
+
+
+# --------------------------------------------------------------------------------------
+# Measurement
+# --------------------------------------------------------------------------------------
+
+def time_calls(fn: Callable[[], str], min_iterations: int, min_seconds: float, warmup: int) -> np.ndarray:
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    started = time.perf_counter()
+    while len(latencies) < min_iterations or time.perf_counter() - started < min_seconds:
+        t0 = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t0)
+    return np.array(latencies)
+
+
+def bench_case(score, fmt: str, batch_size: int, feature_cols: List[str], plan: FeaturePlan,
+               args: argparse.Namespace) -> Dict:
+    X = synthetic_feature_matrix(feature_cols, batch_size, seed=batch_size)
+    payload = build_payload(fmt, X, feature_cols, plan, args.steps_per_vehicle)
+
+    response = json.loads(score.run(payload))
+    if "error" in response:
+        raise RuntimeError(f"{fmt} / batch {batch_size}: {response['error']}")
+
+    latencies = time_calls(lambda: score.run(payload), args.min_iterations, args.min_seconds, args.warmup)
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000.0
+    return {
+        "format": fmt,
+        "batch_size": batch_size,
+        "payload_bytes": len(payload),
+        "iterations": int(len(latencies)),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "mean_ms": float(latencies.mean() * 1000.0),
+        "rows_per_s": float(batch_size * len(latencies) / latencies.sum()),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def compare(results: List[Dict], baseline_path: str) -> None:
+    """Print p50 / rows-per-second ratios against a previous benchmark JSON."""
+    with open(baseline_path, "r") as f:
+        baseline = {(r["format"], r["batch_size"]): r for r in json.load(f)["results"]}
+
+    print(f"\nComparison with {baseline_path} (new / baseline):")
+    print(f"{'format':>10} {'batch':>6} {'p50':>8} {'p99':>8} {'rows/s':>8}")
+    for r in results:
+        b = baseline.get((r["format"], r["batch_size"]))
+        if b is None:
+            continue
+        print(f"{r['format']:>10} {r['batch_size']:>6} {r['p50_ms'] / b['p50_ms']:>8.2f} "
+              f"{r['p99_ms'] / b['p99_ms']:>8.2f} {r['rows_per_s'] / b['rows_per_s']:>8.2f}")
+
+
+# --------------------------------------------------------------------------------------
+# Main
+# --------------------------------------------------------------------------------------
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark deployment/score.py in-process.")
+    parser.add_argument("--model-dir", default=None,
+                        help=f"Directory with {MODEL_FILENAME} (default: train a synthetic model).")
+    parser.add_argument("--n-estimators", type=int, default=300, help="Trees in the synthetic model.")
+    parser.add_argument("--max-depth", type=int, default=6, help="Depth of the synthetic model's trees.")
+    parser.add_argument("--formats", nargs="+", default=DEFAULT_FORMATS, choices=PAYLOAD_FORMATS)
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=DEFAULT_BATCH_SIZES)
+    parser.add_argument("--steps-per-vehicle", type=int, default=50,
+                        help="Readouts per vehicle for the 'readouts' format.")
+    parser.add_argument("--min-iterations", type=int, default=20)
+    parser.add_argument("--min-seconds", type=float, default=2.0)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--with-cache", action="store_true",
+                        help="Keep the prediction cache on (repeated payloads then measure cache hits).")
+    parser.add_argument("--out", default="benchmark_score.json")
+    parser.add_argument("--compare", default=None, help="Previous benchmark JSON to compare against.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.with_cache:
+        os.environ.setdefault("SCORE_CACHE_MAX_ENTRIES", str(DEFAULT_MAX_ENTRIES))
+    else:
+        os.environ["SCORE_CACHE_MAX_ENTRIES"] = "0"
+    feature_cols = load_feature_cols(os.path.join(DEPLOYMENT_DIR, "feature_cols.json"))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        model_dir = args.model_dir
+        if model_dir is None:
+            print(f"Training synthetic model ({args.n_estimators} trees, depth {args.max_depth}) ...")
+            train_synthetic_model(feature_cols, tmp_dir, args.n_estimators, args.max_depth)
+            model_dir = tmp_dir
+
+        rss_before_init = peak_rss_mb()
+        t0 = time.perf_counter()
+        score = load_score_module(model_dir)
+        init_seconds = time.perf_counter() - t0
+
+    plan = score.load_feature_plan()
+    results = []
+    print(f"\n{'format':>10} {'batch':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'rows/s':>10} {'RSS MB':>8}")
+    for fmt in args.formats:
+        for batch_size in args.batch_sizes:
+            r = bench_case(score, fmt, batch_size, feature_cols, plan, args)
+            results.append(r)
+            rss = f"{r['peak_rss_mb']:.0f}" if r["peak_rss_mb"] is not None else "n/a"
+            print(f"{fmt:>10} {batch_size:>6} {r['p50_ms']:>9.3f} {r['p95_ms']:>9.3f} "
+                  f"{r['p99_ms']:>9.3f} {r['rows_per_s']:>10.0f} {rss:>8}")
+
+    import xgboost
+
+    report = {
+        "meta": {
+            "git_commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "xgboost": xgboost.__version__,
+            "model": "synthetic" if args.model_dir is None else os.path.abspath(args.model_dir),
+            "n_estimators": args.n_estimators if args.model_dir is None else None,
+            "n_features": len(feature_cols),
+            "init_seconds": init_seconds,
+            "peak_rss_mb_before_init": rss_before_init,
+            "env": {k: v for k, v in os.environ.items() if k.startswith("SCORE_")},
+        },
+        "results": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved benchmark results → {args.out}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Cold-start benchmark for deployment/score.py: time from process start to the first response.
+
+Each run starts a fresh Python process that imports score.py, calls `init()` and
+scores one row, like a new replica during a scale-out. Runs are repeated per scoring
+backend (SCORE_BACKEND) and startup mode (SCORE_FAST_START), and the median of
+
+- import_s:          `import score`
+- init_s:            `score.init()` (model load, warm-up, ...)
+- first_request_ms:  the first `run()`
+- import_to_first_s: import + init + first request
+- process_to_first_s: from spawning the interpreter to the first response
+- peak RSS and whether xgboost / scikit-learn / pandas were imported
+
+is reported and written to JSON.
+
+Run from the repository root, e.g.:
+
+    python scripts/benchmark_startup.py                          # synthetic model
+    python scripts/benchmark_startup.py --model-dir ./model --backends native arrays --repeats 10
+"""
+
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, ".."))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from src.feature_io import load_feature_cols
+
+from benchmark_score import git_commit, synthetic_feature_matrix, train_synthetic_model
+
+DEPLOYMENT_DIR = os.path.join(REPO_ROOT, "deployment")
+BACKENDS = ["xgboost", "native", "arrays"]
+
+# Runs in the fresh process; prints one JSON line with its timings
+CHILD = """
+import json, os, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, {deployment_dir!r})
+import score
+t_import = time.perf_counter()
+score.init()
+t_init = time.perf_counter()
+with open({payload_path!r}, "rb") as f:
+    response = score.run(f.read())
+t_first = time.perf_counter()
+wall_first = time.time()
+if "results" not in response:
+    raise SystemExit("first request failed: " + str(response)[:500])
+peak_rss_mb = None
+try:  # VmHWM: ru_maxrss would include the parent's peak inherited across fork + exec
+    with open("/proc/self/status") as f:
+        peak_rss_mb = next(int(l.split()[1]) for l in f if l.startswith("VmHWM")) / 1024.0
+except (OSError, StopIteration):
+    pass
+print("STARTUP " + json.dumps({{
+    "import_s": t_import - t0,
+    "init_s": t_init - t_import,
+    "first_request_ms": 1000.0 * (t_first - t_init),
+    "import_to_first_s": t_first - t0,
+    "wall_first": wall_first,
+    "peak_rss_mb": peak_rss_mb,
+    "modules": {{name: name in sys.modules for name in ("xgboost", "sklearn", "pandas")}},
+}}))
+"""
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Cold-start benchmark for deployment/score.py.")
+    parser.add_argument("--model-dir", default=None,
+                        help="Directory with the model files; default: train a synthetic model.")
+    parser.add_argument("--n-estimators", type=int, default=300, help="Trees of the synthetic model.")
+    parser.add_argument("--max-depth", type=int, default=6, help="Depth of the synthetic model.")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=BACKENDS,
+                        help="SCORE_BACKEND values to compare (default: all).")
+    parser.add_argument("--fast-start", choices=["0", "1", "both"], default="both",
+                        help="SCORE_FAST_START setting(s) to run (default: both).")
+    parser.add_argument("--repeats", type=int, default=5, help="Fresh processes per case (default: 5).")
+    parser.add_argument("--out", default="benchmark_startup.json", help="Output JSON file.")
+    return parser.parse_args(argv)
+
+
+def run_once(backend: str, fast_start: str, model_dir: str, payload_path: str) -> Dict:
+    env = dict(os.environ, AZUREML_MODEL_DIR=model_dir, SCORE_BACKEND=backend, SCORE_FAST_START=fast_start)
+    code = CHILD.format(deployment_dir=DEPLOYMENT_DIR, payload_path=payload_path)
+
+    spawned = time.time()
+    proc = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{backend} (fast_start={fast_start}) failed:\n{proc.stdout[-2000:]}{proc.stderr[-2000:]}")
+
+    line = next(l for l in proc.stdout.splitlines() if l.startswith("STARTUP "))
+    result = json.loads(line[len("STARTUP "):])
+    result["process_to_first_s"] = result.pop("wall_first") - spawned
+    return result
+
+
+def summarize(runs: List[Dict]) -> Dict:
+    keys = ["import_s", "init_s", "first_request_ms", "import_to_first_s", "process_to_first_s", "peak_rss_mb"]
+    summary = {k: float(np.median([r[k] for r in runs])) for k in keys if runs[0][k] is not None}
+    summary["modules"] = runs[0]["modules"]
+    return summary
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    feature_cols = load_feature_cols(os.path.join(DEPLOYMENT_DIR, "feature_cols.json"))
+    fast_start_modes = ["0", "1"] if args.fast_start == "both" else [args.fast_start]
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        model_dir = args.model_dir
+        if model_dir is None:
+            print(f"Training synthetic model ({args.n_estimators} trees, depth {args.max_depth}) ...")
+            train_synthetic_model(feature_cols, tmp_dir, args.n_estimators, args.max_depth)
+            model_dir = tmp_dir
+
+        # One-row binary request, the cheapest payload to decode
+        payload_path = os.path.join(tmp_dir, "first_request.npy")
+        buffer = io.BytesIO()
+        np.save(buffer, synthetic_feature_matrix(feature_cols, 1))
+        with open(payload_path, "wb") as f:
+            f.write(buffer.getvalue())
+
+        print(f"\n{'backend':>8} {'fast':>5} {'import s':>9} {'init s':>8} {'1st ms':>8} "
+              f"{'import→1st s':>13} {'spawn→1st s':>12} {'RSS MB':>8}")
+        for backend in args.backends:
+            for fast_start in fast_start_modes:
+                runs = [run_once(backend, fast_start, model_dir, payload_path) for _ in range(args.repeats)]
+                s = summarize(runs)
+                results.append({"backend": backend, "fast_start": fast_start == "1", **s, "runs": runs})
+                rss = f"{s['peak_rss_mb']:.0f}" if "peak_rss_mb" in s else "n/a"
+                print(f"{backend:>8} {fast_start:>5} {s['import_s']:>9.3f} {s['init_s']:>8.3f} "
+                      f"{s['first_request_ms']:>8.2f} {s['import_to_first_s']:>13.3f} "
+                      f"{s['process_to_first_s']:>12.3f} {rss:>8}")
+
+    report = {
+        "meta": {
+            "git_commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "model": "synthetic" if args.model_dir is None else os.path.abspath(args.model_dir),
+            "n_estimators": args.n_estimators if args.model_dir is None else None,
+            "repeats": args.repeats,
+        },
+        "results": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved startup benchmark → {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Build model features as of many cutoff time steps per vehicle.
+
+Each output row holds the features of one (vehicle_id, cutoff_time_step) pair,
+computed only from that vehicle's readouts with time_step <= cutoff
+(src.feature_engineering.build_asof_features). All cutoffs are computed in one pass
+over the readouts, so many prediction points per vehicle cost about as much as one
+feature build. Uses:
+
+- training on several prediction points per vehicle (with --tte and --horizon,
+  each cutoff is labelled 1 if the vehicle's repair follows within the horizon)
+- backtesting how early a failure could have been flagged (score the rows with
+  scripts/batch_score.py)
+
+Run from the repository root, e.g.:
+
+    # Cutoffs from a CSV with vehicle_id, cutoff_time_step (+ any other columns, kept as-is)
+    python scripts/build_asof_features.py --readouts train_operational_readouts.csv \\
+        --spec train_specifications.csv --cutoffs cutoffs.csv --out asof_features.arrow
+
+    # A cutoff every 20 time steps of each vehicle's history, labelled with a 48-step horizon
+    python scripts/build_asof_features.py --readouts train_operational_readouts.csv \\
+        --spec train_specifications.csv --every 20 --tte train_tte.csv --horizon 48
+
+Readout, specification and TTE files are local CSVs with the raw SCANIA columns.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, ".."))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from src.feature_engineering import build_asof_features, plan_aggregates
+from src.feature_io import load_feature_cols, write_feature_table
+from src.raw_schema import COUNTER_COLS, TARGET_COL, TIME_COL, VEHICLE_COL, infer_histogram_groups, raw_read_options
+
+DEPLOYMENT_DIR = os.path.join(REPO_ROOT, "deployment")
+CUTOFF_COL = "cutoff_time_step"
+STUDY_LENGTH_COL = "length_of_study_time_step"
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Build features as of many cutoff time steps per vehicle.")
+    parser.add_argument("--readouts", required=True, help="Operational readouts CSV.")
+    parser.add_argument("--spec", required=True, help="Specifications CSV.")
+    cutoffs = parser.add_mutually_exclusive_group(required=True)
+    cutoffs.add_argument("--cutoffs", help=f"CSV with {VEHICLE_COL}, {CUTOFF_COL} (other columns are kept).")
+    cutoffs.add_argument("--every", type=float,
+                         help="Cutoffs every N time steps of each vehicle, up to its last readout (included).")
+    parser.add_argument("--feature-cols", default=os.path.join(DEPLOYMENT_DIR, "feature_cols.json"),
+                        help="Ordered model feature list (default: deployment/feature_cols.json).")
+    parser.add_argument("--tte", default=None,
+                        help=f"TTE CSV ({STUDY_LENGTH_COL}, {TARGET_COL}) to label the cutoffs, with --horizon.")
+    parser.add_argument("--horizon", type=float, default=None,
+                        help="Label a cutoff 1 if the vehicle's repair is at most this many time steps later.")
+    parser.add_argument("--out", default="asof_vehicle_features.arrow",
+                        help="Output feature file (.arrow, .parquet or .csv).")
+    args = parser.parse_args(argv)
+    if (args.tte is None) != (args.horizon is None):
+        parser.error("--tte and --horizon go together")
+    return args
+
+
+def every_n_cutoffs(df_oper: pd.DataFrame, step: float) -> pd.DataFrame:
+    """Cutoffs at step, 2 * step, ... and at the last readout of every vehicle."""
+    last = df_oper.groupby(VEHICLE_COL)[TIME_COL].max().dropna()
+    counts = np.floor(last.to_numpy() / step).astype(int)
+    vehicles = np.repeat(last.index.to_numpy(), counts)
+    within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    cutoffs = pd.DataFrame({VEHICLE_COL: vehicles, CUTOFF_COL: (within + 1) * step})
+    final = pd.DataFrame({VEHICLE_COL: last.index, CUTOFF_COL: last.to_numpy()})
+    cutoffs = pd.concat([cutoffs, final], ignore_index=True).drop_duplicates()
+    return cutoffs.sort_values([VEHICLE_COL, CUTOFF_COL], kind="stable").reset_index(drop=True)
+
+
+def label_cutoffs(df_cutoffs: pd.DataFrame, df_tte: pd.DataFrame, horizon: float) -> pd.DataFrame:
+    """
+    Add TARGET_COL per cutoff: 1 if the vehicle was repaired in the study (its study
+    ends with the repair) at most `horizon` time steps after the cutoff, else 0.
+    """
+    tte = df_tte[[VEHICLE_COL, STUDY_LENGTH_COL, TARGET_COL]]
+    labelled = df_cutoffs.merge(tte, on=VEHICLE_COL, how="left", validate="many_to_one")
+    time_to_repair = labelled[STUDY_LENGTH_COL] - labelled[CUTOFF_COL]
+    labelled[TARGET_COL] = ((labelled[TARGET_COL] == 1) & (time_to_repair <= horizon)).astype(int)
+    return labelled.drop(columns=STUDY_LENGTH_COL)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    feature_cols = load_feature_cols(args.feature_cols)
+
+    # Only the raw columns behind the feature list are parsed
+    header = pd.read_csv(args.readouts, nrows=0).columns
+    histogram_groups = infer_histogram_groups(header)
+    counter_cols = [c for c in COUNTER_COLS if c in header]
+    needs = plan_aggregates(feature_cols, counter_cols, histogram_groups)
+
+    start = time.perf_counter()
+    df_oper = pd.read_csv(args.readouts, **raw_read_options("oper", header, columns=needs.raw_columns))
+    df_spec = pd.read_csv(args.spec, **raw_read_options("spec", pd.read_csv(args.spec, nrows=0).columns))
+    print(f"Loaded {len(df_oper)} readouts ({df_oper.shape[1]} columns) in {time.perf_counter() - start:.1f}s")
+
+    if args.cutoffs:
+        df_cutoffs = pd.read_csv(args.cutoffs)
+    else:
+        df_cutoffs = every_n_cutoffs(df_oper, args.every)
+    if args.tte:
+        df_cutoffs = label_cutoffs(df_cutoffs, pd.read_csv(args.tte), args.horizon)
+
+    start = time.perf_counter()
+    spec_feature_cols = [c for c in feature_cols if c.startswith("Spec_")]
+    df_features = build_asof_features(
+        df_oper, df_cutoffs, df_spec, counter_cols, histogram_groups, spec_feature_cols, feature_cols,
+        time_col=TIME_COL, vehicle_col=VEHICLE_COL, cutoff_col=CUTOFF_COL,
+    )
+    print(f"Built features for {len(df_features)} cutoffs of {df_features[VEHICLE_COL].nunique()} vehicles "
+          f"in {time.perf_counter() - start:.1f}s")
+    if TARGET_COL in df_features.columns:
+        print(f"Positive cutoffs: {int(df_features[TARGET_COL].sum())}")
+
+    write_feature_table(df_features, args.out)
+    print(f"Saved as-of features → {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,20 +5,37 @@ This script:
 - Loads raw SCANIA data (operational, TTE, specifications) from ADLS Gen2
 - Uses the feature_engineering module to build per-vehicle features
 - Ensures validation/test features are aligned with training feature columns
-- Saves:
-    - train_vehicle_features.csv
-    - validation_vehicle_features.csv
-    - test_vehicle_features.csv
+- Saves (Arrow IPC by default, see --output-format):
+    - train_vehicle_features.arrow
+    - validation_vehicle_features.arrow
+    - test_vehicle_features.arrow
 
 Run this script from the repository root, e.g.:
 
     conda activate azure-pdm
     python scripts/build_train_val_test_features.py
+
+    # Stream operational readouts in chunks (memory bounded by #vehicles)
+    python scripts/build_train_val_test_features.py --chunksize 200000
+
+    # Shard vehicles over 8 worker processes, build validation + test concurrently
+    python scripts/build_train_val_test_features.py --workers 8
+
+    # Only the features of a pruned list (scripts/select_features.py)
+    python scripts/build_train_val_test_features.py --feature-cols selected_features/feature_cols.json
+
+    # Per-stage timings (and peak allocations) of the feature build
+    python scripts/build_train_val_test_features.py --metrics --metrics-memory --metrics-out metrics.prom
 """
 
+import argparse
+import json
 import os
 import sys
-from typing import Dict, List
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 
 import pandas as pd
 from adlfs import AzureBlobFileSystem
@@ -32,6 +49,21 @@ if REPO_ROOT not in sys.path:
 from src.feature_engineering import (
     build_train_features,
     build_eval_features,
+    plan_aggregates,
+)
+from src.feature_io import FEATURE_FILE_FORMATS, load_feature_cols, write_feature_table
+from src.instrumentation import METRICS
+from src.raw_cache import RawDataCache
+from src.raw_schema import (
+    COUNTER_COLS,
+    HISTOGRAM_DTYPE,
+    HISTOGRAM_PREFIXES,
+    TARGET_COL,
+    TIME_COL,
+    VEHICLE_COL,
+    infer_histogram_groups,
+    operational_read_options,
+    raw_read_options,
 )
 
 # --------------------------------------------------------------------------------------
@@ -71,58 +103,310 @@ RAW_PATHS = {
     },
 }
 
-# Column names
-VEHICLE_COL = "vehicle_id"
-TIME_COL = "time_step"
-TARGET_COL = "in_study_repair"
+# Local cache of parsed raw files (see src/raw_cache.py, scripts/manage_raw_cache.py)
+DEFAULT_CACHE_DIR = os.environ.get("SCANIA_RAW_CACHE_DIR", os.path.join(REPO_ROOT, ".raw_cache"))
+DEFAULT_CACHE_MAX_GB = 20.0
 
-# Counter columns (single-value counters)
-COUNTER_COLS: List[str] = [
-    "171_0", "666_0", "427_0", "837_0",
-    "309_0", "835_0", "370_0", "100_0",
-]
-
-# Histogram prefixes (each prefix corresponds to a set of bin columns)
-HISTOGRAM_PREFIXES: List[str] = ["167_", "272_", "291_", "158_", "459_", "397_"]
+# Column names, counter columns and histogram prefixes: see src/raw_schema.py
 
 
 # --------------------------------------------------------------------------------------
 # Helper: Read CSV from ADLS
 # --------------------------------------------------------------------------------------
 
-def read_csv_from_adls(fs: AzureBlobFileSystem, path: str, **read_csv_kwargs) -> pd.DataFrame:
+def read_csv_from_adls(fs: AzureBlobFileSystem, path: str, cache: Optional[RawDataCache] = None,
+                       **read_csv_kwargs) -> Tuple[pd.DataFrame, bool]:
     """
     Read a CSV file from ADLS Gen2 into a pandas DataFrame.
     `path` is relative to the filesystem root, e.g. 'train/train_operational_readouts.csv'.
+    With a `cache`, an unchanged remote file is loaded from the local parsed copy.
+    Returns the DataFrame and whether it was downloaded (False for a cache hit).
     """
     print(f"Loading: {path}")
-    with fs.open(path, "rb") as f:
-        df = pd.read_csv(f, **read_csv_kwargs)
+    if cache is not None:
+        df, cache_hit = cache.load(fs, path, **read_csv_kwargs)
+    else:
+        with fs.open(path, "rb") as f:
+            df = pd.read_csv(f, **read_csv_kwargs)
+        cache_hit = False
     print(f"  → shape: {df.shape}")
-    return df
+    return df, not cache_hit
+
+
+def iter_csv_chunks_from_adls(fs: AzureBlobFileSystem, path: str, chunksize: int,
+                              **read_csv_kwargs) -> Iterator[pd.DataFrame]:
+    """
+    Stream a CSV file from ADLS Gen2 as DataFrame chunks of `chunksize` rows.
+    The remote file stays open until the iterator is exhausted.
+    """
+    print(f"Streaming: {path} (chunksize={chunksize})")
+    n_rows = 0
+    with fs.open(path, "rb") as f:
+        for chunk in pd.read_csv(f, chunksize=chunksize, **read_csv_kwargs):
+            n_rows += len(chunk)
+            yield chunk
+    print(f"  → rows streamed: {n_rows}")
+
+
+def read_csv_columns_from_adls(fs: AzureBlobFileSystem, path: str) -> List[str]:
+    """Read only the header row of a CSV file on ADLS Gen2."""
+    with fs.open(path, "rb") as f:
+        return pd.read_csv(f, nrows=0).columns.tolist()
+
+
+# --------------------------------------------------------------------------------------
+# Helper: Prefetching loader for all RAW_PATHS entries
+# --------------------------------------------------------------------------------------
+
+class RawLoader:
+    """
+    Loads the raw files listed in RAW_PATHS.
+
+    With `io_workers > 0`, files are fetched on a bounded thread pool one split ahead:
+    requesting a file of a split submits that split and the next one in RAW_PATHS order,
+    so validation downloads while train is featurized, test while validation is, and at
+    most two splits of raw data are held at once. With `io_workers == 0`, files are
+    loaded on demand, one after another.
+
+    Operational readouts in chunked mode (`chunksize`) are streamed on demand.
+    `read_options(split, kind)` gives the `pd.read_csv` options (dtypes, usecols) per file.
+    Per-file wall time and downloaded bytes (none for cache hits) are logged and
+    summarized by `report()`.
+    """
+
+    def __init__(self, fs: AzureBlobFileSystem, io_workers: int = 4, chunksize: Optional[int] = None,
+                 cache: Optional[RawDataCache] = None,
+                 read_options: Optional[Callable[[str, str], Dict]] = None):
+        self.fs = fs
+        self.chunksize = chunksize
+        self.cache = cache
+        self.read_options = read_options or (lambda split, kind: {})
+        self.timings: List[Dict] = []
+        self._lock = threading.Lock()
+        self._futures: Dict = {}
+        self._submitted = set()
+        self._pool = None
+        if io_workers > 0:
+            self._pool = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="raw-io")
+
+    def _prefetch(self, split: str) -> None:
+        """Submit the files of `split` and of the split after it (once each)."""
+        splits = list(RAW_PATHS)
+        index = splits.index(split)
+        with self._lock:
+            for ahead in splits[index:index + 2]:
+                if ahead in self._submitted:
+                    continue
+                self._submitted.add(ahead)
+                for kind in RAW_PATHS[ahead]:
+                    if kind == "oper" and self.chunksize:
+                        continue
+                    self._futures[(ahead, kind)] = self._pool.submit(self._fetch, ahead, kind)
+
+    def _fetch(self, split: str, kind: str) -> pd.DataFrame:
+        path = RAW_PATHS[split][kind]
+        t0 = time.perf_counter()
+        df, downloaded = read_csv_from_adls(self.fs, path, cache=self.cache, **self.read_options(split, kind))
+        elapsed = time.perf_counter() - t0
+
+        n_bytes = self.fs.size(path) if downloaded else 0
+        record = {"split": split, "kind": kind, "path": path, "bytes": n_bytes, "seconds": elapsed,
+                  "cached": not downloaded}
+        with self._lock:
+            self.timings.append(record)
+        if downloaded:
+            print(f"  ⏱ {path}: {n_bytes / 1024 ** 2:.1f} MB in {elapsed:.2f}s "
+                  f"({n_bytes / 1024 ** 2 / max(elapsed, 1e-9):.1f} MB/s)")
+        else:
+            print(f"  ⏱ {path}: from cache in {elapsed:.2f}s")
+        return df
+
+    def get(self, split: str, kind: str):
+        """DataFrame for RAW_PATHS[split][kind] (chunk iterator for chunked 'oper')."""
+        if kind == "oper" and self.chunksize:
+            return iter_csv_chunks_from_adls(
+                self.fs, RAW_PATHS[split][kind], self.chunksize, **self.read_options(split, kind)
+            )
+        if self._pool is not None:
+            self._prefetch(split)
+        with self._lock:
+            future = self._futures.pop((split, kind), None)
+        if future is not None:
+            return future.result()  # the loader drops its reference once handed out
+        return self._fetch(split, kind)
+
+    def report(self) -> None:
+        """Print per-file timing and downloaded byte counts."""
+        if not self.timings:
+            return
+        print("\nRaw file loading summary:")
+        for r in sorted(self.timings, key=lambda r: -r["seconds"]):
+            size = "cached" if r["cached"] else f"{r['bytes'] / 1024 ** 2:.1f} MB"
+            print(f"  {r['seconds']:7.2f}s  {size:>12}  {r['path']}")
+        total_bytes = sum(r["bytes"] for r in self.timings)
+        total_seconds = sum(r["seconds"] for r in self.timings)
+        n_cached = sum(r["cached"] for r in self.timings)
+        print(f"  total: {total_bytes / 1024 ** 2:.1f} MB downloaded, {n_cached} files from cache, "
+              f"{total_seconds:.2f}s summed over files")
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+
+
+# --------------------------------------------------------------------------------------
+# Helper: Save a feature matrix
+# --------------------------------------------------------------------------------------
+
+def save_features(features: pd.DataFrame, split: str, output_format: str) -> str:
+    """
+    Save `<split>_vehicle_features.<ext>` in the working directory.
+    Columnar formats store float32 features and integer ids (see src/feature_io.py).
+    """
+    out_path = f"{split}_vehicle_features{FEATURE_FILE_FORMATS[output_format]}"
+    return write_feature_table(features, out_path, vehicle_col=VEHICLE_COL, target_col=TARGET_COL)
 
 
 # --------------------------------------------------------------------------------------
-# Helper: Determine histogram groups based on prefixes and columns
+# Helper: Build one VALIDATION/TEST split
 # --------------------------------------------------------------------------------------
 
-def infer_histogram_groups(columns, prefixes) -> Dict[str, List[str]]:
+def build_eval_split(
+    loader: RawLoader,
+    split: str,
+    counter_cols: List[str],
+    histogram_groups: Dict[str, List[str]],
+    spec_feature_cols: List[str],
+    feature_columns: List[str],
+    executor: Optional[Executor] = None,
+    output_format: str = "arrow",
+) -> str:
     """
-    Build a dict: base_prefix -> [list of columns], e.g. "167" -> ["167_0", ..., "167_9"].
+    Load, featurize and save one evaluation split, aligned to the TRAIN feature columns.
+    Returns the output path.
     """
-    histogram_groups: Dict[str, List[str]] = {}
-    for prefix in prefixes:
-        cols = [c for c in columns if c.startswith(prefix)]
-        if cols:
-            histogram_groups[prefix[:-1]] = cols  # "167_" -> "167"
-    return histogram_groups
+    print(f"\nBuilding {split.upper()} features...")
+    oper = loader.get(split, "oper")
+    tte = loader.get(split, "tte")
+    spec = loader.get(split, "spec")
+
+    features = build_eval_features(
+        df_oper=oper,
+        df_tte=tte,
+        df_spec=spec,
+        counter_cols=counter_cols,
+        histogram_groups=histogram_groups,
+        spec_feature_cols=spec_feature_cols,
+        feature_columns=feature_columns,
+        time_col=TIME_COL,
+        vehicle_col=VEHICLE_COL,
+        target_col=TARGET_COL,
+        executor=executor,
+    )
+
+    print(f"{split.upper()} feature matrix shape:", features.shape)
+    out_path = save_features(features, split, output_format)
+    print(f"Saved {split.upper()} features to: {out_path}")
+    return out_path
 
 
 # --------------------------------------------------------------------------------------
 # Main build function
 # --------------------------------------------------------------------------------------
 
-def main():
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Build per-vehicle feature matrices for all splits.")
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=None,
+        help="Stream operational readouts in chunks of this many rows instead of loading whole files.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Worker processes for sharded per-vehicle aggregation; validation and test are built "
+             "concurrently when > 1. Output is identical to the serial run (default: 1).",
+    )
+    parser.add_argument(
+        "--output-format",
+        choices=sorted(FEATURE_FILE_FORMATS),
+        default="arrow",
+        help="Feature file format: arrow (Arrow IPC, memory-mappable; default), parquet, or csv.",
+    )
+    parser.add_argument(
+        "--io-workers",
+        type=int,
+        default=4,
+        help="Threads that download and parse raw files in the background, one split ahead of the "
+             "split being featurized; 0 loads files one after another when needed (default: 4).",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=DEFAULT_CACHE_DIR,
+        help="Local cache of parsed raw files (default: $SCANIA_RAW_CACHE_DIR or <repo>/.raw_cache).",
+    )
+    parser.add_argument(
+        "--cache-max-gb",
+        type=float,
+        default=DEFAULT_CACHE_MAX_GB,
+        help="Evict least recently used cache entries above this size (default: 20).",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always download and parse raw files from ADLS.",
+    )
+    parser.add_argument(
+        "--histogram-dtype",
+        choices=("float32", "float64"),
+        default=HISTOGRAM_DTYPE,
+        help="Dtype histogram bins are parsed as (src/raw_schema.py); counters are always "
+             f"float64 (default: {HISTOGRAM_DTYPE}).",
+    )
+    parser.add_argument(
+        "--feature-cols",
+        default=None,
+        help="Ordered feature list to build (e.g. a pruned feature_cols.json); only the aggregates "
+             "it needs are computed. Default: every feature.",
+    )
+    parser.add_argument(
+        "--metrics",
+        action="store_true",
+        help="Record per-stage wall times of the feature build and print a summary at the end. "
+             "With --workers > 1 the stages run inside the shards are timed in the workers "
+             "and not included.",
+    )
+    parser.add_argument(
+        "--metrics-memory",
+        action="store_true",
+        help="With --metrics, also record the peak traced allocation per stage (tracemalloc; slower).",
+    )
+    parser.add_argument(
+        "--metrics-out",
+        default=None,
+        help="Write the stage metrics to this file: JSON if it ends in .json, "
+             "Prometheus text format otherwise.",
+    )
+    return parser.parse_args(argv)
+
+
+def write_metrics(path: str) -> None:
+    if path.endswith(".json"):
+        with open(path, "w") as f:
+            json.dump(METRICS.snapshot(), f, indent=2)
+    else:
+        with open(path, "w") as f:
+            f.write(METRICS.prometheus_text())
+    print(f"Stage metrics written to: {path}")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.metrics or args.metrics_out:
+        METRICS.configure(enabled=True, track_memory=args.metrics_memory)
+
     # Connect to ADLS
     fs = AzureBlobFileSystem(
         account_name=ACCOUNT_NAME,
@@ -130,15 +414,17 @@ def main():
     )
     print(f"Connected to ADLS: account={ACCOUNT_NAME}, filesystem={FILE_SYSTEM}")
 
+    cache = None
+    if not args.no_cache:
+        cache = RawDataCache(args.cache_dir, max_bytes=int(args.cache_max_gb * 1024 ** 3))
+        print(f"Raw data cache: {args.cache_dir} (max {args.cache_max_gb} GB)")
+
     # -------------------------
     # 1) Load TRAIN raw data
     # -------------------------
-    train_oper = read_csv_from_adls(fs, RAW_PATHS["train"]["oper"])
-    train_tte = read_csv_from_adls(fs, RAW_PATHS["train"]["tte"])
-    train_spec = read_csv_from_adls(fs, RAW_PATHS["train"]["spec"])
+    train_cols = read_csv_columns_from_adls(fs, RAW_PATHS["train"]["oper"])
 
     # Infer histogram groups from TRAIN columns
-    train_cols = train_oper.columns.tolist()
     histogram_groups = infer_histogram_groups(train_cols, HISTOGRAM_PREFIXES)
     print("Histogram groups inferred from TRAIN:")
     print({k: len(v) for k, v in histogram_groups.items()})
@@ -147,9 +433,39 @@ def main():
     counter_cols_present = [c for c in COUNTER_COLS if c in train_cols]
     print("Counter columns present:", counter_cols_present)
 
+    # Typed reads (src/raw_schema.py) of only the operational columns the features need
+    required_columns = load_feature_cols(args.feature_cols) if args.feature_cols else None
+    oper_columns = plan_aggregates(required_columns, counter_cols_present, histogram_groups).raw_columns
+    print(f"Operational columns read: {len(oper_columns)} sensors (+ {VEHICLE_COL}, {TIME_COL}), "
+          f"histogram bins as {args.histogram_dtype}")
+
+    # TTE / spec dtypes depend on their headers: read each header once, up front (concurrently),
+    # so the prefetch workers make no extra round-trips
+    header_files = [(split, kind) for split in RAW_PATHS for kind in ("tte", "spec")]
+    with ThreadPoolExecutor(max_workers=max(1, args.io_workers)) as header_pool:
+        headers = dict(zip(header_files, header_pool.map(
+            lambda key: read_csv_columns_from_adls(fs, RAW_PATHS[key[0]][key[1]]), header_files
+        )))
+
+    def read_options(split: str, kind: str) -> Dict:
+        if kind == "oper":
+            return operational_read_options(oper_columns, args.histogram_dtype)
+        return raw_read_options(kind, headers[(split, kind)])
+
+    # Raw files are fetched in the background, one split ahead, from here on (see RawLoader)
+    loader = RawLoader(fs, io_workers=args.io_workers, chunksize=args.chunksize, cache=cache,
+                       read_options=read_options)
+
+    train_oper = loader.get("train", "oper")
+    train_tte = loader.get("train", "tte")
+    train_spec = loader.get("train", "spec")
+
     # -------------------------
     # 2) Build TRAIN features
     # -------------------------
+    # Shared process pool for sharded per-vehicle aggregation (None = serial)
+    executor = ProcessPoolExecutor(max_workers=args.workers) if args.workers > 1 else None
+
     print("\nBuilding TRAIN features...")
     train_features, spec_feature_cols, feature_columns = build_train_features(
         df_oper=train_oper,
@@ -160,64 +476,45 @@ def main():
         time_col=TIME_COL,
         vehicle_col=VEHICLE_COL,
         target_col=TARGET_COL,
+        executor=executor,
+        required_columns=required_columns,
     )
+    if required_columns is not None and len(feature_columns) < len(required_columns):
+        missing = [c for c in required_columns if c not in set(feature_columns)]
+        print(f"Warning: {len(missing)} requested features cannot be built from TRAIN: {missing[:10]}")
 
     print("TRAIN feature matrix shape:", train_features.shape)
-    train_out_path = "train_vehicle_features.csv"
-    train_features.to_csv(train_out_path, index=False)
+    train_out_path = save_features(train_features, "train", args.output_format)
     print(f"Saved TRAIN features to: {train_out_path}")
+    del train_oper, train_tte, train_spec  # free raw TRAIN rows before VALIDATION/TEST
 
     # -------------------------
-    # 3) Build VALIDATION features
+    # 3) Build VALIDATION + TEST features
     # -------------------------
-    print("\nBuilding VALIDATION features...")
-    val_oper = read_csv_from_adls(fs, RAW_PATHS["validation"]["oper"])
-    val_tte = read_csv_from_adls(fs, RAW_PATHS["validation"]["tte"])
-    val_spec = read_csv_from_adls(fs, RAW_PATHS["validation"]["spec"])
-
-    val_features = build_eval_features(
-        df_oper=val_oper,
-        df_tte=val_tte,
-        df_spec=val_spec,
-        counter_cols=counter_cols_present,
-        histogram_groups=histogram_groups,
-        spec_feature_cols=spec_feature_cols,
-        feature_columns=feature_columns,
-        time_col=TIME_COL,
-        vehicle_col=VEHICLE_COL,
-        target_col=TARGET_COL,
-    )
-
-    print("VALIDATION feature matrix shape:", val_features.shape)
-    val_out_path = "validation_vehicle_features.csv"
-    val_features.to_csv(val_out_path, index=False)
-    print(f"Saved VALIDATION features to: {val_out_path}")
-
-    # -------------------------
-    # 4) Build TEST features
-    # -------------------------
-    print("\nBuilding TEST features...")
-    test_oper = read_csv_from_adls(fs, RAW_PATHS["test"]["oper"])
-    test_tte = read_csv_from_adls(fs, RAW_PATHS["test"]["tte"])
-    test_spec = read_csv_from_adls(fs, RAW_PATHS["test"]["spec"])
-
-    test_features = build_eval_features(
-        df_oper=test_oper,
-        df_tte=test_tte,
-        df_spec=test_spec,
-        counter_cols=counter_cols_present,
-        histogram_groups=histogram_groups,
-        spec_feature_cols=spec_feature_cols,
-        feature_columns=feature_columns,
-        time_col=TIME_COL,
-        vehicle_col=VEHICLE_COL,
-        target_col=TARGET_COL,
-    )
-
-    print("TEST feature matrix shape:", test_features.shape)
-    test_out_path = "test_vehicle_features.csv"
-    test_features.to_csv(test_out_path, index=False)
-    print(f"Saved TEST features to: {test_out_path}")
+    # Both only depend on the train-derived spec_feature_cols / feature_columns,
+    # so with --workers > 1 they are built at the same time on the shared pool.
+    def build_split(split: str):
+        return build_eval_split(
+            loader, split, counter_cols_present, histogram_groups,
+            spec_feature_cols, feature_columns, executor, args.output_format,
+        )
+
+    if executor is None:
+        for split in ("validation", "test"):
+            build_split(split)
+    else:
+        with ThreadPoolExecutor(max_workers=2) as split_pool:
+            list(split_pool.map(build_split, ("validation", "test")))
+        executor.shutdown()
+
+    loader.shutdown()
+    loader.report()
+
+    if METRICS.enabled:
+        print("\nFeature build stages:")
+        print(METRICS.summary_table())
+        if args.metrics_out:
+            write_metrics(args.metrics_out)
 
     print("\n✅ Done. Feature matrices built for train, validation, and test.")
 
@@ -0,0 +1,68 @@
+"""
+Compile the serving feature plan (deployment/feature_plan.json) from the model's
+feature list (deployment/feature_cols.json).
+
+The plan lets deployment/score.py compute features from raw operational readouts
+and specifications (see src.feature_engineering.FeaturePlan).
+
+Run from the repository root, e.g.:
+
+    python scripts/compile_feature_plan.py
+    python scripts/compile_feature_plan.py --spec-columns-from train_specifications.csv
+
+    # Pruned list (scripts/select_features.py): take the raw schema from the full list
+    python scripts/compile_feature_plan.py --feature-cols selected_features/feature_cols.json \
+        --schema-feature-cols train_feature_cols.json
+"""
+
+import argparse
+import os
+import sys
+
+import pandas as pd
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, ".."))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from src.feature_engineering import FeaturePlan
+from src.feature_io import load_feature_cols
+
+DEPLOYMENT_DIR = os.path.join(REPO_ROOT, "deployment")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile the serving feature plan.")
+    parser.add_argument("--feature-cols", default=os.path.join(DEPLOYMENT_DIR, "feature_cols.json"))
+    parser.add_argument("--out", default=os.path.join(DEPLOYMENT_DIR, "feature_plan.json"))
+    parser.add_argument("--spec-columns-from", default=None,
+                        help="Raw specifications CSV; its header gives the exact spec column names.")
+    parser.add_argument("--schema-feature-cols", default=None,
+                        help="Full (unpruned) feature list to recover the raw schema from; needed when "
+                             "--feature-cols lacks a counter's _first column or some histogram bins.")
+    args = parser.parse_args(argv)
+
+    spec_columns = None
+    if args.spec_columns_from:
+        header = pd.read_csv(args.spec_columns_from, nrows=0).columns
+        spec_columns = [c for c in header if c != "vehicle_id"]
+
+    feature_cols = load_feature_cols(args.feature_cols)
+    if args.schema_feature_cols:
+        schema = FeaturePlan.from_feature_columns(load_feature_cols(args.schema_feature_cols), spec_columns=spec_columns)
+        plan = schema.select(feature_cols)
+    else:
+        plan = FeaturePlan.from_feature_columns(feature_cols, spec_columns=spec_columns)
+    plan.save(args.out)
+
+    n_bins = sum(len(v) for v in plan.histogram_groups.values())
+    print(f"Counters: {len(plan.counter_cols)}, histogram groups: {len(plan.histogram_groups)} "
+          f"({n_bins} bins), spec columns: {len(plan.spec_categories)}")
+    print(f"Raw readout columns read: {len(plan.raw_columns)}, "
+          f"partial statistics per vehicle: {plan.needs.n_partials()}")
+    print(f"Saved feature plan for {len(plan.feature_columns)} model columns → {args.out}")
+
+
+if __name__ == "__main__":
+    main()
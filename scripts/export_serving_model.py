@@ -0,0 +1,118 @@
+"""
+Export the tuned XGBoost model to startup-friendly formats for deployment/score.py.
+
+- xgb_pdm_finetuned.ubj – native XGBoost UBJSON booster (SCORE_BACKEND=native):
+                          no joblib unpickling, no scikit-learn wrapper
+- xgb_pdm_finetuned.npz – flat NumPy tree arrays (SCORE_BACKEND=arrays, see
+                          src/tree_ensemble.py): no xgboost at all
+
+Each exported file is loaded back and checked against `predict_proba` on a feature
+file (if given) and on random inputs with missing values. Exits with an error if the
+difference exceeds --tolerance.
+
+Run from the repository root, e.g.:
+
+    python scripts/export_serving_model.py --model-dir ./model
+    python scripts/export_serving_model.py --model-dir ./model --formats npz \
+        --check-features test_vehicle_features.arrow
+
+Deploy by registering the exported files together with the model (or placing them
+next to score.py) and setting SCORE_BACKEND on the deployment.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import joblib
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, ".."))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from src.feature_io import load_feature_cols, read_feature_matrix
+from src.predictor import BoosterPredictor, save_native_model
+from src.tree_ensemble import TreeEnsemble, export_tree_ensemble
+
+MODEL_FILENAME = "xgb_pdm_finetuned.pkl"
+EXPORT_FILENAMES = {
+    "ubj": "xgb_pdm_finetuned.ubj",
+    "npz": "xgb_pdm_finetuned.npz",
+}
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Export the tuned model for fast scoring startup.")
+    parser.add_argument("--model-dir", default=os.getenv("AZUREML_MODEL_DIR", "."),
+                        help=f"Directory containing {MODEL_FILENAME} (default: $AZUREML_MODEL_DIR or .).")
+    parser.add_argument("--formats", nargs="+", choices=sorted(EXPORT_FILENAMES), default=["ubj", "npz"],
+                        help="Formats to export (default: ubj npz).")
+    parser.add_argument("--out-dir", default=None,
+                        help="Output directory (default: --model-dir).")
+    parser.add_argument("--feature-cols", default=os.path.join(REPO_ROOT, "deployment", "feature_cols.json"),
+                        help="Ordered model feature list (default: deployment/feature_cols.json).")
+    parser.add_argument("--check-features", default=None,
+                        help="Feature file (.arrow, .parquet or .csv) to compare predictions on.")
+    parser.add_argument("--check-rows", type=int, default=10_000,
+                        help="Random rows (30%% missing) to compare predictions on (default: 10000).")
+    parser.add_argument("--tolerance", type=float, default=1e-5,
+                        help="Maximum allowed absolute probability difference (default: 1e-5).")
+    return parser.parse_args(argv)
+
+
+def export(model, fmt: str, path: str):
+    """Write `model` in `fmt` and return a predict function loaded back from the file."""
+    if fmt == "ubj":
+        import xgboost
+
+        save_native_model(model, path)
+        return BoosterPredictor(xgboost.Booster(model_file=path)).predict_proba
+
+    ensemble = export_tree_ensemble(model)
+    ensemble.save(path)
+    print(f"  {ensemble.n_trees} trees, depth {ensemble.max_depth}, {ensemble.feature.shape[1]} node slots")
+    return TreeEnsemble.load(path).predict_proba
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    model_path = os.path.join(args.model_dir, MODEL_FILENAME)
+    out_dir = args.out_dir or args.model_dir
+
+    print(f"Loading model from: {model_path}")
+    model = joblib.load(model_path)
+
+    checks = {}
+    if args.check_features:
+        X, _, _ = read_feature_matrix(args.check_features, feature_cols=load_feature_cols(args.feature_cols))
+        checks[args.check_features] = X.to_numpy(dtype=np.float32)
+    if args.check_rows:
+        rng = np.random.default_rng(0)
+        n_features = model.get_booster().num_features()
+        X = rng.lognormal(mean=3.0, sigma=2.0, size=(args.check_rows, n_features)).astype(np.float32)
+        X[rng.random(X.shape) < 0.3] = np.nan
+        checks["random"] = X
+    expected = {name: model.predict_proba(X)[:, 1] for name, X in checks.items()}
+
+    worst = 0.0
+    for fmt in args.formats:
+        out_path = os.path.join(out_dir, EXPORT_FILENAMES[fmt])
+        predict = export(model, fmt, out_path)
+        print(f"Exported {fmt} → {out_path} ({os.path.getsize(out_path) / 1024 ** 2:.1f} MB)")
+
+        for name, X in checks.items():
+            t0 = time.perf_counter()
+            diff = float(np.abs(predict(X) - expected[name]).max())
+            worst = max(worst, diff)
+            print(f"  {name}: {len(X)} rows, max |Δp| = {diff:.2e} ({time.perf_counter() - t0:.2f}s)")
+
+    if worst > args.tolerance:
+        raise SystemExit(f"Exported models differ from predict_proba by {worst:.2e} > {args.tolerance:.0e}.")
+    print("✅ Exported models match predict_proba.")
+
+
+if __name__ == "__main__":
+    main()
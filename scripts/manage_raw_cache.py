@@ -0,0 +1,63 @@
+"""
+Inspect and invalidate the local cache of parsed raw SCANIA files
+used by scripts/build_train_val_test_features.py.
+
+Run from the repository root, e.g.:
+
+    python scripts/manage_raw_cache.py list
+    python scripts/manage_raw_cache.py invalidate --path scania-dataset/train/train_tte.csv
+    python scripts/manage_raw_cache.py invalidate          # clear everything
+    python scripts/manage_raw_cache.py evict --max-gb 5
+"""
+
+import argparse
+import os
+import sys
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, ".."))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from src.raw_cache import RawDataCache
+
+DEFAULT_CACHE_DIR = os.environ.get("SCANIA_RAW_CACHE_DIR", os.path.join(REPO_ROOT, ".raw_cache"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the local raw data cache.")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("list", help="List cache entries (least recently used first).")
+
+    p_inv = sub.add_parser("invalidate", help="Remove entries for one remote path, or all entries.")
+    p_inv.add_argument("--path", default=None, help="Remote path, e.g. scania-dataset/train/train_tte.csv")
+
+    p_evict = sub.add_parser("evict", help="Evict least recently used entries down to a size budget.")
+    p_evict.add_argument("--max-gb", type=float, required=True)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "evict":
+        cache = RawDataCache(args.cache_dir, max_bytes=int(args.max_gb * 1024 ** 3))
+        evicted = cache.evict()
+        print(f"Evicted {len(evicted)} entries: {evicted}")
+        return
+
+    cache = RawDataCache(args.cache_dir)
+
+    if args.command == "list":
+        entries = cache.entries()
+        for m in entries:
+            print(f"{m['bytes'] / 1024 ** 2:10.1f} MB  {m['path']}  ({m['fingerprint']})")
+        print(f"{len(entries)} entries, {cache.total_bytes() / 1024 ** 3:.2f} GB in {args.cache_dir}")
+
+    elif args.command == "invalidate":
+        removed = cache.invalidate(args.path)
+        target = args.path if args.path else "all paths"
+        print(f"Removed {removed} cache entries for {target}.")
+
+
+if __name__ == "__main__":
+    main()
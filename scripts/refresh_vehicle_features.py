@@ -0,0 +1,168 @@
+"""
+Incrementally refresh a per-vehicle feature matrix with newly appended readouts.
+
+Instead of rebuilding features from the full operational history, a persistent
+per-vehicle aggregate state (src.feature_engineering.VehicleAggregateState) is
+updated with only the new rows, and just the affected vehicles are re-finalized.
+
+Run this script from the repository root, e.g.:
+
+    # One-off: build the state from the full history of a split
+    python scripts/refresh_vehicle_features.py init \
+        --readouts train_operational_readouts.csv --state train_state.npz
+
+    # Daily: fold in new readouts and refresh the feature file in place
+    python scripts/refresh_vehicle_features.py update \
+        --readouts new_readouts.csv --state train_state.npz \
+        --features train_vehicle_features.arrow
+
+Readout files are local CSV (or Arrow / Parquet) files with the raw operational columns.
+"""
+
+import argparse
+import os
+import sys
+import time
+from typing import Optional
+
+import pandas as pd
+
+# Make sure we can import from src/
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, ".."))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from src.feature_engineering import VehicleAggregateState, refresh_vehicle_features
+from src.feature_io import read_feature_table, write_feature_table
+from src.raw_schema import (
+    COUNTER_COLS,
+    TARGET_COL,
+    TIME_COL,
+    VEHICLE_COL,
+    infer_histogram_groups,
+    raw_read_options,
+)
+
+# --------------------------------------------------------------------------------------
+# CONFIGURATION (same feature definition and raw schema as scripts/build_train_val_test_features.py)
+# --------------------------------------------------------------------------------------
+
+DEFAULT_CHUNKSIZE = 500_000
+
+
+# --------------------------------------------------------------------------------------
+# Helpers
+# --------------------------------------------------------------------------------------
+
+def read_readouts(path: str, chunksize: int):
+    """
+    Yield operational readouts from a local CSV in chunks, typed per src/raw_schema.py
+    (or a columnar file at once).
+    """
+    if path.endswith(".csv"):
+        header = pd.read_csv(path, nrows=0).columns
+        yield from pd.read_csv(path, chunksize=chunksize, **raw_read_options("oper", header))
+    else:
+        yield read_feature_table(path)
+
+
+def attach_new_vehicle_specs(df_features: pd.DataFrame, spec_path: Optional[str]) -> pd.DataFrame:
+    """
+    Fill specification columns of vehicles that were just added to the feature table
+    (vehicles already in the table keep their encoded specifications).
+    """
+    spec_cols = [c for c in df_features.columns if c.startswith("Spec_")]
+    missing = df_features[spec_cols].isna().all(axis=1) if spec_cols else pd.Series(False, index=df_features.index)
+    if spec_path is None or not missing.any():
+        return df_features
+
+    df_spec = pd.read_csv(spec_path, **raw_read_options("spec", pd.read_csv(spec_path, nrows=0).columns))
+    df_spec = df_spec[df_spec[VEHICLE_COL].isin(df_features.loc[missing, VEHICLE_COL])]
+    # Full one-hot encoding, then the training columns: unlike `encode_specifications`
+    # on a handful of vehicles, this does not depend on which category drop_first drops.
+    raw_spec_cols = [c for c in df_spec.columns if c != VEHICLE_COL]
+    df_spec_encoded = (
+        pd.get_dummies(df_spec, columns=raw_spec_cols)
+        .set_index(VEHICLE_COL)
+        .reindex(columns=spec_cols, fill_value=0)
+    )
+
+    df_features = df_features.set_index(VEHICLE_COL)
+    df_features.loc[df_spec_encoded.index, spec_cols] = df_spec_encoded.to_numpy(dtype=float)
+    return df_features.reset_index()
+
+
+# --------------------------------------------------------------------------------------
+# Commands
+# --------------------------------------------------------------------------------------
+
+def cmd_init(args: argparse.Namespace) -> None:
+    state = None
+    n_rows = 0
+    for chunk in read_readouts(args.readouts, args.chunksize):
+        if state is None:
+            histogram_groups = infer_histogram_groups(chunk.columns)
+            state = VehicleAggregateState(COUNTER_COLS, histogram_groups, TIME_COL, VEHICLE_COL)
+        state.update(chunk)
+        n_rows += len(chunk)
+
+    state.save(args.state)
+    print(f"Saved state for {state.n_vehicles} vehicles ({n_rows} readouts) → {args.state}")
+
+
+def cmd_update(args: argparse.Namespace) -> None:
+    t0 = time.perf_counter()
+    state = VehicleAggregateState.load(args.state)
+    df_features = read_feature_table(args.features)
+    n_before = len(df_features)
+
+    n_rows = 0
+    for chunk in read_readouts(args.readouts, args.chunksize):
+        df_features = refresh_vehicle_features(df_features, state, chunk)
+        n_rows += len(chunk)
+
+    df_features = attach_new_vehicle_specs(df_features, args.spec)
+
+    out_path = args.out or args.features
+    write_feature_table(df_features, out_path, vehicle_col=VEHICLE_COL, target_col=TARGET_COL)
+    state.save(args.state)
+
+    print(
+        f"Folded {n_rows} new readouts into {args.state}; "
+        f"{len(df_features) - n_before} new vehicles; wrote {out_path} "
+        f"in {time.perf_counter() - t0:.1f}s"
+    )
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Incrementally refresh per-vehicle features.")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE,
+                        help="Rows per chunk when reading readout CSVs.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_init = sub.add_parser("init", help="Build the aggregate state from a full readout history.")
+    p_init.add_argument("--readouts", required=True)
+    p_init.add_argument("--state", required=True, help="Output state file (.npz).")
+
+    p_update = sub.add_parser("update", help="Fold new readouts into the state and refresh the features.")
+    p_update.add_argument("--readouts", required=True, help="Newly appended operational readouts.")
+    p_update.add_argument("--state", required=True, help="State file written by `init` (updated in place).")
+    p_update.add_argument("--features", required=True, help="Feature file built from the same history.")
+    p_update.add_argument("--out", default=None, help="Output feature file (default: overwrite --features).")
+    p_update.add_argument("--spec", default=None,
+                          help="Specifications CSV, used to encode vehicles that are new to the table.")
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == "init":
+        cmd_init(args)
+    else:
+        cmd_update(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Cost-based decision threshold search for the tuned model (notebook 05 as a script).
+
+Scores the validation split, evaluates cost = FN_COST * FN + FP_COST * FP at every
+distinct predicted probability (src/thresholding.py: one sort + cumulative sums,
+no grid) and writes the cost-optimal threshold to threshold_config.json, which
+deployment/score.py and scripts/batch_score.py read at startup.
+
+Optionally reports the chosen threshold on a held-out split (--eval-features) and
+saves the full sweep (--sweep-out) for plots such as cost vs threshold.
+
+Run from the repository root, e.g.:
+
+    python scripts/search_threshold.py --model-dir ./model \\
+        --features validation_vehicle_features.arrow --eval-features test_vehicle_features.arrow
+    python scripts/search_threshold.py --model-dir ./model --features validation_vehicle_features.csv \\
+        --fn-cost 100 --fp-cost 1 --sweep-out threshold_sweep.csv
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, ".."))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from src.feature_io import read_feature_matrix
+from src.predictor import BoosterPredictor
+from src.thresholding import (
+    FN_COST,
+    FP_COST,
+    THRESHOLD_CONFIG_FILENAME,
+    best_cost_threshold,
+    threshold_sweep,
+    write_threshold_config,
+)
+
+DEPLOYMENT_DIR = os.path.join(REPO_ROOT, "deployment")
+MODEL_FILENAME = "xgb_pdm_finetuned.pkl"
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Search the cost-optimal decision threshold.")
+    parser.add_argument("--model-dir", default=os.getenv("AZUREML_MODEL_DIR", "."),
+                        help=f"Directory containing {MODEL_FILENAME} (default: $AZUREML_MODEL_DIR or .).")
+    parser.add_argument("--features", required=True,
+                        help="Validation feature file with the target (.arrow, .parquet or .csv).")
+    parser.add_argument("--eval-features", default=None,
+                        help="Optional held-out feature file to report the chosen threshold on.")
+    parser.add_argument("--feature-cols", default=os.path.join(DEPLOYMENT_DIR, "feature_cols.json"),
+                        help="Ordered model feature list (default: deployment/feature_cols.json).")
+    parser.add_argument("--fn-cost", type=float, default=FN_COST,
+                        help=f"Cost per false negative / missed failure (default: {FN_COST}).")
+    parser.add_argument("--fp-cost", type=float, default=FP_COST,
+                        help=f"Cost per false positive / false alarm (default: {FP_COST}).")
+    parser.add_argument("--out", default=os.path.join(DEPLOYMENT_DIR, THRESHOLD_CONFIG_FILENAME),
+                        help="Threshold config to write (default: deployment/threshold_config.json).")
+    parser.add_argument("--sweep-out", default=None,
+                        help="Optional CSV with cost / precision / recall / F1 at every threshold.")
+    return parser.parse_args(argv)
+
+
+def score_file(predictor: BoosterPredictor, path: str, feature_cols_path: str):
+    """(y_true, y_proba) for a feature file with the target column."""
+    X, y, _ = read_feature_matrix(path, feature_cols_path=feature_cols_path)
+    if y is None:
+        raise ValueError(f"{path} has no target column; the threshold search needs labels.")
+    proba = predictor.predict_proba(np.ascontiguousarray(X.to_numpy(dtype=np.float32)))
+    return y.to_numpy().astype(int), proba
+
+
+def print_metrics(split_name: str, result, fn_cost: float, fp_cost: float) -> None:
+    print(f"=== {split_name} @ threshold={result['threshold']:.6f} ===")
+    print(f"Precision: {result['precision']:.4f}")
+    print(f"Recall   : {result['recall']:.4f}")
+    print(f"F1-score : {result['f1']:.4f}")
+    print(f"Cost     : {result['cost']:.1f}  (FN_COST={fn_cost:g}, FP_COST={fp_cost:g})")
+    print(f"TP={result['tp']}  FP={result['fp']}  FN={result['fn']}  TN={result['tn']}\n")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    model_path = os.path.join(args.model_dir, MODEL_FILENAME)
+    print(f"Loading model from: {model_path}")
+    predictor = BoosterPredictor(joblib.load(model_path))
+
+    y_val, proba_val = score_file(predictor, args.features, args.feature_cols)
+
+    start = time.perf_counter()
+    sweep = threshold_sweep(y_val, proba_val, args.fn_cost, args.fp_cost)
+    best = best_cost_threshold(y_val, proba_val, args.fn_cost, args.fp_cost)
+    elapsed = time.perf_counter() - start
+    print(f"Evaluated {len(sweep['threshold']):,} distinct thresholds on {len(y_val):,} rows "
+          f"in {1000 * elapsed:.1f} ms")
+    print_metrics(f"VALIDATION ({os.path.basename(args.features)})", best, args.fn_cost, args.fp_cost)
+
+    extra = {"validation_file": os.path.basename(args.features), "model_file": MODEL_FILENAME}
+    if args.eval_features:
+        y_eval, proba_eval = score_file(predictor, args.eval_features, args.feature_cols)
+        # Metrics of the fixed validation threshold (not re-optimized on the held-out split)
+        eval_sweep = threshold_sweep(y_eval, proba_eval, args.fn_cost, args.fp_cost)
+        k = max(int(np.searchsorted(-eval_sweep["threshold"], -best["threshold"], side="right")) - 1, 0)
+        eval_result = {name: values[k].item() for name, values in eval_sweep.items()}
+        eval_result["threshold"] = best["threshold"]
+        print_metrics(f"EVALUATION ({os.path.basename(args.eval_features)})", eval_result,
+                      args.fn_cost, args.fp_cost)
+        extra["evaluation_metrics"] = {name: v for name, v in eval_result.items() if name != "threshold"}
+
+    if args.sweep_out:
+        pd.DataFrame(sweep).to_csv(args.sweep_out, index=False)
+        print(f"Saved threshold sweep → {args.sweep_out}")
+
+    write_threshold_config(args.out, best, args.fn_cost, args.fp_cost, **extra)
+    print(f"Saved threshold config → {args.out} (best_threshold={best['threshold']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Prune the model's feature list and retrain on the kept features.
+
+Ranks the deployed model's features by split gain or by mean |SHAP| on the training
+rows (src/feature_selection.py), keeps the --top-k best or the fewest covering
+--coverage of the total importance, retrains the model with the same settings on those
+columns, and writes a deployable set to --out-dir:
+
+- feature_cols.json        the smaller, ordered feature list
+- feature_plan.json        its serving plan (only the raw columns it needs)
+- xgb_pdm_finetuned.pkl    the retrained model
+- selection_report.json    ranking, kept features, aggregates / raw columns before and
+                           after, and ROC-AUC / PR-AUC of both models with --eval-features
+
+Feature builds with the smaller list compute only the aggregates it needs, e.g.
+`build_train_val_test_features.py --feature-cols <out-dir>/feature_cols.json`.
+
+Run from the repository root, e.g.:
+
+    python scripts/select_features.py --train-features train_vehicle_features.arrow \\
+        --eval-features validation_vehicle_features.arrow --model-dir ./model --coverage 0.99
+    python scripts/select_features.py --train-features train_vehicle_features.arrow \\
+        --model-dir ./model --method contribution --top-k 100
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import joblib
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, ".."))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from src.feature_engineering import FeaturePlan
+from src.feature_io import load_feature_cols, read_feature_matrix
+from src.feature_selection import rank_by_contribution, rank_by_gain, retrain_on_features, select_top_features
+from src.predictor import BoosterPredictor
+
+DEPLOYMENT_DIR = os.path.join(REPO_ROOT, "deployment")
+MODEL_FILENAME = "xgb_pdm_finetuned.pkl"
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Rank, prune and retrain the failure model's features.")
+    parser.add_argument("--train-features", required=True,
+                        help="Training feature file with the target (.arrow, .parquet or .csv).")
+    parser.add_argument("--eval-features", default=None,
+                        help="Optional feature file to compare the full and pruned models on.")
+    parser.add_argument("--model-dir", default=os.getenv("AZUREML_MODEL_DIR", "."),
+                        help=f"Directory containing {MODEL_FILENAME} (default: $AZUREML_MODEL_DIR or .).")
+    parser.add_argument("--feature-cols", default=os.path.join(DEPLOYMENT_DIR, "feature_cols.json"),
+                        help="Ordered feature list of the model (default: deployment/feature_cols.json).")
+    parser.add_argument("--feature-plan", default=os.path.join(DEPLOYMENT_DIR, "feature_plan.json"),
+                        help="Serving plan of --feature-cols; compiled from the list if the file is missing.")
+    parser.add_argument("--method", choices=("gain", "contribution"), default="gain",
+                        help="Rank by total split gain or by mean |SHAP| on the training rows (default: gain).")
+    parser.add_argument("--top-k", type=int, default=None, help="Keep at most this many features.")
+    parser.add_argument("--coverage", type=float, default=None,
+                        help="Keep the fewest features covering this share of the total importance, e.g. 0.99.")
+    parser.add_argument("--out-dir", default="selected_features", help="Output directory (default: selected_features).")
+    args = parser.parse_args(argv)
+    if args.top_k is None and args.coverage is None:
+        parser.error("give --top-k and/or --coverage")
+    return args
+
+
+def evaluate(model, X, y) -> dict:
+    from sklearn.metrics import average_precision_score, roc_auc_score
+
+    proba = model.predict_proba(X)[:, 1]
+    return {"roc_auc": float(roc_auc_score(y, proba)), "pr_auc": float(average_precision_score(y, proba))}
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    os.makedirs(args.out_dir, exist_ok=True)
+
+    feature_cols = load_feature_cols(args.feature_cols)
+    if os.path.exists(args.feature_plan):
+        plan = FeaturePlan.load(args.feature_plan)
+    else:
+        plan = FeaturePlan.from_feature_columns(feature_cols)
+    if plan.feature_columns != feature_cols:
+        raise ValueError(f"{args.feature_plan} does not match {args.feature_cols}; recompile the plan.")
+
+    model = joblib.load(os.path.join(args.model_dir, MODEL_FILENAME))
+    X, y, _ = read_feature_matrix(args.train_features, feature_cols=feature_cols)
+    if y is None:
+        raise ValueError(f"{args.train_features} has no target column.")
+
+    start = time.perf_counter()
+    if args.method == "gain":
+        ranking = rank_by_gain(model, feature_cols)
+    else:
+        ranking = rank_by_contribution(BoosterPredictor(model), X.to_numpy(dtype=np.float32), feature_cols)
+    selected = select_top_features(ranking, top_k=args.top_k, coverage=args.coverage, feature_order=feature_cols)
+    print(f"Ranked {len(feature_cols)} features by {args.method} in {time.perf_counter() - start:.1f}s; "
+          f"keeping {len(selected)}")
+
+    pruned_plan = plan.select(selected)
+    start = time.perf_counter()
+    pruned_model = retrain_on_features(model, X, y, selected)
+    print(f"Retrained on {len(selected)} features in {time.perf_counter() - start:.1f}s")
+
+    with open(os.path.join(args.out_dir, "feature_cols.json"), "w") as f:
+        json.dump(selected, f)
+    pruned_plan.save(os.path.join(args.out_dir, "feature_plan.json"))
+    joblib.dump(pruned_model, os.path.join(args.out_dir, MODEL_FILENAME))
+
+    report = {
+        "method": args.method,
+        "top_k": args.top_k,
+        "coverage": args.coverage,
+        "n_features": {"full": len(feature_cols), "selected": len(selected)},
+        "raw_columns": {"full": len(plan.raw_columns), "selected": len(pruned_plan.raw_columns)},
+        "partial_statistics": {"full": plan.needs.n_partials(), "selected": pruned_plan.needs.n_partials()},
+        "selected": selected,
+        "ranking": ranking,
+    }
+    print(f"Raw readout columns: {len(plan.raw_columns)} -> {len(pruned_plan.raw_columns)}, "
+          f"partial statistics per vehicle: {plan.needs.n_partials()} -> {pruned_plan.needs.n_partials()}")
+
+    if args.eval_features:
+        X_eval, y_eval, _ = read_feature_matrix(args.eval_features, feature_cols=feature_cols)
+        report["evaluation"] = {
+            "file": os.path.basename(args.eval_features),
+            "full": evaluate(model, X_eval, y_eval),
+            "selected": evaluate(pruned_model, X_eval[selected], y_eval),
+        }
+        for name, metrics in report["evaluation"].items():
+            if name != "file":
+                print(f"{name:>8}: ROC-AUC={metrics['roc_auc']:.4f}  PR-AUC={metrics['pr_auc']:.4f}")
+
+    with open(os.path.join(args.out_dir, "selection_report.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved feature_cols.json, feature_plan.json, {MODEL_FILENAME} and selection_report.json → {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Hyperparameter search for the failure model (notebook 04 without RandomizedSearchCV).
+
+Quantizes the CV folds of the training features once, searches --n-configs random
+configurations from notebook 04's space with successive halving and early stopping
+on validation aucpr (src/tuning.py), then trains the final XGBClassifier on all
+training rows with the best configuration and its early-stopping round count.
+
+Outputs:
+- --out-model:  the tuned model (joblib pickle, same format as xgb_pdm_finetuned.pkl)
+- --out-report: search settings, per-rung progress, every trial's CV aucpr and, with
+                --eval-features, ROC-AUC / PR-AUC of the final model on that split
+
+Run from the repository root, e.g.:
+
+    python scripts/tune_model.py --train-features train_vehicle_features.arrow \\
+        --eval-features validation_vehicle_features.arrow --n-configs 100
+    python scripts/tune_model.py --train-features train_vehicle_features.arrow \\
+        --n-configs 300 --min-rounds 5 --max-rounds 1500 --n-parallel 4
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import joblib
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, ".."))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from src.feature_io import read_feature_matrix
+from src.tuning import (
+    available_cpus,
+    build_cv_folds,
+    default_search_space,
+    fit_tuned_model,
+    sample_configurations,
+    split_cores,
+    successive_halving,
+)
+
+MODEL_FILENAME = "xgb_pdm_finetuned.pkl"
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Tune the XGBoost failure model with successive halving.")
+    parser.add_argument("--train-features", required=True,
+                        help="Training feature file with the target (.arrow, .parquet or .csv).")
+    parser.add_argument("--eval-features", default=None,
+                        help="Optional feature file to report the final model's ROC-AUC / PR-AUC on.")
+    parser.add_argument("--feature-cols", default=None,
+                        help="Ordered feature list (default: every column except vehicle_id and the target).")
+    parser.add_argument("--n-configs", type=int, default=100, help="Random configurations (default: 100).")
+    parser.add_argument("--cv", type=int, default=3, help="CV folds (default: 3).")
+    parser.add_argument("--min-rounds", type=int, default=10, help="Rounds at the first rung (default: 10).")
+    parser.add_argument("--max-rounds", type=int, default=1000, help="Rounds at the last rung (default: 1000).")
+    parser.add_argument("--eta", type=int, default=3,
+                        help="Keep 1/eta of the configurations per rung, eta x the rounds (default: 3).")
+    parser.add_argument("--early-stopping-rounds", type=int, default=50,
+                        help="Stop a fold after this many rounds without a better validation aucpr (default: 50).")
+    parser.add_argument("--max-bin", type=int, default=256, help="Histogram bins per feature (default: 256).")
+    parser.add_argument("--n-parallel", type=int, default=None,
+                        help="Fits run at once; the CPUs are split between them (default: CPUs / 2).")
+    parser.add_argument("--cpus", type=int, default=None, help="CPUs to use (default: all available).")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for folds and configuration sampling.")
+    parser.add_argument("--out-model", default=MODEL_FILENAME, help=f"Tuned model (default: {MODEL_FILENAME}).")
+    parser.add_argument("--out-report", default="tuning_report.json", help="Search report (JSON).")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    cpus = args.cpus or available_cpus()
+    n_parallel, nthread = split_cores(args.n_parallel, cpus)
+
+    X, y, _ = read_feature_matrix(args.train_features, feature_cols_path=args.feature_cols)
+    if y is None:
+        raise ValueError(f"{args.train_features} has no target column.")
+    y = y.to_numpy().astype(int)
+    print(f"Training rows: {len(X):,}, features: {X.shape[1]}, positives: {int(y.sum()):,}")
+
+    start = time.perf_counter()
+    folds = build_cv_folds(X, y, n_splits=args.cv, max_bin=args.max_bin, nthread=cpus, seed=args.seed)
+    fold_s = time.perf_counter() - start
+    print(f"Quantized {args.cv} CV folds in {fold_s:.1f}s (max_bin={args.max_bin})")
+
+    configs = sample_configurations(default_search_space(y), args.n_configs, seed=args.seed)
+    print(f"Searching {len(configs)} configurations: {n_parallel} parallel fits x {nthread} threads")
+    search = successive_halving(
+        folds,
+        configs,
+        min_rounds=args.min_rounds,
+        max_rounds=args.max_rounds,
+        eta=args.eta,
+        early_stopping_rounds=args.early_stopping_rounds,
+        n_parallel=n_parallel,
+        cpus=cpus,
+    )
+    del folds
+    print(f"Best CV PR-AUC: {search['best_cv_aucpr']:.4f} at {search['best_rounds']} rounds "
+          f"({search['elapsed_s']:.1f}s)")
+    print(f"Best params: {search['best_params']}")
+
+    model = fit_tuned_model(X, y, search["best_params"], search["best_rounds"], n_jobs=cpus, max_bin=args.max_bin)
+    joblib.dump(model, args.out_model)
+    print(f"Saved tuned model → {args.out_model}")
+
+    report = {
+        "settings": {k: v for k, v in vars(args).items() if not k.startswith("out_")},
+        "fold_build_s": fold_s,
+        **search,
+    }
+    if args.eval_features:
+        from sklearn.metrics import average_precision_score, roc_auc_score
+
+        X_eval, y_eval, _ = read_feature_matrix(args.eval_features, feature_cols=list(X.columns))
+        proba = model.predict_proba(X_eval)[:, 1]
+        report["evaluation"] = {
+            "file": os.path.basename(args.eval_features),
+            "roc_auc": float(roc_auc_score(y_eval, proba)),
+            "pr_auc": float(average_precision_score(y_eval, proba)),
+        }
+        print(f"{args.eval_features}: ROC-AUC={report['evaluation']['roc_auc']:.4f}  "
+              f"PR-AUC={report['evaluation']['pr_auc']:.4f}")
+
+    with open(args.out_report, "w") as f:
+        json.dump(report, f, indent=2, default=lambda v: v.item() if isinstance(v, np.generic) else str(v))
+    print(f"Saved tuning report → {args.out_report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""
+Micro-batching of concurrent scoring requests.
+
+`MicroBatcher` collects feature matrices submitted from concurrent request threads
+for up to `max_wait_ms` (or until `max_batch_rows` rows are waiting), runs one
+prediction over the stacked matrix on a background thread and hands every caller
+its own slice of the result. Requests that are already large bypass the queue.
+`close()` stops the worker thread after the requests already queued.
+
+Reported (see `MicroBatcher.stats`): queue depth, batch-size distribution
+(requests and rows per batch) and the wait added to each request.
+"""
+
+import queue
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_MAX_BATCH_ROWS = 256
+DEFAULT_MAX_WAIT_MS = 2.0
+# Queued by close(): the worker finishes the batch it is collecting and exits
+_STOP = object()
+
+
+def _percentiles_ms(values) -> Dict[str, float]:
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    arr = np.asarray(values) * 1000.0
+    p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+    return {"p50": float(p50), "p95": float(p95), "p99": float(p99), "max": float(arr.max())}
+
+
+def _rows_bucket(n_rows: int) -> str:
+    """Power-of-two bucket label for a batch size, e.g. 5 -> "5-8"."""
+    upper = 1
+    while upper < n_rows:
+        upper *= 2
+    lower = upper // 2 + 1 if upper > 1 else 1
+    return str(upper) if lower == upper else f"{lower}-{upper}"
+
+
+class MicroBatcher:
+    """
+    Coalesce concurrent `predict(X)` calls into batched `predict_fn` calls.
+
+    `predict_fn` maps an (n_rows, n_features) float32 matrix to n_rows outputs and must
+    be thread-safe: batches run on the worker thread, while requests of
+    `max_batch_rows` rows or more call it directly on the caller's thread, so both can
+    run at the same time.
+    """
+
+    def __init__(
+        self,
+        predict_fn: Callable[[np.ndarray], np.ndarray],
+        max_batch_rows: int = DEFAULT_MAX_BATCH_ROWS,
+        max_wait_ms: float = DEFAULT_MAX_WAIT_MS,
+        report_every: int = 1000,
+        history: int = 10000,
+    ):
+        self.predict_fn = predict_fn
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait_ms / 1000.0
+        self.report_every = report_every
+
+        self._queue: "queue.Queue[Tuple[np.ndarray, Future, float]]" = queue.Queue()
+        self._lock = threading.Lock()
+        # Held across the closed check and the enqueue, so nothing is queued after _STOP
+        self._submit_lock = threading.Lock()
+        self._requests_per_batch: Counter = Counter()
+        self._rows_per_batch: Counter = Counter()
+        self._waits = deque(maxlen=history)
+        self._n_batches = 0
+        self._n_requests = 0
+        self._n_bypassed = 0
+        self._max_queue_depth = 0
+        self._closed = False
+        self._stopping = False
+
+        self._worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._worker.start()
+
+    # ----------------------------------------------------------------------------------
+    # Caller side
+    # ----------------------------------------------------------------------------------
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Predictions for `X`, computed as part of a batch with concurrent callers."""
+        if len(X) >= self.max_batch_rows:
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed.")
+            with self._lock:
+                self._n_bypassed += 1
+            return self.predict_fn(X)
+
+        future: Future = Future()
+        with self._submit_lock:
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed.")
+            self._queue.put((X, future, time.perf_counter()))
+        return future.result()
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """
+        Stop the worker thread: requests queued before the call are still answered,
+        later `predict` calls raise RuntimeError. Waits up to `timeout` seconds for it.
+        """
+        with self._submit_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        self._worker.join(timeout)
+
+    # ----------------------------------------------------------------------------------
+    # Worker side
+    # ----------------------------------------------------------------------------------
+
+    def _collect(self) -> List[Tuple[np.ndarray, Future, float]]:
+        """Block for one request, then gather more until the wait or size budget is used."""
+        first = self._queue.get()
+        if first is _STOP:
+            return []
+        batch = [first]
+        n_rows = len(first[0])
+        deadline = first[2] + self.max_wait
+
+        while n_rows < self.max_batch_rows:
+            timeout = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._stopping = True
+                break
+            batch.append(item)
+            n_rows += len(item[0])
+        return batch
+
+    def _run(self) -> None:
+        while not self._stopping:
+            batch = self._collect()
+            if not batch:
+                return
+            started = time.perf_counter()
+            queue_depth = self._queue.qsize()
+
+            matrices = [X for X, _, _ in batch]
+            try:
+                outputs = self.predict_fn(matrices[0] if len(matrices) == 1 else np.concatenate(matrices))
+            except Exception as e:  # every caller in the batch gets the error
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            offset = 0
+            for X, future, _ in batch:
+                future.set_result(outputs[offset: offset + len(X)])
+                offset += len(X)
+
+            self._record(batch, offset, started, queue_depth)
+
+    def _record(self, batch, n_rows: int, started: float, queue_depth: int) -> None:
+        with self._lock:
+            self._n_batches += 1
+            self._n_requests += len(batch)
+            self._requests_per_batch[len(batch)] += 1
+            self._rows_per_batch[_rows_bucket(n_rows)] += 1
+            self._waits.extend(started - submitted for _, _, submitted in batch)
+            self._max_queue_depth = max(self._max_queue_depth, queue_depth + len(batch))
+            report = self.report_every and self._n_batches % self.report_every == 0
+
+        if report:
+            s = self.stats()
+            print(
+                f"[micro-batcher] batches={s['batches']} requests={s['requests']} "
+                f"mean_requests_per_batch={s['mean_requests_per_batch']:.2f} "
+                f"added_wait_ms p50={s['added_wait_ms']['p50']:.2f} p99={s['added_wait_ms']['p99']:.2f} "
+                f"max_queue_depth={s['max_queue_depth']}"
+            )
+
+    # ----------------------------------------------------------------------------------
+    # Metrics
+    # ----------------------------------------------------------------------------------
+
+    def stats(self) -> Dict:
+        """Snapshot of the batching metrics (wait percentiles over the recent history)."""
+        with self._lock:
+            waits = list(self._waits)
+            return {
+                "batches": self._n_batches,
+                "requests": self._n_requests,
+                "bypassed": self._n_bypassed,
+                "mean_requests_per_batch": self._n_requests / self._n_batches if self._n_batches else 0.0,
+                "requests_per_batch": {str(k): v for k, v in sorted(self._requests_per_batch.items())},
+                "rows_per_batch": dict(self._rows_per_batch),
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self._max_queue_depth,
+                "added_wait_ms": _percentiles_ms(waits),
+                "max_batch_rows": self.max_batch_rows,
+                "max_wait_ms": self.max_wait * 1000.0,
+            }
@@ -0,0 +1,100 @@
+"""
+Per-feature explanations of failure predictions from the booster's own TreeSHAP.
+
+Notebook 07 used a permutation explainer around `predict_proba` (thousands of model
+calls per row, so FP / FN explanations were capped at 200 rows). `BoosterPredictor.
+contributions` instead asks XGBoost for exact SHAP values (`pred_contribs`) in one pass
+over the trees per row. Values are in log-odds: for every row the contributions plus the
+bias sum to the model margin, logit(P(failure)).
+
+- `feature_contributions`: all rows in batches of `batch_rows`, optionally on several
+  threads (XGBoost releases the GIL), e.g. for the whole test set.
+- `top_contributions` / `explanation_rows`: the k features with the largest absolute
+  contribution per row, as used by the endpoint's `explain` option.
+- `mean_abs_contributions`: global importance (mean |SHAP|) of a set of rows.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+DEFAULT_TOP_K = 5
+
+
+def feature_contributions(
+    predictor,
+    X: np.ndarray,
+    batch_rows: int = 10_000,
+    n_jobs: int = 1,
+    approx: bool = False,
+) -> np.ndarray:
+    """
+    (n_rows, n_features + 1) float32 contributions of a `BoosterPredictor`; the last
+    column is the bias. With n_jobs > 1, batches run concurrently; give the predictor
+    nthread = CPUs // n_jobs so the threads do not oversubscribe the cores.
+    """
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    out = np.empty((len(X), X.shape[1] + 1), dtype=np.float32)
+    starts = range(0, len(X), batch_rows)
+
+    def run(start: int) -> None:
+        out[start: start + batch_rows] = predictor.contributions(X[start: start + batch_rows], approx=approx)
+
+    if n_jobs > 1 and len(starts) > 1:
+        with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+            list(pool.map(run, starts))
+    else:
+        for start in starts:
+            run(start)
+    return out
+
+
+def top_contributions(contribs: np.ndarray, k: int = DEFAULT_TOP_K) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Indices and values of the k largest |contributions| per row, largest first.
+    `contribs` is the output of `feature_contributions` (the bias column is ignored).
+    """
+    features = contribs[:, :-1]
+    k = min(k, features.shape[1])
+    magnitude = np.abs(features)
+    top = np.argpartition(-magnitude, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(magnitude, top, axis=1), axis=1, kind="stable")
+    top = np.take_along_axis(top, order, axis=1)
+    return top, np.take_along_axis(features, top, axis=1)
+
+
+def explanation_rows(
+    indices: np.ndarray,
+    values: np.ndarray,
+    feature_names: Sequence[str],
+    X: Optional[np.ndarray] = None,
+) -> List[List[Dict]]:
+    """
+    Per row, a list of {"feature", "contribution"[, "value"]} dicts for the top
+    contributions (feature values are included when X is given; missing -> None).
+    """
+    names = np.asarray(feature_names, dtype=object)[indices].tolist()
+    contributions = values.astype(np.float64).tolist()
+    if X is None:
+        return [
+            [{"feature": n, "contribution": c} for n, c in zip(row_names, row_values)]
+            for row_names, row_values in zip(names, contributions)
+        ]
+
+    feature_values = np.take_along_axis(np.asarray(X, dtype=np.float64), indices, axis=1)
+    feature_values = np.where(np.isnan(feature_values), None, feature_values).tolist()
+    return [
+        [{"feature": n, "contribution": c, "value": v} for n, c, v in zip(row_names, row_values, row_x)]
+        for row_names, row_values, row_x in zip(names, contributions, feature_values)
+    ]
+
+
+def mean_abs_contributions(contribs: np.ndarray, feature_names: Sequence[str], mask=None) -> Dict[str, float]:
+    """Mean |contribution| per feature over the rows in `mask` (all rows if None), largest first."""
+    features = contribs[:, :-1] if mask is None else contribs[np.asarray(mask), :-1]
+    if len(features) == 0:
+        return {}
+    mean_abs = np.abs(features).mean(axis=0, dtype=np.float64)
+    order = np.argsort(-mean_abs, kind="stable")
+    return {feature_names[i]: float(mean_abs[i]) for i in order}
@@ -2,17 +2,29 @@
 Feature engineering module for SCANIA Predictive Maintenance.
 
 Contains functions to:
-- Merge operational, TTE, and specification datasets
+- Aggregate operational readouts per vehicle in a single pass
+  (in memory, or streamed chunk by chunk with mergeable partial aggregates)
+- Join TTE labels and specifications at vehicle granularity
 - Compute counter-based features per vehicle
 - Compute histogram-based features (bin stats + totals + centroids)
 - Encode specification columns
 - Build final per-vehicle feature matrix
 - Align validation/test features to match training feature columns
+- Compute model inputs from raw readouts at serving time (FeaturePlan)
+- Plan the aggregates a (pruned) feature list needs, and compute only those
+- Compute aggregates / features as of many cutoff time steps per vehicle in one pass
 """
 
+import json
+import os
+from functools import partial
+
 import numpy as np
 import pandas as pd
-from typing import Dict, List, Tuple
+from concurrent.futures import Executor
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from src.instrumentation import stage
 
 def _ensure_target_dataframe(df_tte: pd.DataFrame, vehicle_col: str, target_col: str) -> pd.DataFrame:
     """
@@ -49,16 +61,6 @@ def _ensure_target_dataframe(df_tte: pd.DataFrame, vehicle_col: str, target_col:
     )
 
 
-def _compute_study_length_from_oper(df_oper: pd.DataFrame, vehicle_col: str, time_col: str) -> pd.DataFrame:
-    """
-    Compute a proxy for study length per vehicle from operational data:
-    max(time_step) per vehicle.
-    """
-    sl = df_oper.groupby(vehicle_col)[time_col].max().reset_index()
-    sl = sl.rename(columns={time_col: "study_length_time_step"})
-    return sl
-
-
 # --------------------------------------------------------------------------------------
 # Utility: Linear trend (slope) and R²
 # --------------------------------------------------------------------------------------
@@ -134,25 +136,1185 @@ def compute_counter_features(group: pd.DataFrame, counter_cols: List[str], time_
 # Histogram-derived features (per row)
 # --------------------------------------------------------------------------------------
 
+def _histogram_total_centroid(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Total mass and centroid (weighted mean bin index) per row of a
+    (n_rows, n_bins) histogram matrix.
+    """
+    bin_idx = np.arange(values.shape[1])
+    total = np.nansum(values, axis=1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        centroid = np.nansum(values * bin_idx, axis=1) / total
+
+    return total, centroid
+
+
 def add_histogram_derived_columns(df: pd.DataFrame, histogram_groups: Dict[str, List[str]]) -> pd.DataFrame:
     """
     Add histogram-derived columns per row: total mass and centroid.
-    """
-    df = df.copy()
 
+    Only the derived columns are allocated and joined to `df` in one concat. Under
+    Copy-on-Write (pandas >= 3.0) the result shares the blocks of the wide frame
+    instead of copying them. `df` itself is not modified.
+
+    The aggregation engine (`build_vehicle_aggregates` and the builds on top of it)
+    does not call this; it computes totals / centroids per histogram family matrix.
+    """
+    derived = {}
     for prefix, cols in histogram_groups.items():
-        bin_idx = np.arange(len(cols))
-        values = df[cols].values.astype(float)
+        total, centroid = _histogram_total_centroid(df[cols].to_numpy(dtype=np.float64))
+
+        derived[f"{prefix}_total"] = total
+        derived[f"{prefix}_centroid"] = centroid
+
+    return pd.concat([df, pd.DataFrame(derived, index=df.index)], axis=1)
+
+
+# --------------------------------------------------------------------------------------
+# Per-vehicle partial aggregates (segment reductions over vehicle-sorted rows)
+# --------------------------------------------------------------------------------------
+#
+# Every counter and histogram feature is a function of a small set of mergeable
+# per-vehicle statistics. Moments are kept in centred form (count, mean, sum of squared
+# deviations, co-moment) rather than raw sums / sums of squares: they carry the same
+# information but stay accurate for large odometer-like counter values. Two partials
+# for the same vehicle are combined with the pairwise update of Chan et al.
+
+COUNTER_STATS: List[str] = ["first", "last", "delta", "mean", "std", "slope", "r2"]
+HIST_STATS: List[str] = ["mean", "std", "min", "max"]
+
+# Partial statistics per (vehicle, counter column)
+COUNTER_FIELDS: List[str] = [
+    "n", "mean", "m2",                                       # finite values
+    "first_t", "first_v", "last_t", "last_v",                # first/last finite value by time
+    "xy_n", "x_mean", "y_mean", "x_m2", "y_m2", "xy_c",      # trend fit (finite time + value)
+]
+# Partial statistics per (vehicle, histogram bin / derived column)
+HIST_FIELDS: List[str] = ["n", "mean", "m2", "min", "max"]
+
+# Which group of partial statistics each output statistic is computed from
+COUNTER_STAT_PARTS: Dict[str, str] = {
+    "first": "first_last", "last": "first_last", "delta": "first_last",
+    "mean": "moments", "std": "moments",
+    "slope": "trend", "r2": "trend",
+}
+HIST_STAT_PARTS: Dict[str, str] = {"mean": "moments", "std": "moments", "min": "extrema", "max": "extrema"}
+COUNTER_PART_FIELDS: Dict[str, List[str]] = {
+    "moments": ["n", "mean", "m2"],
+    "first_last": ["first_t", "first_v", "last_t", "last_v"],
+    "trend": ["xy_n", "x_mean", "y_mean", "x_m2", "y_m2", "xy_c"],
+}
+HIST_PART_FIELDS: Dict[str, List[str]] = {"moments": ["n", "mean", "m2"], "extrema": ["min", "max"]}
+# Counts and sums of squares of partials that were not computed are 0, everything else NaN
+_ZERO_FIELDS = {"n", "m2", "xy_n", "x_m2", "y_m2", "xy_c"}
+
+
+# --------------------------------------------------------------------------------------
+# Aggregate planning (required feature columns -> partial statistics to compute)
+# --------------------------------------------------------------------------------------
+
+class AggregateNeeds:
+    """
+    The part of the per-vehicle aggregation a list of required feature columns depends on.
+
+    counter_cols / histogram_groups : the counters and histogram families with at least one
+                                      required statistic (the layout of the partials)
+    counter_parts : counter column -> partial statistics needed ("moments", "first_last", "trend")
+    hist_parts    : histogram bin, <prefix>_total or <prefix>_centroid -> "moments" / "extrema"
+    columns       : required aggregate columns, in `build_vehicle_aggregates` order
+    raw_columns   : operational columns that have to be read (besides vehicle and time);
+                    every bin of a family whose total or centroid is required
+    """
+
+    def __init__(
+        self,
+        counter_parts: Dict[str, List[str]],
+        hist_parts: Dict[str, List[str]],
+        counter_cols: List[str],
+        histogram_groups: Dict[str, List[str]],
+        columns: List[str],
+    ):
+        self.counter_parts = counter_parts
+        self.hist_parts = hist_parts
+        self.counter_cols = counter_cols
+        self.histogram_groups = histogram_groups
+        self.columns = columns
+
+        self.raw_columns = list(counter_cols)
+        for prefix, cols in histogram_groups.items():
+            if self.needs_derived(prefix):
+                self.raw_columns += cols
+            else:
+                self.raw_columns += [c for c in cols if c in hist_parts]
+
+    def needs_derived(self, prefix: str) -> bool:
+        """True if the total or centroid of a histogram family is required."""
+        return f"{prefix}_total" in self.hist_parts or f"{prefix}_centroid" in self.hist_parts
+
+    def n_partials(self) -> int:
+        """Number of (column, partial statistic) pairs computed per vehicle."""
+        n = sum(len(COUNTER_PART_FIELDS[p]) for parts in self.counter_parts.values() for p in parts)
+        n += sum(len(HIST_PART_FIELDS[p]) for parts in self.hist_parts.values() for p in parts)
+        return n
+
+
+def plan_aggregates(
+    required_columns: Optional[Iterable[str]],
+    counter_cols: List[str],
+    histogram_groups: Dict[str, List[str]],
+) -> AggregateNeeds:
+    """
+    Plan the per-vehicle aggregation for a required feature list (e.g. a pruned
+    feature_cols.json): only the counters, histogram bins and statistics behind the
+    required columns are read and reduced. Columns of the list that are not aggregates
+    (spec one-hots, unknown names) are ignored. `None` requires every aggregate.
+    """
+    hist_cols = {prefix: list(cols) + [f"{prefix}_total", f"{prefix}_centroid"]
+                 for prefix, cols in histogram_groups.items()}
+    required = None if required_columns is None else set(required_columns)
+
+    def parts_of(col: str, stats: List[str], stat_parts: Dict[str, str]) -> List[str]:
+        names = [s for s in stats if required is None or f"{col}_{s}" in required]
+        return sorted({stat_parts[s] for s in names})
+
+    counter_parts = {}
+    for col in counter_cols:
+        parts = parts_of(col, COUNTER_STATS, COUNTER_STAT_PARTS)
+        if parts:
+            counter_parts[col] = parts
+
+    hist_parts = {}
+    for cols in hist_cols.values():
+        for col in cols:
+            parts = parts_of(col, HIST_STATS, HIST_STAT_PARTS)
+            if parts:
+                hist_parts[col] = parts
+
+    planned_counters = [c for c in counter_cols if c in counter_parts]
+    planned_groups = {
+        prefix: list(histogram_groups[prefix])
+        for prefix, cols in hist_cols.items()
+        if any(c in hist_parts for c in cols)
+    }
+
+    columns = [f"{c}_{s}" for c in planned_counters for s in COUNTER_STATS]
+    columns += [f"{c}_{s}" for prefix in planned_groups for c in planned_groups[prefix] for s in HIST_STATS]
+    columns += [f"{prefix}_{kind}_{s}" for prefix in planned_groups
+                for kind in ("total", "centroid") for s in HIST_STATS]
+    columns.append("study_length_time_step")
+    if required is not None:
+        columns = [c for c in columns if c in required]
+
+    return AggregateNeeds(counter_parts, hist_parts, planned_counters, planned_groups, columns)
+
+
+def _vehicle_segments(vehicle_ids: np.ndarray, time: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Sort rows by vehicle, then time (ties keep row order).
+    Returns:
+        order   : row permutation that sorts the data
+        ids     : unique vehicle ids, ascending
+        starts  : sorted-row index where each vehicle's segment starts
+    """
+    order = np.lexsort((time, vehicle_ids))
+    sorted_ids = vehicle_ids[order]
+
+    is_start = np.ones(len(sorted_ids), dtype=bool)
+    is_start[1:] = sorted_ids[1:] != sorted_ids[:-1]
+
+    starts = np.flatnonzero(is_start)
+    return order, sorted_ids[starts], starts
+
+
+def _segment_moments(values: np.ndarray, valid: np.ndarray, starts: np.ndarray
+                     ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Count, mean and sum of squared deviations of the `valid` entries of a
+    (n_rows, n_cols) matrix, per segment. Segments without valid entries get
+    n = 0, mean = NaN, m2 = 0.
+    """
+    n = np.add.reduceat(valid.astype(float), starts, axis=0)
+    sums = np.add.reduceat(np.where(valid, values, 0.0), starts, axis=0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = sums / n
+    seg_len = np.diff(np.append(starts, len(values)))
+    dev = np.where(valid, values - np.repeat(mean, seg_len, axis=0), 0.0)
+    m2 = np.add.reduceat(dev * dev, starts, axis=0)
+    return n, mean, m2
+
+
+def _segment_first_last(values: np.ndarray, time: np.ndarray, valid: np.ndarray, starts: np.ndarray
+                        ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    First and last valid entry (and its time) per segment and column of a
+    time-sorted (n_rows, n_cols) matrix. Missing entries get NaN.
+    """
+    n_rows = len(values)
+    row_idx = np.arange(n_rows)[:, None]
+
+    first_idx = np.minimum.reduceat(np.where(valid, row_idx, n_rows), starts, axis=0)
+    last_idx = np.maximum.reduceat(np.where(valid, row_idx, -1), starts, axis=0)
+    has_value = last_idx >= 0
+
+    cols = np.arange(values.shape[1])[None, :]
+    first_idx = np.where(has_value, first_idx, 0)
+    last_idx = np.where(has_value, last_idx, 0)
+
+    first_v = np.where(has_value, values[first_idx, cols], np.nan)
+    last_v = np.where(has_value, values[last_idx, cols], np.nan)
+    first_t = np.where(has_value, time[first_idx], np.nan)
+    last_t = np.where(has_value, time[last_idx], np.nan)
+    return first_t, first_v, last_t, last_v
+
+
+def _unset_fields(fields: Iterable[str], shape: Tuple[int, ...]) -> Dict[str, np.ndarray]:
+    """Partial statistics that were not computed: counts / sums of squares 0, the rest NaN."""
+    return {f: np.zeros(shape) if f in _ZERO_FIELDS else np.full(shape, np.nan) for f in fields}
+
+
+def _counter_partials(
+    vals: np.ndarray, time: np.ndarray, starts: np.ndarray, parts: Iterable[str]
+) -> Dict[str, np.ndarray]:
+    """Per-vehicle partial statistics (COUNTER_FIELDS of the given parts) of a counter matrix."""
+    valid = np.isfinite(vals)
+    out: Dict[str, np.ndarray] = {}
+
+    if "moments" in parts:
+        out["n"], out["mean"], out["m2"] = _segment_moments(vals, valid, starts)
+    if "first_last" in parts:
+        out["first_t"], out["first_v"], out["last_t"], out["last_v"] = _segment_first_last(vals, time, valid, starts)
+    if "trend" in parts:
+        valid_xy = valid & np.isfinite(time)[:, None]
+        time_cols = np.broadcast_to(time[:, None], vals.shape)
+        out["xy_n"], out["x_mean"], out["x_m2"] = _segment_moments(time_cols, valid_xy, starts)
+        _, out["y_mean"], out["y_m2"] = _segment_moments(vals, valid_xy, starts)
+
+        seg_len = np.diff(np.append(starts, len(vals)))
+        with np.errstate(invalid="ignore"):
+            dx = time_cols - np.repeat(out["x_mean"], seg_len, axis=0)
+            dy = vals - np.repeat(out["y_mean"], seg_len, axis=0)
+        out["xy_c"] = np.add.reduceat(np.where(valid_xy, dx * dy, 0.0), starts, axis=0)
+    return out
+
+
+def _hist_partials(block: np.ndarray, starts: np.ndarray, parts: Iterable[str]) -> Dict[str, np.ndarray]:
+    """Per-vehicle partial statistics (HIST_FIELDS of the given parts) of a histogram block."""
+    out: Dict[str, np.ndarray] = {}
+    if "moments" in parts:
+        out["n"], out["mean"], out["m2"] = _segment_moments(block, ~np.isnan(block), starts)
+    if "extrema" in parts:
+        out["min"] = np.fmin.reduceat(block, starts, axis=0)
+        out["max"] = np.fmax.reduceat(block, starts, axis=0)
+    return out
+
+
+def _planned_partials(
+    fields: List[str],
+    part_names: Iterable[str],
+    partials_fn,
+    block: Optional[np.ndarray],
+    cols: List[str],
+    col_parts: Dict[str, List[str]],
+    n_seg: int,
+    block_cols: Optional[List[str]] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Partial statistics of `cols` where only the parts listed in `col_parts` are
+    computed, each over just the columns that need it: `partials_fn(columns, parts=...)`
+    returns the fields of `parts` for a matrix of columns of `block`. `block` holds
+    `block_cols` (default: all of `cols`, in order) and may be None if no column needs
+    any part. The rest is unset.
+    """
+    out = _unset_fields(fields, (n_seg, len(cols)))
+    block_pos = None if block_cols is None else {c: i for i, c in enumerate(block_cols)}
+    for part in part_names:
+        positions = [i for i, c in enumerate(cols) if part in col_parts.get(c, ())]
+        if not positions:
+            continue
+        take = positions if block_pos is None else [block_pos[cols[i]] for i in positions]
+        columns = block if take == list(range(block.shape[1])) else block[:, take]  # all: no gather copy
+        if len(positions) == len(cols):
+            positions = slice(None)  # every column: no scatter copy
+        for field, values in partials_fn(columns, parts=(part,)).items():
+            out[field][:, positions] = values
+    return out
+
+
+def _column_partials(
+    df_oper: pd.DataFrame,
+    order: np.ndarray,
+    counter_cols: List[str],
+    histogram_groups: Dict[str, List[str]],
+    needs: Optional[AggregateNeeds],
+    n_seg: int,
+    counter_fn,
+    hist_fn,
+) -> Dict[str, np.ndarray]:
+    """
+    counter_<field> / hist_<field> partial statistics (layout of `_partial_aggregates`)
+    of the rows of `df_oper` taken in `order`, with `n_seg` rows per array.
+
+    `counter_fn(vals, parts=...)` and `hist_fn(block, parts=...)` reduce a counter matrix /
+    histogram block to its partials (`_counter_partials` / `_hist_partials` per vehicle,
+    or their `_range_*` versions per cutoff). With `needs`, only the planned columns and
+    parts are computed.
+    """
+    stats: Dict[str, np.ndarray] = {}
+
+    # ----- Counters -----
+    with stage("features", "counters"):
+        vals = df_oper[counter_cols].to_numpy(dtype=float)[order].reshape(len(order), len(counter_cols))
+        if needs is None:
+            counter = counter_fn(vals, parts=list(COUNTER_PART_FIELDS))
+        else:
+            counter = _planned_partials(
+                COUNTER_FIELDS, list(COUNTER_PART_FIELDS), counter_fn, vals, counter_cols, needs.counter_parts, n_seg,
+            )
+        stats.update({f"counter_{field}": counter[field] for field in COUNTER_FIELDS})
+        del vals, counter
+
+    # ----- Histogram bins + derived columns, one family matrix at a time -----
+    with stage("features", "histograms"):
+        bin_parts: List[Dict[str, np.ndarray]] = []
+        derived_parts: List[Dict[str, np.ndarray]] = []
+        for prefix, cols in histogram_groups.items():
+            derived_cols = [f"{prefix}_total", f"{prefix}_centroid"]
+            if needs is None:
+                values = df_oper[cols].to_numpy(dtype=float)[order]
+                bin_parts.append(hist_fn(values, parts=list(HIST_PART_FIELDS)))
+                derived = np.column_stack(_histogram_total_centroid(values))
+                derived_parts.append(hist_fn(derived, parts=list(HIST_PART_FIELDS)))
+                del values, derived
+                continue
+
+            # Only the required bins are read, unless the total / centroid needs all of them
+            read = cols if needs.needs_derived(prefix) else [c for c in cols if c in needs.hist_parts]
+            values = df_oper[read].to_numpy(dtype=float)[order].reshape(len(order), len(read))
+            bin_parts.append(_planned_partials(
+                HIST_FIELDS, list(HIST_PART_FIELDS), hist_fn, values, cols, needs.hist_parts, n_seg, read,
+            ))
+            derived = np.column_stack(_histogram_total_centroid(values)) if needs.needs_derived(prefix) else None
+            derived_parts.append(_planned_partials(
+                HIST_FIELDS, list(HIST_PART_FIELDS), hist_fn, derived, derived_cols, needs.hist_parts, n_seg,
+            ))
+            del values, derived
+
+        parts = bin_parts + derived_parts
+        for field in HIST_FIELDS:
+            stats[f"hist_{field}"] = (
+                np.hstack([p[field] for p in parts]) if parts else np.empty((n_seg, 0))
+            )
+    return stats
+
+
+def _partial_aggregates(
+    df_oper: pd.DataFrame,
+    counter_cols: List[str],
+    histogram_groups: Dict[str, List[str]],
+    time_col: str,
+    vehicle_col: str,
+    needs: Optional[AggregateNeeds] = None,
+) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """
+    Per-vehicle partial statistics of one frame of operational readouts.
+
+    Returns the sorted unique vehicle ids and a dict of arrays (one row per vehicle):
+        counter_<field> : (n_vehicles, n_counters)  for field in COUNTER_FIELDS
+        hist_<field>    : (n_vehicles, n_hist_cols) for field in HIST_FIELDS
+        time_max        : (n_vehicles,)
+    Histogram columns are all bin columns (family by family), then
+    <prefix>_total, <prefix>_centroid for every family.
+
+    With `needs` (see `plan_aggregates`), the layout is that of `needs.counter_cols` /
+    `needs.histogram_groups`, only `needs.raw_columns` are read and only the required
+    statistics are reduced; the other entries are left unset (count 0, NaN).
+    """
+    if needs is not None:
+        counter_cols, histogram_groups = needs.counter_cols, needs.histogram_groups
+
+    with stage("features", "segments"):
+        time_raw = df_oper[time_col].to_numpy(dtype=float)
+        order, ids, starts = _vehicle_segments(df_oper[vehicle_col].to_numpy(), time_raw)
+        time = time_raw[order]
+        n_seg = len(ids)
+
+    stats = _column_partials(
+        df_oper, order, counter_cols, histogram_groups, needs, n_seg,
+        partial(_counter_partials, time=time, starts=starts), partial(_hist_partials, starts=starts),
+    )
+    stats["time_max"] = np.fmax.reduceat(time, starts)
+    return ids, stats
+
+
+def _empty_partials(counter_cols: List[str], histogram_groups: Dict[str, List[str]]) -> Dict[str, np.ndarray]:
+    """Partial statistics for zero vehicles (correct column counts)."""
+    n_hist = sum(len(cols) + 2 for cols in histogram_groups.values())
+    stats = {f"counter_{field}": np.empty((0, len(counter_cols))) for field in COUNTER_FIELDS}
+    stats.update({f"hist_{field}": np.empty((0, n_hist)) for field in HIST_FIELDS})
+    stats["time_max"] = np.empty(0)
+    return stats
+
+
+def _merge_moments(
+    na: np.ndarray, mean_a: np.ndarray, m2_a: np.ndarray,
+    nb: np.ndarray, mean_b: np.ndarray, m2_b: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Pairwise merge of (count, mean, sum of squared deviations)."""
+    n = na + nb
+    both = (na > 0) & (nb > 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        frac_b = np.where(both, nb / n, 0.0)
+        delta = np.where(both, mean_b - mean_a, 0.0)
+    mean = np.where(na > 0, mean_a + delta * frac_b, mean_b)
+    m2 = m2_a + m2_b + delta * delta * na * frac_b
+    return n, mean, m2
+
+
+def _merge_partials(a: Dict[str, np.ndarray], b: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    Combine two row-aligned sets of partial statistics for the same vehicles.
+    `b` is treated as the later data: it wins time ties for the last value,
+    `a` wins time ties for the first value.
+    """
+    out: Dict[str, np.ndarray] = {}
+
+    # ----- Counters: value moments -----
+    out["counter_n"], out["counter_mean"], out["counter_m2"] = _merge_moments(
+        a["counter_n"], a["counter_mean"], a["counter_m2"],
+        b["counter_n"], b["counter_mean"], b["counter_m2"],
+    )
+
+    # ----- Counters: first / last by time -----
+    with np.errstate(invalid="ignore"):
+        take_b_first = np.isnan(a["counter_first_v"]) | (b["counter_first_t"] < a["counter_first_t"])
+        take_b_last = ~np.isnan(b["counter_last_v"]) & ~(b["counter_last_t"] < a["counter_last_t"])
+    for key in ("first_t", "first_v"):
+        out[f"counter_{key}"] = np.where(take_b_first, b[f"counter_{key}"], a[f"counter_{key}"])
+    for key in ("last_t", "last_v"):
+        out[f"counter_{key}"] = np.where(take_b_last, b[f"counter_{key}"], a[f"counter_{key}"])
+
+    # ----- Counters: trend moments and co-moment -----
+    na, nb = a["counter_xy_n"], b["counter_xy_n"]
+    both = (na > 0) & (nb > 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cross = np.where(
+            both,
+            (b["counter_x_mean"] - a["counter_x_mean"]) * (b["counter_y_mean"] - a["counter_y_mean"])
+            * na * nb / (na + nb),
+            0.0,
+        )
+    out["counter_xy_c"] = a["counter_xy_c"] + b["counter_xy_c"] + cross
+    out["counter_xy_n"], out["counter_x_mean"], out["counter_x_m2"] = _merge_moments(
+        na, a["counter_x_mean"], a["counter_x_m2"], nb, b["counter_x_mean"], b["counter_x_m2"],
+    )
+    _, out["counter_y_mean"], out["counter_y_m2"] = _merge_moments(
+        na, a["counter_y_mean"], a["counter_y_m2"], nb, b["counter_y_mean"], b["counter_y_m2"],
+    )
+
+    # ----- Histogram columns -----
+    out["hist_n"], out["hist_mean"], out["hist_m2"] = _merge_moments(
+        a["hist_n"], a["hist_mean"], a["hist_m2"],
+        b["hist_n"], b["hist_mean"], b["hist_m2"],
+    )
+    out["hist_min"] = np.fmin(a["hist_min"], b["hist_min"])
+    out["hist_max"] = np.fmax(a["hist_max"], b["hist_max"])
+
+    out["time_max"] = np.fmax(a["time_max"], b["time_max"])
+    return out
+
+
+def _finalize_partials(
+    ids: np.ndarray,
+    stats: Dict[str, np.ndarray],
+    counter_cols: List[str],
+    histogram_groups: Dict[str, List[str]],
+    vehicle_col: str,
+    time_dtype: np.dtype = np.dtype(float),
+    needs: Optional[AggregateNeeds] = None,
+) -> pd.DataFrame:
+    """
+    Turn per-vehicle partial statistics into the feature table:
+    vehicle_col, counter features, histogram bin stats, histogram-derived stats,
+    study_length_time_step. Rows keep the order of `ids`.
+    With `needs`, only the required columns (`needs.columns`) are returned.
+    """
+    if needs is not None:
+        counter_cols, histogram_groups = needs.counter_cols, needs.histogram_groups
 
-        total = np.nansum(values, axis=1)
+    with stage("features", "finalize"):
+        n_veh = len(ids)
 
         with np.errstate(divide="ignore", invalid="ignore"):
-            centroid = np.nansum(values * bin_idx, axis=1) / total
+            # ----- Counters (std with ddof=0, slope/R² from the closed-form fit) -----
+            n = stats["counter_n"]
+            xy_n, x_m2, y_m2, xy_c = (
+                stats["counter_xy_n"], stats["counter_x_m2"], stats["counter_y_m2"], stats["counter_xy_c"]
+            )
+            fit = (xy_n >= 2) & (x_m2 > 0)
+            counter_block = np.stack([
+                stats["counter_first_v"],
+                stats["counter_last_v"],
+                stats["counter_last_v"] - stats["counter_first_v"],
+                np.where(n > 0, stats["counter_mean"], np.nan),
+                np.where(n > 0, np.sqrt(stats["counter_m2"] / n), np.nan),
+                np.where(fit, xy_c / x_m2, np.nan),
+                np.where(fit & (y_m2 > 0), xy_c * xy_c / (x_m2 * y_m2), np.nan),
+            ], axis=2).reshape(n_veh, n.shape[1] * len(COUNTER_STATS))
+
+            # ----- Histogram columns (std with ddof=1, like pandas) -----
+            h_n = stats["hist_n"]
+            hist_block = np.stack([
+                np.where(h_n > 0, stats["hist_mean"], np.nan),
+                np.where(h_n > 1, np.sqrt(stats["hist_m2"] / (h_n - 1)), np.nan),
+                stats["hist_min"],
+                stats["hist_max"],
+            ], axis=2).reshape(n_veh, h_n.shape[1] * len(HIST_STATS))
+
+        hist_cols = [c for cols in histogram_groups.values() for c in cols]
+        hist_cols += [f"{prefix}_{kind}" for prefix in histogram_groups for kind in ("total", "centroid")]
+
+        names = [f"{col}_{stat}" for col in counter_cols for stat in COUNTER_STATS]
+        names += [f"{col}_{stat}" for col in hist_cols for stat in HIST_STATS]
+
+        df_agg = pd.DataFrame(np.hstack([counter_block, hist_block]), columns=names)
+        df_agg.insert(0, vehicle_col, ids)
+
+        # ----- Study length (proxy: max time_step per vehicle, keeps time_col dtype) -----
+        time_max = stats["time_max"]
+        if np.issubdtype(time_dtype, np.integer) and not np.isnan(time_max).any():
+            time_max = time_max.astype(time_dtype)
+        df_agg["study_length_time_step"] = time_max
+        if needs is not None:
+            df_agg = df_agg[[vehicle_col] + needs.columns]
+    return df_agg
+
+
+# --------------------------------------------------------------------------------------
+# Fused per-vehicle aggregation engine
+# --------------------------------------------------------------------------------------
+
+def build_vehicle_aggregates(
+    df_oper: pd.DataFrame,
+    counter_cols: List[str],
+    histogram_groups: Dict[str, List[str]],
+    time_col: str = "time_step",
+    vehicle_col: str = "vehicle_id",
+    required_columns: Optional[List[str]] = None,
+) -> pd.DataFrame:
+    """
+    Aggregate operational readouts to one row per vehicle in a single pass.
 
-        df[f"{prefix}_total"] = total
-        df[f"{prefix}_centroid"] = centroid
+    Rows are sorted by vehicle and time once; every block (counters, histogram
+    bins, histogram totals/centroids, study length) is then a segment reduction
+    over the same vehicle segments. Only the operational columns are read, so no
+    row-level copies of labels or specifications are made.
 
-    return df
+    Columns: vehicle_col, counter features, histogram bin stats,
+    histogram-derived stats, study_length_time_step (sorted by vehicle_col).
+    If `required_columns` is given, only the aggregates among them are computed and
+    returned (same order, see `plan_aggregates`).
+    """
+    needs = None if required_columns is None else plan_aggregates(required_columns, counter_cols, histogram_groups)
+    ids, stats = _partial_aggregates(df_oper, counter_cols, histogram_groups, time_col, vehicle_col, needs)
+    return _finalize_partials(
+        ids, stats, counter_cols, histogram_groups, vehicle_col, df_oper[time_col].dtype, needs
+    )
+
+
+def compute_counter_features_batched(
+    df: pd.DataFrame,
+    counter_cols: List[str],
+    time_col: str = "time_step",
+    vehicle_col: str = "vehicle_id",
+) -> pd.DataFrame:
+    """
+    Compute counter-based aggregation features for all vehicles at once.
+
+    Produces the same columns and NaN rules as
+    `df.groupby(vehicle_col).apply(compute_counter_features)`, but uses a single
+    sort and per-vehicle segment reductions instead of a Python loop per vehicle.
+    Rows are ordered by time within each vehicle, so first/last are first/last in time.
+
+    Returns one row per vehicle (sorted by vehicle_col).
+    """
+    df_agg = build_vehicle_aggregates(df, counter_cols, {}, time_col, vehicle_col)
+    return df_agg.drop(columns="study_length_time_step")
+
+
+class VehicleAggregateState:
+    """
+    Mergeable per-vehicle partial aggregates behind every counter and histogram feature.
+
+    Feed operational readouts chunk by chunk with `update`, combine states built on
+    different parts of the data with `merge`, and call `finalize` to get the same
+    table as `build_vehicle_aggregates` on the concatenated rows. Memory is bounded
+    by the number of vehicles, not the number of rows.
+
+    Chunks are treated as arriving in time order: when two readouts of a vehicle
+    share a time_step, the earlier chunk provides `first` and the later one `last`.
+    With `required_columns`, only the partials behind those aggregates are kept.
+
+    The state can be persisted with `save` / `load` and refreshed with only newly
+    appended readouts (see `refresh_vehicle_features`), so a daily refresh costs
+    time proportional to the new data rather than the full history.
+    """
+
+    def __init__(
+        self,
+        counter_cols: List[str],
+        histogram_groups: Dict[str, List[str]],
+        time_col: str = "time_step",
+        vehicle_col: str = "vehicle_id",
+        required_columns: Optional[List[str]] = None,
+    ):
+        self.counter_cols = list(counter_cols)
+        self.histogram_groups = {prefix: list(cols) for prefix, cols in histogram_groups.items()}
+        self.time_col = time_col
+        self.vehicle_col = vehicle_col
+        self.required_columns = None if required_columns is None else list(required_columns)
+        self.time_dtype = np.dtype(float)
+        self._needs = (
+            None if required_columns is None
+            else plan_aggregates(self.required_columns, self.counter_cols, self.histogram_groups)
+        )
+
+        # Row storage grows geometrically; only the first `_size` rows are live.
+        self._size = 0
+        self._ids = np.empty(0)
+        self._stats: Dict[str, np.ndarray] = {}
+        self._index: Dict = {}
+
+    @property
+    def n_vehicles(self) -> int:
+        return self._size
+
+    @property
+    def vehicle_ids(self) -> np.ndarray:
+        """Vehicle ids held in the state (insertion order)."""
+        return self._ids[: self._size]
+
+    def _grow(self, extra: int, template_ids: np.ndarray, template: Dict[str, np.ndarray]) -> None:
+        """Make room for `extra` more vehicles."""
+        needed = self._size + extra
+        if self._stats and needed <= len(self._ids):
+            return
+        capacity = max(needed, 2 * len(self._ids), 1024)
+
+        ids = np.empty(capacity, dtype=template_ids.dtype)
+        ids[: self._size] = self._ids[: self._size]
+        self._ids = ids
+
+        stats = {}
+        for key, values in template.items():
+            grown = np.empty((capacity,) + values.shape[1:])
+            if key in self._stats:
+                grown[: self._size] = self._stats[key][: self._size]
+            stats[key] = grown
+        self._stats = stats
+
+    def _absorb(self, ids: np.ndarray, stats: Dict[str, np.ndarray]) -> None:
+        """Merge partials for `ids` into the state (new vehicles are appended)."""
+        pos = np.fromiter((self._index.get(v, -1) for v in ids.tolist()), dtype=np.int64, count=len(ids))
+        known = pos >= 0
+
+        if known.any():
+            rows = pos[known]
+            merged = _merge_partials(
+                {k: v[rows] for k, v in self._stats.items()},
+                {k: v[known] for k, v in stats.items()},
+            )
+            for key, values in merged.items():
+                self._stats[key][rows] = values
+
+        if not known.all():
+            new = ~known
+            n_new = int(new.sum())
+            self._grow(n_new, ids, stats)
+
+            rows = slice(self._size, self._size + n_new)
+            self._ids[rows] = ids[new]
+            for key, values in stats.items():
+                self._stats[key][rows] = values[new]
+            self._index.update(zip(ids[new].tolist(), range(self._size, self._size + n_new)))
+            self._size += n_new
+
+    def update(self, df_oper: pd.DataFrame, skip_seen: bool = False) -> "VehicleAggregateState":
+        """
+        Add a chunk of operational readouts (any vehicles, any row order).
+
+        With `skip_seen=True`, rows at or before a known vehicle's latest absorbed
+        time_step are dropped, so re-delivered history is not counted twice.
+        """
+        if skip_seen and self._size and len(df_oper):
+            seen_until = pd.Series(self._stats["time_max"][: self._size], index=self.vehicle_ids)
+            cutoff = seen_until.reindex(df_oper[self.vehicle_col].to_numpy()).to_numpy()
+            keep = np.isnan(cutoff) | (df_oper[self.time_col].to_numpy(dtype=float) > cutoff)
+            df_oper = df_oper[keep]
+        if len(df_oper) == 0:
+            return self
+        if np.issubdtype(df_oper[self.time_col].dtype, np.integer):
+            self.time_dtype = df_oper[self.time_col].dtype
+        ids, stats = _partial_aggregates(
+            df_oper, self.counter_cols, self.histogram_groups, self.time_col, self.vehicle_col, self._needs
+        )
+        self._absorb(ids, stats)
+        return self
+
+    def merge(self, other: "VehicleAggregateState") -> "VehicleAggregateState":
+        """Fold another state into this one; `other` is treated as the later data."""
+        if other._size:
+            live = slice(0, other._size)
+            self._absorb(other._ids[live], {k: v[live] for k, v in other._stats.items()})
+        return self
+
+    def finalize(self, vehicle_ids: Optional[Iterable] = None) -> pd.DataFrame:
+        """
+        Per-vehicle feature table (sorted by vehicle), same layout as `build_vehicle_aggregates`.
+        If `vehicle_ids` is given, only those vehicles are finalized (unknown ids are skipped).
+        """
+        if not self._stats:
+            layout = self._needs or self
+            self._stats = _empty_partials(layout.counter_cols, layout.histogram_groups)
+
+        if vehicle_ids is None:
+            rows = np.arange(self._size)
+        else:
+            rows = np.array([self._index[v] for v in pd.unique(np.asarray(list(vehicle_ids))).tolist()
+                             if v in self._index], dtype=np.int64)
+
+        ids = self._ids[rows]
+        order = np.argsort(ids, kind="stable")
+        stats = {k: v[rows[order]] for k, v in self._stats.items()}
+        return _finalize_partials(
+            ids[order], stats, self.counter_cols, self.histogram_groups,
+            self.vehicle_col, self.time_dtype, self._needs,
+        )
+
+    def save(self, path: str) -> str:
+        """Persist the state as a single .npz file (written atomically)."""
+        meta = {
+            "counter_cols": self.counter_cols,
+            "histogram_groups": self.histogram_groups,
+            "time_col": self.time_col,
+            "vehicle_col": self.vehicle_col,
+            "required_columns": self.required_columns,
+            "time_dtype": self.time_dtype.str,
+        }
+        arrays = {f"stat__{k}": v[: self._size] for k, v in self._stats.items()}
+
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, meta=np.array(json.dumps(meta)), ids=self.vehicle_ids, **arrays)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> "VehicleAggregateState":
+        """Load a state written by `save`."""
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            state = cls(meta["counter_cols"], meta["histogram_groups"], meta["time_col"], meta["vehicle_col"],
+                        meta.get("required_columns"))
+            state.time_dtype = np.dtype(meta["time_dtype"])
+
+            ids = data["ids"]
+            stats = {k[len("stat__"):]: data[k] for k in data.files if k.startswith("stat__")}
+
+        if len(ids):
+            state._absorb(ids, stats)
+        return state
+
+
+def build_vehicle_aggregates_streaming(
+    oper_chunks: Iterable[pd.DataFrame],
+    counter_cols: List[str],
+    histogram_groups: Dict[str, List[str]],
+    time_col: str = "time_step",
+    vehicle_col: str = "vehicle_id",
+    required_columns: Optional[List[str]] = None,
+) -> pd.DataFrame:
+    """
+    Out-of-core version of `build_vehicle_aggregates`: consume operational readouts
+    chunk by chunk (e.g. `pd.read_csv(..., chunksize=...)`) and finalize the same
+    per-vehicle table at the end.
+    """
+    state = VehicleAggregateState(counter_cols, histogram_groups, time_col, vehicle_col, required_columns)
+    for chunk in oper_chunks:
+        state.update(chunk)
+    return state.finalize()
+
+
+def refresh_vehicle_features(
+    df_features: pd.DataFrame,
+    state: VehicleAggregateState,
+    df_new_oper: pd.DataFrame,
+    skip_seen: bool = True,
+) -> pd.DataFrame:
+    """
+    Incrementally refresh a per-vehicle feature table with newly appended readouts.
+
+    `state` must hold the aggregates behind `df_features` (e.g. loaded with
+    `VehicleAggregateState.load`); it is updated in place with `df_new_oper`. Only the
+    vehicles present in the new rows are re-finalized: their counter / histogram /
+    study-length columns are replaced, other columns (specs, labels) are kept.
+    Vehicles not yet in `df_features` are appended with those columns filled in and
+    the remaining columns missing.
+
+    Returns the refreshed table, sorted by vehicle.
+    """
+    vehicle_col = state.vehicle_col
+    state.update(df_new_oper, skip_seen=skip_seen)
+
+    touched = state.finalize(df_new_oper[vehicle_col].unique())
+    if len(touched) == 0:
+        return df_features
+
+    agg_cols = [c for c in touched.columns if c != vehicle_col]
+    df_out = df_features.set_index(vehicle_col)
+    touched = touched.set_index(vehicle_col)
+
+    if len(touched.index.difference(df_out.index)):
+        df_out = df_out.reindex(df_out.index.union(touched.index))
+        df_out.index.name = vehicle_col
+
+    # Rebuild the aggregate columns as whole arrays: the stored table may be typed
+    # narrower (e.g. float32 from a columnar feature file) than the fresh values.
+    rows = df_out.index.get_indexer(touched.index)
+    refreshed = {}
+    for col in agg_cols:
+        dtype = np.result_type(df_out[col].dtype, touched[col].dtype)
+        values = df_out[col].to_numpy(dtype=dtype, copy=True)
+        values[rows] = touched[col].to_numpy()
+        refreshed[col] = values
+
+    df_out = pd.concat(
+        [df_out.drop(columns=agg_cols), pd.DataFrame(refreshed, index=df_out.index)], axis=1
+    )[df_out.columns]
+    return df_out.sort_index().reset_index()
+
+
+# --------------------------------------------------------------------------------------
+# Sharded (multi-process) aggregation
+# --------------------------------------------------------------------------------------
+
+DEFAULT_N_SHARDS = 16
+
+
+def vehicle_shards(vehicle_ids: np.ndarray, n_shards: int) -> np.ndarray:
+    """
+    Deterministic hash partition: shard index (0..n_shards-1) for every vehicle id.
+    Stable across processes and runs (does not depend on PYTHONHASHSEED).
+    """
+    hashed = pd.util.hash_array(np.asarray(vehicle_ids))
+    return (hashed % np.uint64(n_shards)).astype(np.int64)
+
+
+def build_vehicle_aggregates_sharded(
+    df_oper: pd.DataFrame,
+    counter_cols: List[str],
+    histogram_groups: Dict[str, List[str]],
+    executor: Executor,
+    n_shards: int = DEFAULT_N_SHARDS,
+    time_col: str = "time_step",
+    vehicle_col: str = "vehicle_id",
+    required_columns: Optional[List[str]] = None,
+) -> pd.DataFrame:
+    """
+    `build_vehicle_aggregates` with vehicles hash-partitioned into shards that are
+    aggregated in parallel on `executor` (e.g. a ProcessPoolExecutor).
+
+    Every vehicle's rows land in exactly one shard and per-vehicle results do not
+    depend on the other vehicles in a shard, so after re-sorting by vehicle the
+    output is identical to the serial engine.
+    """
+    shard = vehicle_shards(df_oper[vehicle_col].to_numpy(), n_shards)
+    futures = [
+        executor.submit(
+            build_vehicle_aggregates,
+            df_oper[shard == k], counter_cols, histogram_groups, time_col, vehicle_col, required_columns,
+        )
+        for k in range(n_shards)
+        if (shard == k).any()
+    ]
+    parts = [future.result() for future in futures]
+
+    df_agg = pd.concat(parts, ignore_index=True) if parts else build_vehicle_aggregates(
+        df_oper, counter_cols, histogram_groups, time_col, vehicle_col, required_columns
+    )
+    return df_agg.sort_values(vehicle_col, kind="stable").reset_index(drop=True)
+
+
+# --------------------------------------------------------------------------------------
+# As-of aggregates (many cutoffs per vehicle, prefix reductions over sorted rows)
+# --------------------------------------------------------------------------------------
+#
+# A cutoff (vehicle, t) covers the vehicle's readouts with time_step <= t, i.e. a
+# prefix [lo, hi) of its segment in the vehicle/time-sorted rows. Every partial
+# statistic of that prefix is read off arrays built once over all rows:
+# - counts, sums, sums of squares / cross products: running sums that restart at
+#   every segment, read at hi - 1 (values shifted by the segment's first valid value,
+#   so the sums stay small and constant columns give exactly 0)
+# - first valid entry: fixed per segment, present if it lies before hi
+# - last valid entry: running maximum of the valid row index, read at hi - 1
+# - min / max: running min / max within the segment, read at hi - 1
+# The same finalization as the whole-history engine then gives the features.
+
+def _cutoff_bounds(
+    ids: np.ndarray, starts: np.ndarray, time: np.ndarray, cut_ids: np.ndarray, cut_time: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Sorted-row range [lo, hi) of the readouts at or before each cutoff, and the
+    segment index of its vehicle. Vehicles without readouts get an empty range.
+    """
+    n_rows, n_cut = len(time), len(cut_ids)
+    seg = np.minimum(np.searchsorted(ids, cut_ids), len(ids) - 1)
+    found = ids[seg] == cut_ids
+
+    # Merge cutoffs into the sorted rows: readouts first on equal (segment, time)
+    seg_len = np.diff(np.append(starts, n_rows))
+    merged = np.lexsort((
+        np.r_[np.zeros(n_rows), np.ones(n_cut)],
+        np.r_[time, cut_time],
+        np.r_[np.repeat(np.arange(len(ids)), seg_len), seg],
+    ))
+    is_cut = merged >= n_rows
+    hi = np.empty(n_cut, dtype=np.int64)
+    hi[merged[is_cut] - n_rows] = np.cumsum(~is_cut)[is_cut]
+
+    lo = np.where(found, starts[seg], 0)
+    hi = np.where(found, hi, 0)
+    return seg, lo, hi
+
+
+def _segment_labels(starts: np.ndarray, n_rows: int) -> np.ndarray:
+    """Segment index of every sorted row."""
+    return np.repeat(np.arange(len(starts)), np.diff(np.append(starts, n_rows)))
+
+
+def _range_sums(values: np.ndarray, starts: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    """
+    Column sums of values[lo:hi] for ranges that begin at a segment start. The running
+    sums restart at every segment: differencing one global cumulative sum would round
+    small prefix sums against the total of all earlier vehicles.
+    """
+    running = pd.DataFrame(values).groupby(_segment_labels(starts, len(values))).cumsum().to_numpy()
+    return np.where((hi > lo)[:, None], running[np.maximum(hi - 1, 0)], 0.0)
+
+
+def _shift_by_first(values: np.ndarray, valid: np.ndarray, starts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    `values` minus the first valid entry of their segment and column (0 where
+    invalid), and those shifts per segment (0 for columns without valid entries).
+    """
+    n_rows = len(values)
+    first = np.minimum.reduceat(np.where(valid, np.arange(n_rows)[:, None], n_rows), starts, axis=0)
+    has_value = first < n_rows
+    cols = np.arange(values.shape[1])[None, :]
+    shift = np.where(has_value, values[np.where(has_value, first, 0), cols], 0.0)
+
+    seg_len = np.diff(np.append(starts, n_rows))
+    with np.errstate(invalid="ignore"):
+        dev = np.where(valid, values - np.repeat(shift, seg_len, axis=0), 0.0)
+    return dev, shift
+
+
+def _range_moments(
+    values: np.ndarray, valid: np.ndarray, starts: np.ndarray, bounds: Tuple[np.ndarray, np.ndarray, np.ndarray]
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """`_segment_moments` over the cutoff ranges of `bounds` (see `_cutoff_bounds`)."""
+    seg, lo, hi = bounds
+    dev, shift = _shift_by_first(values, valid, starts)
+    n = _range_sums(valid.astype(float), starts, lo, hi)
+    s1 = _range_sums(dev, starts, lo, hi)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_dev = s1 / n
+        m2 = np.where(n > 0, np.maximum(_range_sums(dev * dev, starts, lo, hi) - s1 * mean_dev, 0.0), 0.0)
+    return n, mean_dev + shift[seg], m2
+
+
+def _range_counter_partials(
+    vals: np.ndarray, time: np.ndarray, starts: np.ndarray,
+    bounds: Tuple[np.ndarray, np.ndarray, np.ndarray], parts: Iterable[str],
+) -> Dict[str, np.ndarray]:
+    """`_counter_partials` over the cutoff ranges of `bounds`."""
+    seg, lo, hi = bounds
+    valid = np.isfinite(vals)
+    out: Dict[str, np.ndarray] = {}
+
+    if "moments" in parts:
+        out["n"], out["mean"], out["m2"] = _range_moments(vals, valid, starts, bounds)
+    if "first_last" in parts:
+        n_rows = len(vals)
+        row_idx = np.arange(n_rows)[:, None]
+        cols = np.arange(vals.shape[1])[None, :]
+
+        first_idx = np.minimum.reduceat(np.where(valid, row_idx, n_rows), starts, axis=0)[seg]
+        has_first = first_idx < hi[:, None]
+        last_idx = np.maximum.accumulate(np.where(valid, row_idx, -1), axis=0)[np.maximum(hi - 1, 0)]
+        has_last = (hi > lo)[:, None] & (last_idx >= lo[:, None])
+
+        first_idx = np.where(has_first, first_idx, 0)
+        last_idx = np.where(has_last, last_idx, 0)
+        out["first_t"] = np.where(has_first, time[first_idx], np.nan)
+        out["first_v"] = np.where(has_first, vals[first_idx, cols], np.nan)
+        out["last_t"] = np.where(has_last, time[last_idx], np.nan)
+        out["last_v"] = np.where(has_last, vals[last_idx, cols], np.nan)
+    if "trend" in parts:
+        valid_xy = valid & np.isfinite(time)[:, None]
+        dx, x_shift = _shift_by_first(np.broadcast_to(time[:, None], vals.shape), valid_xy, starts)
+        dy, y_shift = _shift_by_first(vals, valid_xy, starts)
+        n = _range_sums(valid_xy.astype(float), starts, lo, hi)
+        sx, sy = _range_sums(dx, starts, lo, hi), _range_sums(dy, starts, lo, hi)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mx, my = sx / n, sy / n
+            fitted = n > 0
+            out["x_m2"] = np.where(fitted, np.maximum(_range_sums(dx * dx, starts, lo, hi) - sx * mx, 0.0), 0.0)
+            out["y_m2"] = np.where(fitted, np.maximum(_range_sums(dy * dy, starts, lo, hi) - sy * my, 0.0), 0.0)
+            out["xy_c"] = np.where(fitted, _range_sums(dx * dy, starts, lo, hi) - sx * my, 0.0)
+        out["xy_n"], out["x_mean"], out["y_mean"] = n, mx + x_shift[seg], my + y_shift[seg]
+    return out
+
+
+def _range_hist_partials(
+    block: np.ndarray, starts: np.ndarray, bounds: Tuple[np.ndarray, np.ndarray, np.ndarray], parts: Iterable[str]
+) -> Dict[str, np.ndarray]:
+    """`_hist_partials` over the cutoff ranges of `bounds`."""
+    seg, lo, hi = bounds
+    out: Dict[str, np.ndarray] = {}
+    if "moments" in parts:
+        out["n"], out["mean"], out["m2"] = _range_moments(block, ~np.isnan(block), starts, bounds)
+    if "extrema" in parts:
+        # Running min / max within each vehicle segment (NaN skipped), read at the last row
+        labels = _segment_labels(starts, len(block))
+        last_row = np.maximum(hi - 1, 0)
+        nonempty = (hi > lo)[:, None]
+        for field, fill, method in (("min", np.inf, "cummin"), ("max", -np.inf, "cummax")):
+            running = getattr(pd.DataFrame(np.where(np.isnan(block), fill, block)).groupby(labels), method)()
+            value = running.to_numpy()[last_row]
+            out[field] = np.where(nonempty & (value != fill), value, np.nan)
+    return out
+
+
+def _asof_partials(
+    df_oper: pd.DataFrame,
+    cut_ids: np.ndarray,
+    cut_time: np.ndarray,
+    needs: AggregateNeeds,
+    time_col: str,
+    vehicle_col: str,
+) -> Dict[str, np.ndarray]:
+    """
+    Partial statistics (layout of `_partial_aggregates`) of every cutoff's readouts,
+    one row per cutoff.
+    """
+    counter_cols, histogram_groups = needs.counter_cols, needs.histogram_groups
+    n_cut = len(cut_ids)
+    n_hist = sum(len(cols) + 2 for cols in histogram_groups.values())
+
+    if len(df_oper) == 0:
+        stats = {f"counter_{f}": v for f, v in _unset_fields(COUNTER_FIELDS, (n_cut, len(counter_cols))).items()}
+        stats.update({f"hist_{f}": v for f, v in _unset_fields(HIST_FIELDS, (n_cut, n_hist)).items()})
+        stats["time_max"] = np.full(n_cut, np.nan)
+        return stats
+
+    with stage("features", "segments"):
+        time_raw = df_oper[time_col].to_numpy(dtype=float)
+        order, ids, starts = _vehicle_segments(df_oper[vehicle_col].to_numpy(), time_raw)
+        time = time_raw[order]
+        bounds = _cutoff_bounds(ids, starts, time, cut_ids, cut_time)
+
+    stats = _column_partials(
+        df_oper, order, counter_cols, histogram_groups, needs, n_cut,
+        partial(_range_counter_partials, time=time, starts=starts, bounds=bounds),
+        partial(_range_hist_partials, starts=starts, bounds=bounds),
+    )
+
+    # Rows are time-sorted and readouts without a time_step sort after every cutoff
+    _, lo, hi = bounds
+    stats["time_max"] = np.where(hi > lo, time[np.maximum(hi - 1, 0)], np.nan)
+    return stats
+
+
+def build_asof_aggregates(
+    df_oper: pd.DataFrame,
+    df_cutoffs: pd.DataFrame,
+    counter_cols: List[str],
+    histogram_groups: Dict[str, List[str]],
+    time_col: str = "time_step",
+    vehicle_col: str = "vehicle_id",
+    cutoff_col: str = "cutoff_time_step",
+    required_columns: Optional[List[str]] = None,
+) -> pd.DataFrame:
+    """
+    Per-vehicle aggregates as of many cutoffs, in one pass over the readouts.
+
+    `df_cutoffs` holds (vehicle_col, cutoff_col) pairs, any number per vehicle. Each
+    output row has the columns of `build_vehicle_aggregates` computed from that
+    vehicle's readouts with time_col <= cutoff (first/last and trend included), and
+    study_length_time_step is the last time_step up to the cutoff. Cost is one sort
+    plus O(n_readouts + n_cutoffs) per column, instead of one build per cutoff.
+    Cutoffs before a vehicle's first readout, or of vehicles without readouts, get
+    NaN aggregates.
+
+    Columns: vehicle_col, cutoff_col, aggregates; rows keep the order of `df_cutoffs`.
+    """
+    cut_time = df_cutoffs[cutoff_col].to_numpy(dtype=float)
+    if np.isnan(cut_time).any():
+        raise ValueError(f"'{cutoff_col}' has missing values.")
+    needs = plan_aggregates(required_columns, counter_cols, histogram_groups)
+
+    cut_ids = df_cutoffs[vehicle_col].to_numpy()
+    stats = _asof_partials(df_oper, cut_ids, cut_time, needs, time_col, vehicle_col)
+    df_agg = _finalize_partials(
+        cut_ids, stats, counter_cols, histogram_groups, vehicle_col, np.dtype(float), needs
+    )
+    df_agg.insert(1, cutoff_col, df_cutoffs[cutoff_col].to_numpy())
+    return df_agg
+
+
+def _aggregate_oper(
+    df_oper: Union[pd.DataFrame, Iterable[pd.DataFrame]],
+    counter_cols: List[str],
+    histogram_groups: Dict[str, List[str]],
+    time_col: str,
+    vehicle_col: str,
+    executor: Optional[Executor] = None,
+    required_columns: Optional[List[str]] = None,
+) -> pd.DataFrame:
+    """
+    Batch engine for a DataFrame (sharded over `executor` if given),
+    streaming engine for an iterable of chunks.
+    """
+    if isinstance(df_oper, pd.DataFrame):
+        if executor is not None:
+            return build_vehicle_aggregates_sharded(
+                df_oper, counter_cols, histogram_groups, executor, time_col=time_col, vehicle_col=vehicle_col,
+                required_columns=required_columns,
+            )
+        return build_vehicle_aggregates(
+            df_oper, counter_cols, histogram_groups, time_col, vehicle_col, required_columns
+        )
+    return build_vehicle_aggregates_streaming(
+        df_oper, counter_cols, histogram_groups, time_col, vehicle_col, required_columns
+    )
+
+
+def _attach_vehicle_tables(
+    df_agg: pd.DataFrame,
+    df_spec_encoded: pd.DataFrame,
+    label_df: pd.DataFrame,
+    vehicle_col: str,
+) -> pd.DataFrame:
+    """
+    Join per-vehicle aggregates with encoded specifications and labels.
+    All joins are at vehicle granularity (one row per vehicle on both sides).
+    """
+    df_features = df_agg.merge(df_spec_encoded, on=vehicle_col, how="left", validate="one_to_one")
+    df_features = df_features.merge(label_df, on=vehicle_col, how="left", validate="one_to_one")
+    return df_features
 
 
 # --------------------------------------------------------------------------------------
@@ -195,7 +1357,7 @@ def encode_specifications(df_spec: pd.DataFrame, spec_feature_cols: List[str] =
 # --------------------------------------------------------------------------------------
 
 def build_train_features(
-    df_oper: pd.DataFrame,
+    df_oper: Union[pd.DataFrame, Iterable[pd.DataFrame]],
     df_tte: pd.DataFrame,
     df_spec: pd.DataFrame,
     counter_cols: List[str],
@@ -203,80 +1365,40 @@ def build_train_features(
     time_col: str = "time_step",
     vehicle_col: str = "vehicle_id",
     target_col: str = "in_study_repair",
+    executor: Optional[Executor] = None,
+    required_columns: Optional[List[str]] = None,
 ) -> Tuple[pd.DataFrame, List[str], List[str]]:
     """
     Build per-vehicle feature matrix for TRAIN split.
+    `df_oper` may also be an iterable of chunks (e.g. pd.read_csv(..., chunksize=...))
+    to aggregate the operational readouts out-of-core.
+    If `executor` is given (and df_oper is a DataFrame), vehicles are sharded and
+    aggregated in parallel on it; the result is identical to the serial build.
+    If `required_columns` is given (e.g. a pruned feature_cols.json), only those
+    aggregates are computed and the feature columns are the required ones, in that order.
     Returns:
         df_features     : final per-vehicle feature table
         spec_feature_cols : one-hot encoded specification columns
         feature_columns : list of feature columns to enforce on val/test
     """
-
-    # ----- Merge operational + TTE (labels only) -----
     label_df = _ensure_target_dataframe(df_tte, vehicle_col, target_col)
-    
-    df_merged = pd.merge(
-        df_oper,
-        label_df,
-        on=vehicle_col,
-        how="left",
-        validate="many_to_one",
-    )
-    
-    # ----- Merge specs -----
-    df_full = pd.merge(
-        df_merged,
-        df_spec,
-        on=vehicle_col,
-        how="left",
-        validate="many_to_one",
-    )
-    
-    # ----- Histogram-derived features -----
-    df_full = add_histogram_derived_columns(df_full, histogram_groups)
-    hist_derived_cols = [c for c in df_full.columns if c.endswith("_total") or c.endswith("_centroid")]
-
-
-    # ----- Histogram-derived features -----
-    df_full = add_histogram_derived_columns(df_full, histogram_groups)
-    hist_derived_cols = [c for c in df_full.columns if c.endswith("_total") or c.endswith("_centroid")]
-
-    # ----- Counter features -----
-    agg_counters = (
-        df_full.groupby(vehicle_col)
-        .apply(lambda g: compute_counter_features(g, counter_cols, time_col))
-        .reset_index()
-    )
 
-    # ----- Histogram bin aggregations -----
-    hist_bin_cols = [c for cols in histogram_groups.values() for c in cols]
-    agg_hist_bins = df_full.groupby(vehicle_col)[hist_bin_cols].agg(["mean", "std", "min", "max"])
-    agg_hist_bins.columns = [f"{c}_{stat}" for (c, stat) in agg_hist_bins.columns.to_flat_index()]
-    agg_hist_bins = agg_hist_bins.reset_index()
+    with stage("features", "aggregate_oper"):
+        df_agg = _aggregate_oper(
+            df_oper, counter_cols, histogram_groups, time_col, vehicle_col, executor, required_columns
+        )
+    with stage("features", "encode_specs"):
+        df_spec_encoded, spec_feature_cols = encode_specifications(df_spec)
 
-    # ----- Histogram-derived aggregations -----
-    agg_hist_derived = df_full.groupby(vehicle_col)[hist_derived_cols].agg(["mean", "std", "min", "max"])
-    agg_hist_derived.columns = [f"{c}_{stat}" for (c, stat) in agg_hist_derived.columns.to_flat_index()]
-    agg_hist_derived = agg_hist_derived.reset_index()
-
-    # ----- Study length (computed from operational data) -----
-    study_length = _compute_study_length_from_oper(df_oper, vehicle_col, time_col)
-
-    # ----- Specifications encoding -----
-    df_spec_encoded, spec_feature_cols = encode_specifications(df_spec)
-
-    # ----- Merge all blocks -----
-    df_features = agg_counters.copy()
-    df_features = df_features.merge(agg_hist_bins, on=vehicle_col, how="left")
-    df_features = df_features.merge(agg_hist_derived, on=vehicle_col, how="left")
-    df_features = df_features.merge(study_length, on=vehicle_col, how="left")
-    df_features = df_features.merge(df_spec_encoded, on=vehicle_col, how="left")
-
-    # ----- Add target -----
-    df_features = df_features.merge(df_tte[[vehicle_col, target_col]], on=vehicle_col, how="left")
+    with stage("features", "attach_tables"):
+        df_features = _attach_vehicle_tables(df_agg, df_spec_encoded, label_df, vehicle_col)
 
     # ----- Save feature column list (excluding id + target) -----
     feature_columns = [c for c in df_features.columns if c not in [vehicle_col, target_col]]
+    if required_columns is not None:
+        available = set(feature_columns)
+        feature_columns = [c for c in required_columns if c in available]
+        df_features = df_features[[vehicle_col] + feature_columns + [target_col]]
 
     return df_features, spec_feature_cols, feature_columns
 
@@ -286,7 +1408,7 @@ def build_train_features(
 # --------------------------------------------------------------------------------------
 
 def build_eval_features(
-    df_oper: pd.DataFrame,
+    df_oper: Union[pd.DataFrame, Iterable[pd.DataFrame]],
     df_tte: pd.DataFrame,
     df_spec: pd.DataFrame,
     counter_cols: List[str],
@@ -296,67 +1418,290 @@ def build_eval_features(
     time_col: str = "time_step",
     vehicle_col: str = "vehicle_id",
     target_col: str = "in_study_repair",
+    executor: Optional[Executor] = None,
 ) -> pd.DataFrame:
     """
     Build per-vehicle feature matrix for validation/test splits.
-    Ensures feature columns match the training set.
+    Ensures feature columns match the training set; only the aggregates among
+    `feature_columns` are computed.
+    `df_oper` may also be an iterable of chunks and `executor` may be given,
+    as in `build_train_features`.
     """
-
-    # Repeat same merge logic
+    # Label column may be named differently (e.g. class_label)
     label_df = _ensure_target_dataframe(df_tte, vehicle_col, target_col)
 
-    df_merged = pd.merge(
-        df_oper,
-        label_df,
-        on=vehicle_col,
-        how="left",
-        validate="many_to_one",
-    )
+    with stage("features", "aggregate_oper"):
+        df_agg = _aggregate_oper(
+            df_oper, counter_cols, histogram_groups, time_col, vehicle_col, executor, feature_columns
+        )
+    with stage("features", "encode_specs"):
+        df_spec_encoded, _ = encode_specifications(df_spec, spec_feature_cols)
 
-    df_full = pd.merge(
-        df_merged,
-        df_spec,
-        on=vehicle_col,
-        how="left",
-        validate="many_to_one",
-    )
+    with stage("features", "attach_tables"):
+        df_features = _attach_vehicle_tables(df_agg, df_spec_encoded, label_df, vehicle_col)
 
-    df_full = add_histogram_derived_columns(df_full, histogram_groups)
-    hist_derived_cols = [c for c in df_full.columns if c.endswith("_total") or c.endswith("_centroid")]
+    with stage("features", "align"):
+        return align_to_feature_columns(df_features, feature_columns, vehicle_col, target_col)
 
-    agg_counters = (
-        df_full.groupby(vehicle_col)
-        .apply(lambda g: compute_counter_features(g, counter_cols, time_col))
-        .reset_index()
-    )
 
-    hist_bin_cols = [c for cols in histogram_groups.values() for c in cols]
-    agg_hist_bins = df_full.groupby(vehicle_col)[hist_bin_cols].agg(["mean", "std", "min", "max"])
-    agg_hist_bins.columns = [f"{c}_{stat}" for (c, stat) in agg_hist_bins.columns.to_flat_index()]
-    agg_hist_bins = agg_hist_bins.reset_index()
+# --------------------------------------------------------------------------------------
+# Build as-of feature table (many cutoffs per vehicle)
+# --------------------------------------------------------------------------------------
 
-    agg_hist_derived = df_full.groupby(vehicle_col)[hist_derived_cols].agg(["mean", "std", "min", "max"])
-    agg_hist_derived.columns = [f"{c}_{stat}" for (c, stat) in agg_hist_derived.columns.to_flat_index()]
-    agg_hist_derived = agg_hist_derived.reset_index()
+def build_asof_features(
+    df_oper: pd.DataFrame,
+    df_cutoffs: pd.DataFrame,
+    df_spec: pd.DataFrame,
+    counter_cols: List[str],
+    histogram_groups: Dict[str, List[str]],
+    spec_feature_cols: List[str],
+    feature_columns: List[str],
+    time_col: str = "time_step",
+    vehicle_col: str = "vehicle_id",
+    cutoff_col: str = "cutoff_time_step",
+) -> pd.DataFrame:
+    """
+    Model feature matrix as of every (vehicle_col, cutoff_col) pair of `df_cutoffs`,
+    e.g. several prediction points per vehicle for training or backtesting.
+    Aggregates only use readouts up to the cutoff (`build_asof_aggregates`) and only
+    those among `feature_columns` are computed; specifications are per vehicle.
+    Columns: the columns of `df_cutoffs` (e.g. a label per cutoff), then
+    `feature_columns`; rows keep the order of `df_cutoffs`.
+    """
+    with stage("features", "aggregate_oper"):
+        df_agg = build_asof_aggregates(
+            df_oper, df_cutoffs, counter_cols, histogram_groups, time_col, vehicle_col, cutoff_col,
+            required_columns=feature_columns,
+        )
+    with stage("features", "encode_specs"):
+        df_spec_encoded, _ = encode_specifications(df_spec, spec_feature_cols)
+
+    with stage("features", "attach_tables"):
+        df_features = df_agg.merge(df_spec_encoded, on=vehicle_col, how="left", validate="many_to_one")
+
+    with stage("features", "align"):
+        missing = [c for c in feature_columns if c not in df_features.columns]
+        if missing:  # feature missing => fill with default, as in align_to_feature_columns
+            df_features = pd.concat([df_features, pd.DataFrame(0, index=df_features.index, columns=missing)], axis=1)
+        return pd.concat([df_cutoffs.reset_index(drop=True), df_features[feature_columns]], axis=1)
+
+
+def align_to_feature_columns(
+    df_features: pd.DataFrame,
+    feature_columns: List[str],
+    vehicle_col: str = "vehicle_id",
+    target_col: str = "in_study_repair",
+) -> pd.DataFrame:
+    """
+    Enforce the training feature structure: add missing feature columns
+    (filled with 0) and order columns as [vehicle_col] + feature_columns + [target_col].
+    """
+    for col in feature_columns:
+        if col not in df_features.columns:
+            df_features[col] = 0  # feature missing => fill with default
 
-    study_length = _compute_study_length_from_oper(df_oper, vehicle_col, time_col)
+    return df_features[[vehicle_col] + feature_columns + [target_col]]
 
-    df_spec_encoded, _ = encode_specifications(df_spec, spec_feature_cols)
 
-    df_features = agg_counters.copy()
-    df_features = df_features.merge(agg_hist_bins, on=vehicle_col, how="left")
-    df_features = df_features.merge(agg_hist_derived, on=vehicle_col, how="left")
-    df_features = df_features.merge(study_length, on=vehicle_col, how="left")
-    df_features = df_features.merge(df_spec_encoded, on=vehicle_col, how="left")
+# --------------------------------------------------------------------------------------
+# Feature plan (raw readouts -> model input at serving time)
+# --------------------------------------------------------------------------------------
 
-    # Add target column via label_df (handles different label names like class_label)
-    df_features = df_features.merge(label_df, on=vehicle_col, how="left")
+class FeaturePlan:
+    """
+    Precompiled recipe for turning raw readouts + specifications into the model's
+    feature matrix: counter columns, histogram groups, one-hot spec categories and the
+    model's column order, with the column index maps resolved once up front.
 
-    # Enforce same feature structure as training
-    for col in feature_columns:
-        if col not in df_features.columns:
-            df_features[col] = 0  # feature missing => fill with default
+    `spec_categories` maps raw spec column -> {category value: one-hot feature column},
+    e.g. {"Spec_0": {"Cat1": "Spec_0_Cat1"}}. Categories that were dropped by
+    `encode_specifications` (drop_first) or unseen in training encode as all zeros.
 
-    df_features = df_features[[vehicle_col] + feature_columns + [target_col]]
+    Only the aggregates in `feature_columns` are computed (`plan_aggregates`), and
+    `raw_columns` lists just the operational columns they are built from.
+    """
 
-    return df_features
+    def __init__(
+        self,
+        counter_cols: List[str],
+        histogram_groups: Dict[str, List[str]],
+        spec_categories: Dict[str, Dict[str, str]],
+        feature_columns: List[str],
+        time_col: str = "time_step",
+        vehicle_col: str = "vehicle_id",
+    ):
+        self.counter_cols = list(counter_cols)
+        self.histogram_groups = {k: list(v) for k, v in histogram_groups.items()}
+        self.spec_categories = {k: dict(v) for k, v in spec_categories.items()}
+        self.feature_columns = list(feature_columns)
+        self.time_col = time_col
+        self.vehicle_col = vehicle_col
+        self._compile()
+
+    def _compile(self) -> None:
+        position = {c: i for i, c in enumerate(self.feature_columns)}
+        self.needs = plan_aggregates(self.feature_columns, self.counter_cols, self.histogram_groups)
+
+        # Aggregate columns in `build_vehicle_aggregates` order -> model column positions
+        agg_columns = self.needs.columns
+        self._agg_src = np.array([i for i, c in enumerate(agg_columns) if c in position], dtype=np.int64)
+        self._agg_dst = np.array([position[c] for c in agg_columns if c in position], dtype=np.int64)
+
+        self._spec_dst = {
+            raw_col: {value: position[col] for value, col in categories.items() if col in position}
+            for raw_col, categories in self.spec_categories.items()
+        }
+        self._spec_positions = np.array(
+            sorted({i for m in self._spec_dst.values() for i in m.values()}), dtype=np.int64
+        )
+
+        self.raw_columns = [self.vehicle_col, self.time_col] + self.needs.raw_columns
+
+    # ----------------------------------------------------------------------------------
+    # Construction / persistence
+    # ----------------------------------------------------------------------------------
+
+    @classmethod
+    def from_feature_columns(
+        cls,
+        feature_columns: List[str],
+        spec_columns: Optional[List[str]] = None,
+        spec_prefix: str = "Spec_",
+        time_col: str = "time_step",
+        vehicle_col: str = "vehicle_id",
+    ) -> "FeaturePlan":
+        """
+        Recover the plan from a model feature list (e.g. deployment/feature_cols.json),
+        using the naming scheme of this module:
+        `<counter>_first`, `<prefix>_<k>_<stat>`, `<spec column>_<category>`.
+        Histogram bins are ordered by their index `k`; every bin of a group needs at
+        least one statistic in the list, since the centroid uses the bin positions.
+
+        Raw spec column names are taken from `spec_columns` if given, otherwise
+        inferred from one-hot columns starting with `spec_prefix` (split at the last "_").
+        """
+        counter_cols = [c[: -len("_first")] for c in feature_columns if c.endswith("_first")]
+        counter_set = set(counter_cols)
+
+        histogram_groups: Dict[str, List[str]] = {}
+        for c in feature_columns:
+            bin_col, _, stat = c.rpartition("_")
+            prefix, _, bin_index = bin_col.rpartition("_")
+            if (stat not in HIST_STATS or c.startswith(spec_prefix) or bin_col in counter_set
+                    or not prefix or not bin_index.isdigit()):
+                continue
+            bins = histogram_groups.setdefault(prefix, [])
+            if bin_col not in bins:
+                bins.append(bin_col)
+        # Bin order defines the centroid, so restore raw-file order (<prefix>_0, _1, ...)
+        for bins in histogram_groups.values():
+            bins.sort(key=lambda b: int(b.rpartition("_")[2]))
+
+        spec_categories: Dict[str, Dict[str, str]] = {}
+        raw_specs = sorted(spec_columns or [], key=len, reverse=True)  # longest match first
+        for c in feature_columns:
+            if spec_columns is not None:
+                raw_col = next((s for s in raw_specs if c.startswith(f"{s}_")), None)
+            elif c.startswith(spec_prefix):
+                raw_col = c.rpartition("_")[0]
+            else:
+                raw_col = None
+            if raw_col:
+                spec_categories.setdefault(raw_col, {})[c[len(raw_col) + 1:]] = c
+
+        return cls(counter_cols, histogram_groups, spec_categories, feature_columns, time_col, vehicle_col)
+
+    def select(self, feature_columns: List[str]) -> "FeaturePlan":
+        """
+        Plan for a subset of this plan's columns (e.g. a pruned feature_cols.json), in the
+        given order. Unlike `from_feature_columns`, this keeps the raw schema when a
+        counter's `_first` column or a histogram bin was pruned: only counters, histogram
+        families and spec categories that still feed a selected column are kept.
+        """
+        unknown = [c for c in feature_columns if c not in set(self.feature_columns)]
+        if unknown:
+            raise ValueError(f"Columns not in the plan: {unknown[:10]}{' ...' if len(unknown) > 10 else ''}")
+
+        needs = plan_aggregates(feature_columns, self.counter_cols, self.histogram_groups)
+        selected = set(feature_columns)
+        spec_categories = {}
+        for raw_col, categories in self.spec_categories.items():
+            kept = {value: col for value, col in categories.items() if col in selected}
+            if kept:
+                spec_categories[raw_col] = kept
+        return FeaturePlan(
+            needs.counter_cols, needs.histogram_groups, spec_categories, feature_columns,
+            self.time_col, self.vehicle_col,
+        )
+
+    def to_dict(self) -> Dict:
+        return {
+            "counter_cols": self.counter_cols,
+            "histogram_groups": self.histogram_groups,
+            "spec_categories": self.spec_categories,
+            "feature_columns": self.feature_columns,
+            "time_col": self.time_col,
+            "vehicle_col": self.vehicle_col,
+        }
+
+    def save(self, path: str) -> str:
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> "FeaturePlan":
+        with open(path, "r") as f:
+            return cls(**json.load(f))
+
+    # ----------------------------------------------------------------------------------
+    # Transform
+    # ----------------------------------------------------------------------------------
+
+    def transform(
+        self,
+        df_oper: pd.DataFrame,
+        df_spec: Optional[pd.DataFrame] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Compute model inputs for every vehicle in `df_oper` in one vectorized pass.
+
+        Returns (vehicle_ids, X): vehicle ids in sorted order and a float32 matrix with
+        columns `feature_columns`. Spec features are NaN for vehicles without a row in
+        `df_spec` (as in training); model columns the plan cannot produce are 0
+        (as in `align_to_feature_columns`).
+        """
+        missing = [c for c in self.raw_columns if c not in df_oper.columns]
+        if missing:
+            raise ValueError(f"Readouts are missing columns: {missing[:10]}{' ...' if len(missing) > 10 else ''}")
+
+        ids, stats = _partial_aggregates(
+            df_oper, self.counter_cols, self.histogram_groups, self.time_col, self.vehicle_col, self.needs
+        )
+        df_agg = _finalize_partials(
+            ids, stats, self.counter_cols, self.histogram_groups, self.vehicle_col,
+            df_oper[self.time_col].dtype, self.needs,
+        )
+        vehicle_ids = df_agg[self.vehicle_col].to_numpy()
+
+        with stage("features", "assemble"):
+            X = np.zeros((len(vehicle_ids), len(self.feature_columns)), dtype=np.float32)
+            X[:, self._agg_dst] = df_agg.iloc[:, 1:].to_numpy(dtype=np.float64)[:, self._agg_src]
+
+            X[:, self._spec_positions] = np.nan
+            if df_spec is not None and len(df_spec) and len(self._spec_positions):
+                df_spec = df_spec.drop_duplicates(self.vehicle_col, keep="last")
+                spec_rows = pd.Index(df_spec[self.vehicle_col]).get_indexer(vehicle_ids)
+                has_spec = spec_rows >= 0
+                X[np.ix_(has_spec, self._spec_positions)] = 0.0
+
+                rows = np.flatnonzero(has_spec)
+                for raw_col, value_to_position in self._spec_dst.items():
+                    if raw_col not in df_spec.columns:
+                        continue
+                    values = df_spec[raw_col].to_numpy()[spec_rows[rows]]
+                    dst = pd.Series(values).astype(str).map(value_to_position).to_numpy(dtype=float)
+                    hit = ~np.isnan(dst)
+                    X[rows[hit], dst[hit].astype(np.int64)] = 1.0
+
+        return vehicle_ids, X
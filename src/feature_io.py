@@ -0,0 +1,280 @@
+"""
+Reading and writing per-vehicle feature matrices.
+
+Feature matrices are written in a typed columnar format instead of wide CSVs:
+- Arrow IPC / Feather V2 (".arrow", uncompressed, memory-mappable) – default
+- Parquet (".parquet")
+- CSV (".csv") – kept for compatibility
+
+Types: float32 features (XGBoost works in float32 internally, so this does not
+change predictions), compact integer vehicle ids and labels.
+"""
+
+import json
+import os
+from typing import Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+FEATURE_FILE_FORMATS = {
+    "arrow": ".arrow",
+    "parquet": ".parquet",
+    "csv": ".csv",
+}
+
+
+def feature_file_format(path: str) -> str:
+    """Infer the feature file format from the file extension."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".feather":
+        return "arrow"
+    for fmt, fmt_ext in FEATURE_FILE_FORMATS.items():
+        if ext == fmt_ext:
+            return fmt
+    raise ValueError(
+        f"Unknown feature file extension '{ext}' for {path}. "
+        f"Expected one of: {sorted(FEATURE_FILE_FORMATS.values()) + ['.feather']}"
+    )
+
+
+def load_feature_cols(path: str) -> List[str]:
+    """Load the ordered model feature list (e.g. deployment/feature_cols.json)."""
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+# --------------------------------------------------------------------------------------
+# Typing
+# --------------------------------------------------------------------------------------
+
+def _compact_int(s: pd.Series) -> pd.Series:
+    """Downcast an integer-valued column to the smallest integer dtype (keeps floats with NaN)."""
+    if s.isna().any():
+        return s
+    values = s.to_numpy()
+    if not np.issubdtype(values.dtype, np.integer):
+        if not np.all(np.mod(values, 1) == 0):
+            return s
+    return pd.to_numeric(s, downcast="integer")
+
+
+def to_typed_feature_table(
+    df: pd.DataFrame,
+    vehicle_col: str = "vehicle_id",
+    target_col: str = "in_study_repair",
+) -> pd.DataFrame:
+    """
+    Cast a feature table to storage dtypes: float32 for every feature column,
+    compact integers for the vehicle id and target (when they have no missing values).
+    """
+    id_cols = [c for c in (vehicle_col, target_col) if c in df.columns]
+    feature_cols = [c for c in df.columns if c not in id_cols]
+
+    typed = df[feature_cols].astype(np.float32)
+    for col in id_cols:
+        typed[col] = _compact_int(df[col])
+
+    return typed[list(df.columns)]
+
+
+# --------------------------------------------------------------------------------------
+# Write / read
+# --------------------------------------------------------------------------------------
+
+def write_feature_table(
+    df: pd.DataFrame,
+    path: str,
+    vehicle_col: str = "vehicle_id",
+    target_col: str = "in_study_repair",
+    typed: bool = True,
+) -> str:
+    """
+    Write a feature table; the format follows the extension of `path`.
+    Columnar formats are written with storage dtypes (see `to_typed_feature_table`)
+    unless `typed=False`; CSV is written as-is, like earlier builds.
+    Returns the path written.
+    """
+    fmt = feature_file_format(path)
+
+    if fmt == "csv":
+        df.to_csv(path, index=False)
+        return path
+
+    if typed:
+        df = to_typed_feature_table(df, vehicle_col, target_col)
+    df = df.reset_index(drop=True)
+
+    if fmt == "arrow":
+        # Uncompressed so the file can be memory-mapped without a decode step
+        df.to_feather(path, compression="uncompressed")
+    else:
+        df.to_parquet(path, index=False)
+    return path
+
+
+def read_feature_table(
+    path: str,
+    columns: Optional[List[str]] = None,
+    memory_map: bool = True,
+) -> pd.DataFrame:
+    """
+    Read a feature table written by `write_feature_table` (or a legacy CSV).
+
+    Only `columns` are read if given (column projection). Arrow IPC files are
+    memory-mapped, so projecting a subset of a wide file touches only those columns.
+    """
+    fmt = feature_file_format(path)
+
+    if fmt == "csv":
+        return pd.read_csv(path, usecols=columns)[columns] if columns else pd.read_csv(path)
+
+    if fmt == "arrow":
+        from pyarrow import feather
+
+        table = feather.read_table(path, columns=columns, memory_map=memory_map)
+    else:
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(path, columns=columns, memory_map=memory_map)
+
+    return table.to_pandas()
+
+
+def read_feature_matrix(
+    path: str,
+    feature_cols: Optional[List[str]] = None,
+    feature_cols_path: Optional[str] = None,
+    vehicle_col: str = "vehicle_id",
+    target_col: str = "in_study_repair",
+    memory_map: bool = True,
+):
+    """
+    Load the model inputs from a feature file.
+
+    The feature list is `feature_cols`, or read from `feature_cols_path`
+    (e.g. deployment/feature_cols.json); if neither is given, every column except
+    the id and target is a feature. Only the needed columns are read.
+
+    Returns (X, y, vehicle_ids); y / vehicle_ids are None if the file lacks them.
+    """
+    if feature_cols is None and feature_cols_path is not None:
+        feature_cols = load_feature_cols(feature_cols_path)
+
+    columns = None
+    if feature_cols is not None:
+        available = read_column_names(path)
+        extra = [c for c in (vehicle_col, target_col) if c in available]
+        columns = extra + list(feature_cols)
+
+    df = read_feature_table(path, columns=columns, memory_map=memory_map)
+
+    if feature_cols is None:
+        feature_cols = [c for c in df.columns if c not in (vehicle_col, target_col)]
+
+    X = df[feature_cols]
+    y = df[target_col] if target_col in df.columns else None
+    vehicle_ids = df[vehicle_col] if vehicle_col in df.columns else None
+    return X, y, vehicle_ids
+
+
+def read_column_names(path: str) -> List[str]:
+    """Column names of a feature file without reading its data."""
+    fmt = feature_file_format(path)
+
+    if fmt == "csv":
+        return pd.read_csv(path, nrows=0).columns.tolist()
+    if fmt == "arrow":
+        import pyarrow as pa
+
+        with pa.memory_map(path, "r") as source:
+            return pa.ipc.open_file(source).schema.names
+
+    import pyarrow.parquet as pq
+
+    return pq.read_schema(path).names
+
+
+# --------------------------------------------------------------------------------------
+# Chunked read / write (bounded memory)
+# --------------------------------------------------------------------------------------
+
+def iter_feature_table(
+    path: str,
+    columns: Optional[List[str]] = None,
+    chunk_rows: int = 100_000,
+    float32_columns: Optional[List[str]] = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Yield a feature table as DataFrames of at most `chunk_rows` rows.
+
+    Only `columns` are read if given. Arrow IPC files are memory-mapped and sliced, so
+    only the current chunk is materialized; Parquet is read batch by batch and CSV
+    with `chunksize` (`float32_columns` are parsed straight to float32).
+    """
+    fmt = feature_file_format(path)
+
+    if fmt == "csv":
+        dtype = {c: np.float32 for c in float32_columns} if float32_columns else None
+        for chunk in pd.read_csv(path, usecols=columns, dtype=dtype, chunksize=chunk_rows):
+            yield chunk[columns] if columns else chunk
+        return
+
+    if fmt == "arrow":
+        import pyarrow as pa
+
+        with pa.memory_map(path, "r") as source:
+            table = pa.ipc.open_file(source).read_all()
+            if columns:
+                table = table.select(columns)
+            for offset in range(0, table.num_rows, chunk_rows):
+                yield table.slice(offset, chunk_rows).to_pandas()
+        return
+
+    import pyarrow.parquet as pq
+
+    for batch in pq.ParquetFile(path, memory_map=True).iter_batches(batch_size=chunk_rows, columns=columns):
+        yield batch.to_pandas()
+
+
+class ChunkedTableWriter:
+    """
+    Append DataFrames with the same columns to one Arrow IPC, Parquet or CSV file
+    (format from the extension), without holding the whole table in memory.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.fmt = feature_file_format(path)
+        self.rows_written = 0
+        self._writer = None
+
+    def write(self, df: pd.DataFrame) -> None:
+        if self.fmt == "csv":
+            df.to_csv(self.path, mode="w" if self.rows_written == 0 else "a",
+                      header=self.rows_written == 0, index=False)
+        else:
+            import pyarrow as pa
+
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._writer is None:
+                if self.fmt == "arrow":
+                    self._writer = pa.ipc.new_file(self.path, table.schema)
+                else:
+                    import pyarrow.parquet as pq
+
+                    self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table)
+        self.rows_written += len(df)
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
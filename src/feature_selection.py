@@ -0,0 +1,90 @@
+"""
+Feature pruning: rank the model's features, keep the top set and retrain on it.
+
+Notebooks 06 and 07 show that most of the ~575 features (mean / std / min / max of every
+histogram bin, seven statistics per counter) carry little weight in the model. A smaller
+feature_cols.json makes every feature build cheaper: `plan_aggregates` in
+src/feature_engineering.py computes only the aggregates a feature list depends on,
+for the offline builds, raw-readout serving (`FeaturePlan.select`) and evaluation alike.
+
+- `rank_by_gain`: the booster's total (or average) split gain per feature.
+- `rank_by_contribution`: mean |SHAP| over a set of rows (src/explain.py).
+- `select_top_features`: the top-k features, or the fewest covering a share of the
+  total importance; features the model never uses are always dropped.
+- `retrain_on_features`: same estimator settings, fitted on the selected columns only.
+"""
+
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+def rank_by_gain(model, feature_names: Sequence[str], importance_type: str = "total_gain") -> Dict[str, float]:
+    """
+    Split gain per feature of an `XGBClassifier` (or `Booster`), largest first.
+    Features the trees never split on get 0.
+    """
+    booster = model.get_booster() if hasattr(model, "get_booster") else model
+    scores = booster.get_score(importance_type=importance_type)
+    if booster.feature_names is None:  # trained on an array: scores are keyed f0, f1, ...
+        scores = {feature_names[int(k[1:])]: v for k, v in scores.items()}
+    ranking = {name: float(scores.get(name, 0.0)) for name in feature_names}
+    return dict(sorted(ranking.items(), key=lambda item: -item[1]))
+
+
+def rank_by_contribution(predictor, X: np.ndarray, feature_names: Sequence[str], batch_rows: int = 10_000,
+                         n_jobs: int = 1, approx: bool = False) -> Dict[str, float]:
+    """Mean |SHAP| per feature of a `BoosterPredictor` over the rows of X, largest first."""
+    from src.explain import feature_contributions, mean_abs_contributions
+
+    contribs = feature_contributions(predictor, X, batch_rows=batch_rows, n_jobs=n_jobs, approx=approx)
+    return mean_abs_contributions(contribs, list(feature_names))
+
+
+def select_top_features(
+    ranking: Dict[str, float],
+    top_k: Optional[int] = None,
+    coverage: Optional[float] = None,
+    feature_order: Optional[Sequence[str]] = None,
+) -> List[str]:
+    """
+    Features to keep from a ranking (`rank_by_gain` / `rank_by_contribution`):
+    the `top_k` best, or the fewest whose importance adds up to `coverage` (0-1) of
+    the total, whichever is smaller if both are given. Zero-importance features are
+    never kept. The result follows `feature_order` (e.g. the current feature_cols.json)
+    if given, otherwise the ranking.
+    """
+    if top_k is None and coverage is None:
+        raise ValueError("Give top_k and/or coverage.")
+
+    names = [name for name, score in sorted(ranking.items(), key=lambda item: -item[1]) if score > 0]
+    keep = len(names)
+    if top_k is not None:
+        keep = min(keep, top_k)
+    if coverage is not None and names:
+        scores = np.array([ranking[name] for name in names], dtype=np.float64)
+        cumulative = np.cumsum(scores) / scores.sum()
+        keep = min(keep, int(np.searchsorted(cumulative, coverage - 1e-12)) + 1)
+
+    selected = set(names[:keep])
+    order = feature_order if feature_order is not None else names
+    return [name for name in order if name in selected]
+
+
+def retrain_on_features(model, X, y, features: List[str], n_jobs: Optional[int] = None):
+    """
+    A fresh copy of an `XGBClassifier` with the same settings, fitted on `X[features]`.
+    If the model was early-stopped, the copy trains for its best round count.
+    """
+    from sklearn.base import clone
+
+    pruned = clone(model)
+    params = {"early_stopping_rounds": None}
+    best_iteration = model.get_booster().attr("best_iteration")
+    if best_iteration is not None:
+        params["n_estimators"] = int(best_iteration) + 1
+    if n_jobs is not None:
+        params["n_jobs"] = n_jobs
+    pruned.set_params(**params)
+    pruned.fit(X[features], np.asarray(y).astype(int))
+    return pruned
@@ -0,0 +1,246 @@
+"""
+Lightweight per-stage timing for scoring and feature building.
+
+Code marks stages with
+
+    with stage("score", "predict"):
+        ...
+
+When instrumentation is off (the default) `stage` returns a shared no-op context
+manager, so a hook costs one function call. When on, every stage records its wall
+time (and optionally the peak traced allocation) into a fixed-bucket histogram.
+
+Export:
+- `prometheus_text()`  – Prometheus text exposition format
+- `snapshot()`         – nested dict (JSON-serializable)
+- structured JSON logs – one line per completed stage with `json_logs=True`
+
+Configure with `configure(...)` or the environment:
+    PDM_METRICS=1 | prometheus   record stages
+    PDM_METRICS=json             record stages and log each one as a JSON line
+    PDM_METRICS_MEMORY=1         also track peak allocations (tracemalloc; slower)
+"""
+
+import bisect
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Histogram upper bounds in seconds (Prometheus style, +Inf implied)
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0,
+)
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class StageHistogram:
+    """Wall-time histogram (+ max peak allocation) of one (component, stage)."""
+
+    __slots__ = ("buckets", "counts", "count", "total", "max", "peak_bytes")
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.peak_bytes: Optional[int] = None
+
+    def observe(self, seconds: float, peak_bytes: Optional[int] = None) -> None:
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        if peak_bytes is not None and (self.peak_bytes is None or peak_bytes > self.peak_bytes):
+            self.peak_bytes = peak_bytes
+
+    def quantile(self, q: float) -> float:
+        """Approximate quantile: upper bound of the bucket holding the q-th observation."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for upper, n in zip(list(self.buckets) + [self.max], self.counts):
+            seen += n
+            if seen >= rank:
+                return min(upper, self.max)
+        return self.max
+
+
+class _Stage:
+    __slots__ = ("registry", "key", "start", "mem_start", "child_peak")
+
+    def __init__(self, registry: "MetricsRegistry", key: Tuple[str, str]):
+        self.registry = registry
+        self.key = key
+
+    def __enter__(self):
+        if self.registry.track_memory:
+            if hasattr(tracemalloc, "reset_peak"):  # Python 3.9+
+                tracemalloc.reset_peak()
+            self.mem_start = tracemalloc.get_traced_memory()[0]
+            self.child_peak = 0
+            self.registry._open_stages().append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        peak_bytes = None
+        if self.registry.track_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            # Absolute peak since entry (net growth where reset_peak is unavailable); nested
+            # stages reset the tracemalloc peak, so their peaks are folded into the parent's
+            peak = max(peak if hasattr(tracemalloc, "reset_peak") else current, self.child_peak)
+            peak_bytes = max(peak - self.mem_start, 0)
+            open_stages = self.registry._open_stages()
+            open_stages.pop()
+            if open_stages:
+                open_stages[-1].child_peak = max(open_stages[-1].child_peak, peak)
+        self.registry.observe(self.key, seconds, peak_bytes)
+        return False
+
+
+class MetricsRegistry:
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.enabled = False
+        self.track_memory = False
+        self.json_logs = False
+        self._histograms: Dict[Tuple[str, str], StageHistogram] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _open_stages(self) -> List["_Stage"]:
+        """Stages currently open on this thread (only maintained with track_memory)."""
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def configure(self, enabled: bool = True, track_memory: bool = False, json_logs: bool = False) -> None:
+        self.enabled = enabled
+        self.json_logs = enabled and json_logs
+        self.track_memory = enabled and track_memory
+        if self.track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def observe(self, key: Tuple[str, str], seconds: float, peak_bytes: Optional[int] = None) -> None:
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = StageHistogram(self.buckets)
+            hist.observe(seconds, peak_bytes)
+
+        if self.json_logs:
+            record = {"metric": "stage", "component": key[0], "stage": key[1], "seconds": round(seconds, 6)}
+            if peak_bytes is not None:
+                record["peak_bytes"] = peak_bytes
+            print(json.dumps(record), file=sys.stdout, flush=False)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+
+    # ----------------------------------------------------------------------------------
+    # Export
+    # ----------------------------------------------------------------------------------
+
+    def snapshot(self) -> Dict[str, Dict[str, Dict]]:
+        """{component: {stage: {count, total_s, mean_ms, p50_ms, p95_ms, p99_ms, max_ms[, peak_bytes]}}}"""
+        with self._lock:
+            items = sorted(self._histograms.items())
+            out: Dict[str, Dict[str, Dict]] = {}
+            for (component, name), h in items:
+                entry = {
+                    "count": h.count,
+                    "total_s": h.total,
+                    "mean_ms": 1000.0 * h.total / h.count if h.count else 0.0,
+                    "p50_ms": 1000.0 * h.quantile(0.50),
+                    "p95_ms": 1000.0 * h.quantile(0.95),
+                    "p99_ms": 1000.0 * h.quantile(0.99),
+                    "max_ms": 1000.0 * h.max,
+                }
+                if h.peak_bytes is not None:
+                    entry["peak_bytes"] = h.peak_bytes
+                out.setdefault(component, {})[name] = entry
+            return out
+
+    def prometheus_text(self, prefix: str = "pdm", gauges: Optional[Dict[str, float]] = None) -> str:
+        """Histograms (and optional extra gauges) in the Prometheus text exposition format."""
+        lines: List[str] = [
+            f"# HELP {prefix}_stage_seconds Wall time per processing stage.",
+            f"# TYPE {prefix}_stage_seconds histogram",
+        ]
+        peak_lines: List[str] = []
+        with self._lock:
+            for (component, name), h in sorted(self._histograms.items()):
+                labels = f'component="{component}",stage="{name}"'
+                cumulative = 0
+                for upper, n in zip(self.buckets, h.counts):
+                    cumulative += n
+                    lines.append(f'{prefix}_stage_seconds_bucket{{{labels},le="{upper}"}} {cumulative}')
+                lines.append(f'{prefix}_stage_seconds_bucket{{{labels},le="+Inf"}} {h.count}')
+                lines.append(f"{prefix}_stage_seconds_sum{{{labels}}} {h.total}")
+                lines.append(f"{prefix}_stage_seconds_count{{{labels}}} {h.count}")
+                if h.peak_bytes is not None:
+                    peak_lines.append(f"{prefix}_stage_peak_bytes{{{labels}}} {h.peak_bytes}")
+
+        if peak_lines:
+            lines += [f"# HELP {prefix}_stage_peak_bytes Largest traced allocation peak per stage.",
+                      f"# TYPE {prefix}_stage_peak_bytes gauge"] + peak_lines
+        for name, value in (gauges or {}).items():
+            lines += [f"# TYPE {prefix}_{name} gauge", f"{prefix}_{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+    def summary_table(self) -> str:
+        """Human-readable per-stage summary, slowest total first."""
+        rows = [(c, s, e) for c, stages in self.snapshot().items() for s, e in stages.items()]
+        rows.sort(key=lambda r: -r[2]["total_s"])
+        lines = [f"{'component':<10} {'stage':<22} {'count':>7} {'total s':>9} {'mean ms':>9} {'max ms':>9}"]
+        for component, name, e in rows:
+            lines.append(f"{component:<10} {name:<22} {e['count']:>7} {e['total_s']:>9.3f} "
+                         f"{e['mean_ms']:>9.3f} {e['max_ms']:>9.3f}")
+        return "\n".join(lines)
+
+
+METRICS = MetricsRegistry()
+
+
+def configure_from_env() -> None:
+    mode = os.environ.get("PDM_METRICS", "").strip().lower()
+    if mode in ("", "0", "off", "false"):
+        return
+    METRICS.configure(
+        enabled=True,
+        track_memory=os.environ.get("PDM_METRICS_MEMORY", "").strip().lower() in ("1", "on", "true"),
+        json_logs=mode == "json",
+    )
+
+
+def stage(component: str, name: str):
+    """Context manager timing one stage; a no-op unless instrumentation is enabled."""
+    if not METRICS.enabled:
+        return _NULL_STAGE
+    return _Stage(METRICS, (component, name))
+
+
+configure_from_env()
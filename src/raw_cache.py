@@ -0,0 +1,204 @@
+"""
+Local cache for raw SCANIA input files read from ADLS (or any fsspec filesystem).
+
+Each remote CSV is parsed once and stored locally as a typed Arrow IPC file.
+Entries are content-addressed: the key hashes the filesystem protocol, the remote
+path, the remote version (ETag, or size + modification time) and the read options,
+so a changed remote file or different parsing options never hit a stale entry.
+
+- Size-bounded: least recently used entries are evicted above `max_bytes`.
+- Explicit invalidation: `invalidate(path)` or `invalidate()` for everything
+  (see scripts/manage_raw_cache.py for the command-line version).
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+# fsspec `info()` keys that identify a remote file version, in order of preference
+_VERSION_KEYS = ("etag", "ETag", "content_md5", "md5")
+_MTIME_KEYS = ("last_modified", "LastModified", "mtime", "modified", "created")
+
+
+def remote_fingerprint(fs, path: str) -> str:
+    """
+    Version of a remote file: its ETag (or content hash) if the filesystem reports
+    one, otherwise size + modification time.
+    """
+    info = fs.info(path)
+    for key in _VERSION_KEYS:
+        if info.get(key):
+            return f"{key}={info[key]}"
+
+    mtime = next((info[key] for key in _MTIME_KEYS if info.get(key) is not None), None)
+    return f"size={info.get('size')};mtime={mtime}"
+
+
+def _protocol(fs) -> str:
+    protocol = getattr(fs, "protocol", "")
+    return protocol if isinstance(protocol, str) else protocol[0]
+
+
+class RawDataCache:
+    """
+    Parsed-CSV cache in `cache_dir`: one `<key>.arrow` data file plus a
+    `<key>.json` manifest (remote path, fingerprint, read options, size) per entry.
+    The data file's mtime is the last-use time for LRU eviction.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: Optional[int] = None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    # ----------------------------------------------------------------------------------
+    # Keys / entries
+    # ----------------------------------------------------------------------------------
+
+    def key(self, fs, path: str, fingerprint: str, read_csv_kwargs: Dict) -> str:
+        payload = json.dumps(
+            {
+                "protocol": _protocol(fs),
+                "path": path,
+                "fingerprint": fingerprint,
+                "read_csv_kwargs": read_csv_kwargs,
+            },
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _data_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.arrow")
+
+    def _manifest_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def entries(self) -> List[Dict]:
+        """Manifests of all complete cache entries, least recently used first."""
+        out = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            key = name[: -len(".json")]
+            data_path = self._data_path(key)
+            try:
+                with open(self._manifest_path(key), "r") as f:
+                    manifest = json.load(f)
+                manifest["bytes"] = os.path.getsize(data_path)
+                manifest["last_used"] = os.path.getmtime(data_path)
+            except FileNotFoundError:
+                # Incomplete, or removed by a concurrent evict / invalidate since the listing
+                continue
+            manifest["key"] = key
+            out.append(manifest)
+        return sorted(out, key=lambda m: m["last_used"])
+
+    def total_bytes(self) -> int:
+        return sum(m["bytes"] for m in self.entries())
+
+    # ----------------------------------------------------------------------------------
+    # Read-through
+    # ----------------------------------------------------------------------------------
+
+    def read_csv(self, fs, path: str, **read_csv_kwargs) -> pd.DataFrame:
+        """
+        Return the parsed CSV at `path` on `fs`, from the local cache when the
+        remote version is unchanged, otherwise download, parse and store it.
+        """
+        return self.load(fs, path, **read_csv_kwargs)[0]
+
+    def load(self, fs, path: str, **read_csv_kwargs) -> Tuple[pd.DataFrame, bool]:
+        """Like `read_csv`, plus whether the file was served from the cache."""
+        fingerprint = remote_fingerprint(fs, path)
+        key = self.key(fs, path, fingerprint, read_csv_kwargs)
+        data_path = self._data_path(key)
+
+        if os.path.exists(data_path) and os.path.exists(self._manifest_path(key)):
+            try:
+                df = pd.read_feather(data_path)
+                os.utime(data_path)  # mark as recently used
+            except FileNotFoundError:
+                df = None  # evicted concurrently: fall through to a download
+            if df is not None:
+                print(f"  cache hit: {path} ({fingerprint})")
+                return df, True
+
+        with fs.open(path, "rb") as f:
+            df = pd.read_csv(f, **read_csv_kwargs)
+        self._store(key, df, {
+            "path": path,
+            "protocol": _protocol(fs),
+            "fingerprint": fingerprint,
+            "read_csv_kwargs": {k: repr(v) for k, v in read_csv_kwargs.items()},
+            "created": time.time(),
+        })
+        print(f"  cache miss: {path} ({fingerprint}) – stored locally")
+        return df, False
+
+    def _store(self, key: str, df: pd.DataFrame, manifest: Dict) -> None:
+        """Write data + manifest atomically, then evict if over budget."""
+        data_path = self._data_path(key)
+        # Per process and thread, so concurrent loads of the same file don't share temp files
+        suffix = f"{os.getpid()}.{threading.get_ident()}.tmp"
+        tmp_data = f"{data_path}.{suffix}"
+        df.reset_index(drop=True).to_feather(tmp_data, compression="uncompressed")
+        os.replace(tmp_data, data_path)
+
+        manifest_path = self._manifest_path(key)
+        tmp_manifest = f"{manifest_path}.{suffix}"
+        with open(tmp_manifest, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_manifest, manifest_path)
+
+        self.evict(keep=key)
+
+    # ----------------------------------------------------------------------------------
+    # Eviction / invalidation
+    # ----------------------------------------------------------------------------------
+
+    def _remove(self, key: str) -> None:
+        for p in (self._data_path(key), self._manifest_path(key)):
+            try:
+                os.remove(p)
+            except FileNotFoundError:
+                pass  # already removed by a concurrent evict / invalidate
+
+    def evict(self, keep: Optional[str] = None) -> List[str]:
+        """
+        Drop least recently used entries until the cache fits in `max_bytes`.
+        The entry `keep` (the one just written) is never evicted.
+        Returns the evicted remote paths.
+        """
+        if self.max_bytes is None:
+            return []
+
+        entries = self.entries()
+        total = sum(m["bytes"] for m in entries)
+        evicted = []
+        for m in entries:
+            if total <= self.max_bytes:
+                break
+            if m["key"] == keep:
+                continue
+            self._remove(m["key"])
+            total -= m["bytes"]
+            evicted.append(m["path"])
+        return evicted
+
+    def invalidate(self, path: Optional[str] = None) -> int:
+        """
+        Remove all entries for remote `path` (every version / read option),
+        or the whole cache if `path` is None. Returns the number of entries removed.
+        """
+        removed = 0
+        for m in self.entries():
+            if path is None or m["path"] == path:
+                self._remove(m["key"])
+                removed += 1
+        return removed
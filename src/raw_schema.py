@@ -0,0 +1,114 @@
+"""
+Declared schema of the raw SCANIA tables: operational readouts, TTE / labels and
+specifications.
+
+Without dtypes, `pd.read_csv` loads every counter and histogram bin as float64, ids as
+int64 and the Spec_* columns as Python strings (object). The read options built here
+declare instead:
+- histogram bins (97 of the 105 sensor columns): float32 (`histogram_dtype`)
+- counters: float64. They are cumulative (odometer-like), and first/last/delta/std/slope
+  are differences of large values that float32 would round away.
+- vehicle_id: int32; in_study_repair / class_label / label: int8
+- time_step: float64 (fractional in the SCANIA data; it orders the readouts and is
+  the x of every trend fit)
+- Spec_* columns: category
+and parse only the columns a build uses (`usecols`).
+
+The aggregation engine computes in float64, so float32 bins only round the stored
+readouts to ~7 significant digits. Pass histogram_dtype="float64" to keep the exact
+CSV values.
+"""
+
+from typing import Dict, Iterable, List, Optional
+
+VEHICLE_COL = "vehicle_id"
+TIME_COL = "time_step"
+TARGET_COL = "in_study_repair"
+
+# Counter columns (single-value counters)
+COUNTER_COLS: List[str] = [
+    "171_0", "666_0", "427_0", "837_0",
+    "309_0", "835_0", "370_0", "100_0",
+]
+
+# Histogram prefixes (each prefix corresponds to a set of bin columns)
+HISTOGRAM_PREFIXES: List[str] = ["167_", "272_", "291_", "158_", "459_", "397_"]
+
+# Label columns of the TTE (train) and label (validation / test) files
+LABEL_COLS: List[str] = [TARGET_COL, "class_label", "label"]
+
+VEHICLE_DTYPE = "int32"
+TIME_DTYPE = "float64"
+COUNTER_DTYPE = "float64"
+HISTOGRAM_DTYPE = "float32"
+LABEL_DTYPE = "int8"
+SPEC_DTYPE = "category"
+
+
+def infer_histogram_groups(columns, prefixes=HISTOGRAM_PREFIXES) -> Dict[str, List[str]]:
+    """
+    Build a dict: base_prefix -> [list of columns], e.g. "167" -> ["167_0", ..., "167_9"].
+    """
+    histogram_groups: Dict[str, List[str]] = {}
+    for prefix in prefixes:
+        cols = [c for c in columns if c.startswith(prefix)]
+        if cols:
+            histogram_groups[prefix[:-1]] = cols  # "167_" -> "167"
+    return histogram_groups
+
+
+def sensor_columns(columns: Iterable[str]) -> List[str]:
+    """Counter and histogram bin columns among `columns`, in file order."""
+    counters = set(COUNTER_COLS)
+    return [c for c in columns if c in counters or any(c.startswith(p) for p in HISTOGRAM_PREFIXES)]
+
+
+def operational_read_options(
+    columns: Iterable[str],
+    histogram_dtype: str = HISTOGRAM_DTYPE,
+    vehicle_col: str = VEHICLE_COL,
+    time_col: str = TIME_COL,
+) -> Dict:
+    """
+    `pd.read_csv` options for operational readouts: vehicle, time and the given sensor
+    columns only (e.g. all of them, or `AggregateNeeds.raw_columns` of a pruned list).
+    """
+    sensors = [c for c in columns if c not in (vehicle_col, time_col)]
+    counters = set(COUNTER_COLS)
+    dtype = {vehicle_col: VEHICLE_DTYPE, time_col: TIME_DTYPE}
+    dtype.update({c: COUNTER_DTYPE if c in counters else histogram_dtype for c in sensors})
+    return {"usecols": [vehicle_col, time_col] + sensors, "dtype": dtype}
+
+
+def label_read_options(header: Iterable[str], vehicle_col: str = VEHICLE_COL) -> Dict:
+    """`pd.read_csv` options for a TTE / label file with this header: vehicle + label column."""
+    header = list(header)
+    label_col = next((c for c in LABEL_COLS if c in header), None)
+    if label_col is None:
+        raise KeyError(f"No label column ({', '.join(LABEL_COLS)}) in {header}")
+    return {
+        "usecols": [vehicle_col, label_col],
+        "dtype": {vehicle_col: VEHICLE_DTYPE, label_col: LABEL_DTYPE},
+    }
+
+
+def specification_read_options(header: Iterable[str], vehicle_col: str = VEHICLE_COL) -> Dict:
+    """`pd.read_csv` options for a specifications file with this header: categorical specs."""
+    dtype = {c: SPEC_DTYPE for c in header if c != vehicle_col}
+    dtype[vehicle_col] = VEHICLE_DTYPE
+    return {"dtype": dtype}
+
+
+def raw_read_options(kind: str, header: Iterable[str], histogram_dtype: str = HISTOGRAM_DTYPE,
+                     columns: Optional[Iterable[str]] = None) -> Dict:
+    """
+    Read options for one raw file: kind is "oper", "tte" or "spec". For "oper",
+    `columns` restricts the sensors read (default: every sensor column in the header).
+    """
+    if kind == "oper":
+        return operational_read_options(sensor_columns(header) if columns is None else columns, histogram_dtype)
+    if kind == "tte":
+        return label_read_options(header)
+    if kind == "spec":
+        return specification_read_options(header)
+    raise ValueError(f"Unknown raw file kind '{kind}'")
@@ -0,0 +1,208 @@
+"""
+Decoding of scoring request payloads into a contiguous float32 feature matrix.
+
+Supported feature payloads (see docs/10_online_inference.md):
+- rows:      {"data": [{"<feature>": value, ...}, ...]}        – original format
+- columnar:  {"columns": [...], "values": [[...], ...]}        – names sent once
+- binary:    NumPy `.npy` or Arrow IPC bytes, optionally gzip / bz2 / xz compressed,
+             either as the raw request body or base64-encoded in
+             {"payload": "<base64>", "format": "npy" | "arrow", "compression": ...}
+
+Columns are mapped to the model's column order with an index built once
+(`ColumnIndex`), so no per-request DataFrame reshaping is needed.
+"""
+
+import base64
+import bz2
+import gzip
+import io
+import lzma
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+NPY_MAGIC = b"\x93NUMPY"
+ARROW_FILE_MAGIC = b"ARROW1"
+ARROW_STREAM_PREFIX = b"\xff\xff\xff\xff"
+
+_DECOMPRESSORS = {
+    "gzip": gzip.decompress,
+    "bz2": bz2.decompress,
+    "xz": lzma.decompress,
+}
+_COMPRESSION_MAGIC = {
+    b"\x1f\x8b": "gzip",
+    b"BZh": "bz2",
+    b"\xfd7zXZ": "xz",
+}
+
+
+def detect_compression(payload: bytes) -> Optional[str]:
+    for magic, name in _COMPRESSION_MAGIC.items():
+        if payload.startswith(magic):
+            return name
+    return None
+
+
+def decompress(payload: bytes, compression: Optional[str] = None) -> bytes:
+    """Decompress `payload` (compression given, or detected from its magic bytes)."""
+    compression = compression or detect_compression(payload)
+    if compression is None:
+        return payload
+    if compression not in _DECOMPRESSORS:
+        raise ValueError(f"Unsupported compression '{compression}'. Expected one of: {sorted(_DECOMPRESSORS)}")
+    return _DECOMPRESSORS[compression](payload)
+
+
+def binary_format(payload: bytes) -> Optional[str]:
+    """'npy' / 'arrow' for an (uncompressed) binary payload, None if it is not one."""
+    if payload.startswith(NPY_MAGIC):
+        return "npy"
+    if payload.startswith(ARROW_FILE_MAGIC) or payload.startswith(ARROW_STREAM_PREFIX):
+        return "arrow"
+    return None
+
+
+class ColumnIndex:
+    """
+    Model column order plus a name -> position map, built once at startup.
+    Every `from_*` method returns a C-contiguous float32 array of shape (n_rows, n_features).
+    """
+
+    def __init__(self, feature_cols: List[str]):
+        self.feature_cols = list(feature_cols)
+        self.position = {c: i for i, c in enumerate(self.feature_cols)}
+        self._last_columns: Optional[Tuple[str, ...]] = None
+        self._last_take: Optional[np.ndarray] = None
+
+    @property
+    def n_features(self) -> int:
+        return len(self.feature_cols)
+
+    def _take(self, columns: Sequence[str]) -> Optional[np.ndarray]:
+        """
+        Source column index for every model column (None if `columns` is already the
+        model order). The mapping for the most recent column list is reused.
+        """
+        columns = tuple(columns)
+        if columns == self._last_columns:
+            return self._last_take
+
+        if list(columns) == self.feature_cols:
+            take = None
+        else:
+            # Model position of every payload column (-1 = not a model column, ignored)
+            dst = np.fromiter((self.position.get(c, -1) for c in columns), dtype=np.int64, count=len(columns))
+            known = dst >= 0
+            take = np.full(self.n_features, -1, dtype=np.int64)
+            take[dst[known]] = np.flatnonzero(known)
+            if (take < 0).any():
+                missing = [self.feature_cols[j] for j in np.flatnonzero(take < 0)[:5]]
+                raise ValueError(
+                    f"Payload is missing {int((take < 0).sum())} model columns, e.g. {missing}"
+                )
+
+        self._last_columns, self._last_take = columns, take
+        return take
+
+    def _check_width(self, X: np.ndarray) -> np.ndarray:
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected a matrix with {self.n_features} columns, got shape {X.shape}")
+        return X
+
+    # ----------------------------------------------------------------------------------
+    # JSON payloads
+    # ----------------------------------------------------------------------------------
+
+    def from_rows(self, rows: List[Dict]) -> np.ndarray:
+        """
+        Original format: a list of {feature: value} dicts (extra keys are ignored).
+        Rows are written straight into the output matrix; a key absent from a row is
+        missing (NaN), a key absent from every row is an error, as with a DataFrame.
+        """
+        if isinstance(rows, dict):
+            rows = [rows]
+        if not rows:
+            raise ValueError("'data' contains no rows.")
+
+        nan = float("nan")
+        X = np.empty((len(rows), self.n_features), dtype=np.float32)
+        for i, row in enumerate(rows):
+            X[i] = [row.get(c, nan) for c in self.feature_cols]
+
+        if any(len(row) < self.n_features for row in rows):
+            present = set().union(*rows)
+            missing = [c for c in self.feature_cols if c not in present]
+            if missing:
+                raise ValueError(f"Payload is missing {len(missing)} model columns, e.g. {missing[:5]}")
+        return X
+
+    def from_columns(self, columns: Sequence[str], values) -> np.ndarray:
+        """Columnar format: column names once plus a row-major value matrix (None = missing)."""
+        M = np.array(values, dtype=np.float32, ndmin=2)
+        if M.ndim != 2 or M.shape[1] != len(columns):
+            raise ValueError(f"'values' must have {len(columns)} columns, got shape {M.shape}")
+        take = self._take(columns)
+        return np.ascontiguousarray(M if take is None else M[:, take])
+
+    # ----------------------------------------------------------------------------------
+    # Binary payloads
+    # ----------------------------------------------------------------------------------
+
+    def from_npy(self, payload: bytes, columns: Optional[Sequence[str]] = None) -> np.ndarray:
+        """`.npy` matrix in model column order, or in `columns` order if given."""
+        M = np.load(io.BytesIO(payload), allow_pickle=False)
+        if M.ndim == 1:
+            M = M.reshape(1, -1)
+        if columns is not None:
+            M = self.from_columns(columns, M)
+        return self._check_width(np.ascontiguousarray(M, dtype=np.float32))
+
+    def from_arrow(self, payload: bytes) -> np.ndarray:
+        """Arrow IPC file or stream; columns are matched by name."""
+        import pyarrow as pa
+
+        reader = pa.ipc.open_file if payload.startswith(ARROW_FILE_MAGIC) else pa.ipc.open_stream
+        table = reader(pa.BufferReader(payload)).read_all()
+
+        available = set(table.column_names)
+        missing = [c for c in self.feature_cols if c not in available]
+        if missing:
+            raise ValueError(f"Payload is missing {len(missing)} model columns, e.g. {missing[:5]}")
+
+        X = np.empty((table.num_rows, self.n_features), dtype=np.float32)
+        for j, name in enumerate(self.feature_cols):
+            X[:, j] = table.column(name).to_numpy(zero_copy_only=False)
+        return X
+
+    def from_binary(self, payload: bytes, fmt: Optional[str] = None, compression: Optional[str] = None,
+                    columns: Optional[Sequence[str]] = None) -> np.ndarray:
+        payload = decompress(bytes(payload), compression)
+        fmt = fmt or binary_format(payload)
+        if fmt == "npy":
+            return self.from_npy(payload, columns)
+        if fmt == "arrow":
+            return self.from_arrow(payload)
+        raise ValueError("Binary payload is neither a NumPy .npy nor an Arrow IPC buffer.")
+
+    # ----------------------------------------------------------------------------------
+    # Dispatch
+    # ----------------------------------------------------------------------------------
+
+    def from_request(self, data: Dict) -> np.ndarray:
+        """Feature matrix for a decoded JSON request in any of the supported layouts."""
+        if "payload" in data:
+            return self.from_binary(
+                base64.b64decode(data["payload"]),
+                fmt=data.get("format"),
+                compression=data.get("compression"),
+                columns=data.get("columns"),
+            )
+        if "columns" in data and "values" in data:
+            return self.from_columns(data["columns"], data["values"])
+        if "data" in data:
+            return self.from_rows(data["data"])
+        raise ValueError(
+            "Request JSON must contain 'data' (rows), 'columns' + 'values', 'payload' (binary) "
+            "or 'readouts' (raw)."
+        )
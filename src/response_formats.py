@@ -0,0 +1,107 @@
+"""
+Encoding of scoring results into response bodies.
+
+Supported layouts (request field "response", see docs/10_online_inference.md):
+- rows:      {"results": [{"failure_probability": p, "failure_imminent": l,
+                           "threshold_used": t, ...}, ...]}               – default
+- columnar:  {"failure_probability": [...], "failure_imminent": [...],
+              "threshold_used": t, ...}                                   – threshold sent once
+- ndjson:    one rows-layout result object per line, encoded chunk by chunk so a
+             streamed response never holds the whole batch
+
+Optional per-row fields: "vehicle_id" (raw-readout requests), "cached" (prediction
+cache on) and "explanation" (top feature contributions, request field "explain").
+
+Bodies are encoded with orjson when it is installed, otherwise with json. Both write
+probabilities with the shortest round-trip float representation.
+"""
+
+import json
+from typing import Dict, List, Optional
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # optional, plain json is used instead
+    orjson = None
+
+RESPONSE_FORMATS = ("rows", "columnar", "ndjson")
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+
+
+def dumps(obj) -> str:
+    """JSON-encode `obj` (plain Python types) with the fastest available encoder."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj)
+
+
+def result_columns(
+    proba: np.ndarray,
+    threshold: float,
+    vehicle_ids: Optional[np.ndarray] = None,
+    cached: Optional[np.ndarray] = None,
+    explanations: Optional[List] = None,
+) -> Dict[str, List]:
+    """Per-row result fields as parallel Python lists (one bulk conversion per field)."""
+    proba = np.asarray(proba, dtype=np.float64)
+    columns = {
+        "failure_probability": proba.tolist(),
+        "failure_imminent": (proba >= threshold).tolist(),
+    }
+    if vehicle_ids is not None:
+        columns["vehicle_id"] = np.asarray(vehicle_ids).tolist()
+    if cached is not None:
+        columns["cached"] = np.asarray(cached).tolist()
+    if explanations is not None:
+        columns["explanation"] = explanations
+    return columns
+
+
+def _result_rows(columns: Dict[str, List], threshold: float) -> List[Dict]:
+    extra = [name for name in ("vehicle_id", "cached", "explanation") if name in columns]
+    rows = [
+        {"failure_probability": p, "failure_imminent": l, "threshold_used": threshold}
+        for p, l in zip(columns["failure_probability"], columns["failure_imminent"])
+    ]
+    for name in extra:
+        for row, value in zip(rows, columns[name]):
+            row[name] = value
+    return rows
+
+
+def encode_results(
+    proba: np.ndarray,
+    threshold: float,
+    vehicle_ids: Optional[np.ndarray] = None,
+    cached: Optional[np.ndarray] = None,
+    layout: str = "rows",
+    explanations: Optional[List] = None,
+) -> str:
+    """Complete response body in the rows or columnar layout."""
+    columns = result_columns(proba, threshold, vehicle_ids, cached, explanations)
+    if layout == "columnar":
+        return dumps({
+            "failure_probability": columns.pop("failure_probability"),
+            "failure_imminent": columns.pop("failure_imminent"),
+            "threshold_used": threshold,
+            **columns,
+        })
+    if layout == "rows":
+        return dumps({"results": _result_rows(columns, threshold)})
+    raise ValueError(f"Unsupported response format '{layout}'. Expected one of: {list(RESPONSE_FORMATS)}")
+
+
+def encode_ndjson(
+    proba: np.ndarray,
+    threshold: float,
+    vehicle_ids: Optional[np.ndarray] = None,
+    cached: Optional[np.ndarray] = None,
+    explanations: Optional[List] = None,
+) -> str:
+    """NDJSON lines (each terminated by a newline) for one chunk of results."""
+    rows = _result_rows(result_columns(proba, threshold, vehicle_ids, cached, explanations), threshold)
+    if not rows:
+        return ""
+    return "\n".join(dumps(row) for row in rows) + "\n"
@@ -0,0 +1,114 @@
+"""
+In-process cache of predictions for unchanged feature vectors.
+
+Entries are keyed by a keyed BLAKE2b digest of the row's float32 bytes (the ordered
+FEATURE_COLS values); the hash key is the model + threshold version, so predictions of
+another model can never be returned. Setting a new version also clears the cache.
+
+Bounded by entry count (least recently used evicted first) and by age (TTL).
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# Suggested size when the cache is turned on; score.py keeps it off unless
+# SCORE_CACHE_MAX_ENTRIES is set
+DEFAULT_MAX_ENTRIES = 100_000
+DEFAULT_TTL_SECONDS = 3600.0
+
+
+def file_fingerprint(path: str, chunk_size: int = 1 << 20) -> str:
+    """Short content hash of a file (e.g. the registered model), used as its version."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+class PredictionCache:
+    """Thread-safe LRU + TTL map from feature-row digest to predicted probability."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.version = ""
+        self._hash_key = b""
+        self._entries: "OrderedDict[bytes, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "clears": 0}
+
+    def set_version(self, version: str) -> None:
+        """Bind the cache to a model / threshold version; a different version clears it."""
+        if version == self.version:
+            return
+        with self._lock:
+            if self._entries:
+                self._entries.clear()
+                self._counters["clears"] += 1
+            self.version = version
+            self._hash_key = hashlib.blake2b(version.encode("utf-8"), digest_size=32).digest()
+
+    def keys_for(self, X: np.ndarray) -> List[bytes]:
+        """One digest per row of a float32 matrix."""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        rows = X.view(np.uint8).reshape(len(X), -1)
+        key = self._hash_key
+        return [hashlib.blake2b(row, digest_size=16, key=key).digest() for row in rows]
+
+    def lookup(self, keys: List[bytes]) -> Tuple[np.ndarray, np.ndarray]:
+        """(values, hit): cached probabilities (NaN for misses) and the hit mask."""
+        values = np.full(len(keys), np.nan)
+        hit = np.zeros(len(keys), dtype=bool)
+        now = time.monotonic()
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                value, expires_at = entry
+                if expires_at < now:
+                    del self._entries[key]
+                    self._counters["expirations"] += 1
+                    continue
+                self._entries.move_to_end(key)
+                values[i] = value
+                hit[i] = True
+
+            n_hits = int(hit.sum())
+            self._counters["hits"] += n_hits
+            self._counters["misses"] += len(keys) - n_hits
+        return values, hit
+
+    def store(self, keys: List[bytes], values: np.ndarray) -> None:
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            for key, value in zip(keys, values.tolist()):
+                self._entries[key] = (value, expires_at)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._counters["clears"] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {
+                **self._counters,
+                "hit_rate": self._counters["hits"] / lookups if lookups else 0.0,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "version": self.version,
+            }
@@ -0,0 +1,137 @@
+"""
+Cost-based decision threshold search and the deployed threshold config.
+
+`threshold_sweep` sorts the predicted probabilities once and gets the confusion
+matrix at every distinct threshold from cumulative sums, so all candidate
+thresholds are evaluated in O(n log n) instead of one pass over the labels per
+grid point. Predictions follow the serving rule: failure if proba >= threshold.
+
+`best_cost_threshold` picks the cost-optimal threshold exactly (no grid), and
+`write_threshold_config` / `load_threshold_config` handle threshold_config.json,
+which deployment/score.py reads at startup.
+"""
+
+import json
+import os
+from typing import Dict, Optional
+
+import numpy as np
+
+FN_COST = 50  # cost per false negative (missed failure)
+FP_COST = 1   # cost per false positive (false alarm)
+THRESHOLD_CONFIG_FILENAME = "threshold_config.json"
+
+
+def threshold_sweep(
+    y_true: np.ndarray,
+    y_proba: np.ndarray,
+    fn_cost: float = FN_COST,
+    fp_cost: float = FP_COST,
+) -> Dict[str, np.ndarray]:
+    """
+    Confusion matrix, cost, precision, recall and F1 at every distinct threshold.
+
+    Returns a dict of equal-length arrays, ordered by decreasing threshold. Row k
+    predicts failure for proba >= threshold[k]; the first row (threshold above every
+    probability) predicts no failures at all.
+    """
+    y_true = np.asarray(y_true).astype(bool)
+    y_proba = np.asarray(y_proba, dtype=np.float64)
+    if y_true.shape != y_proba.shape:
+        raise ValueError(f"y_true and y_proba must have the same shape, got {y_true.shape} and {y_proba.shape}.")
+
+    order = np.argsort(-y_proba, kind="mergesort")
+    proba_desc = y_proba[order]
+    positives_desc = y_true[order]
+
+    # Last position of each run of equal probabilities: everything up to it is predicted positive
+    distinct_end = np.flatnonzero(np.diff(proba_desc) != 0)
+    distinct_end = np.append(distinct_end, len(proba_desc) - 1)
+
+    tp = np.concatenate([[0], np.cumsum(positives_desc)[distinct_end]])
+    predicted = np.concatenate([[0], distinct_end + 1])
+    fp = predicted - tp
+    n_pos = int(y_true.sum())
+    fn = n_pos - tp
+    tn = len(y_true) - n_pos - fp
+
+    # Next float32 above the highest probability (also above it in a float32 comparison)
+    above_all = float(np.nextafter(np.float32(proba_desc[0]), np.float32(np.inf))) if len(proba_desc) else 1.0
+    thresholds = np.concatenate([[above_all], proba_desc[distinct_end]])
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.where(predicted > 0, tp / predicted, 0.0)
+        recall = np.where(n_pos > 0, tp / max(n_pos, 1), 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+
+    return {
+        "threshold": thresholds,
+        "cost": fn_cost * fn + fp_cost * fp,
+        "tp": tp,
+        "fp": fp,
+        "fn": fn,
+        "tn": tn,
+        "precision": precision,
+        "recall": recall,
+        "f1": f1,
+    }
+
+
+def best_cost_threshold(
+    y_true: np.ndarray,
+    y_proba: np.ndarray,
+    fn_cost: float = FN_COST,
+    fp_cost: float = FP_COST,
+) -> Dict[str, float]:
+    """
+    Cost-optimal threshold and its metrics.
+
+    Every threshold between the optimal probability and the next lower distinct
+    probability gives the same predictions; the midpoint is returned so the decision
+    boundary does not sit exactly on an observed score. Ties in cost go to the
+    highest threshold (fewest alarms).
+    """
+    sweep = threshold_sweep(y_true, y_proba, fn_cost, fp_cost)
+    k = int(np.argmin(sweep["cost"]))  # first minimum = highest threshold
+
+    threshold = float(sweep["threshold"][k])
+    if k + 1 < len(sweep["threshold"]):
+        lower = float(sweep["threshold"][k + 1])
+        # Kept representable in float32 (the model's output type), so a float32 comparison
+        # proba >= threshold makes the same decisions as a float64 one
+        midpoint = float(np.float32((threshold + lower) / 2.0))
+        if lower < midpoint <= threshold:
+            threshold = midpoint
+
+    result = {name: float(values[k]) for name, values in sweep.items()}
+    result["threshold"] = threshold
+    for name in ("tp", "fp", "fn", "tn"):
+        result[name] = int(result[name])
+    return result
+
+
+def write_threshold_config(path: str, result: Dict[str, float], fn_cost: float = FN_COST,
+                           fp_cost: float = FP_COST, **extra) -> str:
+    """Write threshold_config.json: the deployed threshold, the costs it was chosen for and its metrics."""
+    config = {
+        "best_threshold": result["threshold"],
+        "fn_cost": fn_cost,
+        "fp_cost": fp_cost,
+        "metrics": {k: v for k, v in result.items() if k != "threshold"},
+        **extra,
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(config, f, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_threshold_config(path: str, default: Optional[float] = None) -> float:
+    """The `best_threshold` of a threshold_config.json; `default` if the file does not exist."""
+    if not os.path.exists(path):
+        if default is None:
+            raise FileNotFoundError(f"Threshold config not found: {path}")
+        return default
+    with open(path, "r") as f:
+        return float(json.load(f)["best_threshold"])
@@ -0,0 +1,211 @@
+"""
+Array-backed evaluation of the tuned XGBoost ensemble, with NumPy as the only dependency.
+
+`export_tree_ensemble` flattens a trained booster into padded (n_trees, max_nodes)
+arrays (split feature, threshold, left / right child, missing-value direction, leaf
+value). `TreeEnsemble.predict_proba` then walks every tree for a whole batch at once:
+one gather + compare per tree level instead of per-row, per-node Python work.
+
+Leaves point to themselves, so all rows can take the same number of steps (the
+deepest tree's depth) without branching on "is leaf". Splits follow XGBoost:
+go left if x < threshold (compared in float32), missing values go to the default
+child. Probabilities match `XGBClassifier.predict_proba(X)[:, 1]` up to float
+summation order (~1e-6).
+
+Only numerical splits of binary:logistic gbtree models are supported.
+"""
+
+import json
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+ARRAY_FIELDS = ("feature", "threshold", "left", "right", "default_left", "value")
+
+
+def _parse_float(value: str) -> float:
+    # base_score is serialized as e.g. "5E-1" or "[5.04E-1]" depending on the version
+    return float(str(value).strip("[]"))
+
+
+def export_tree_ensemble(model, iteration_range: Optional[Tuple[int, int]] = None) -> "TreeEnsemble":
+    """
+    Flatten an `XGBClassifier` (or `Booster`) into a `TreeEnsemble`.
+
+    `iteration_range` defaults to the early-stopping range used by `predict_proba`
+    (all trees if the model has no best_iteration).
+    """
+    booster = model.get_booster() if hasattr(model, "get_booster") else model
+    learner = json.loads(booster.save_raw(raw_format="json"))["learner"]
+
+    objective = learner["objective"]["name"]
+    if objective != "binary:logistic":
+        raise ValueError(f"Only binary:logistic models are supported, got '{objective}'.")
+    gbtree = learner["gradient_booster"]
+    if gbtree["name"] != "gbtree":
+        raise ValueError(f"Only gbtree boosters are supported, got '{gbtree['name']}'.")
+
+    trees = gbtree["model"]["trees"]
+    indptr = gbtree["model"].get("iteration_indptr") or list(range(len(trees) + 1))
+    if iteration_range is None:
+        best_iteration = booster.attr("best_iteration")
+        iteration_range = (0, int(best_iteration) + 1) if best_iteration is not None else (0, 0)
+    first, last = iteration_range
+    if last == 0:
+        last = len(indptr) - 1
+    trees = trees[indptr[first]: indptr[last]]
+
+    n_trees = len(trees)
+    max_nodes = max(int(t["tree_param"]["num_nodes"]) for t in trees)
+    # Padding slots are self-loops like leaves
+    self_loops = np.tile(np.arange(max_nodes, dtype=np.int32), (n_trees, 1))
+    arrays = {
+        "feature": np.zeros((n_trees, max_nodes), dtype=np.int32),
+        "threshold": np.zeros((n_trees, max_nodes), dtype=np.float32),
+        "left": self_loops.copy(),
+        "right": self_loops.copy(),
+        "default_left": np.zeros((n_trees, max_nodes), dtype=bool),
+        "value": np.zeros((n_trees, max_nodes), dtype=np.float32),
+    }
+    for i, tree in enumerate(trees):
+        if any(tree.get("split_type", [])):
+            raise ValueError("Categorical splits are not supported by the array evaluator.")
+        left = np.asarray(tree["left_children"], dtype=np.int32)
+        right = np.asarray(tree["right_children"], dtype=np.int32)
+        n = len(left)
+        nodes = np.arange(n, dtype=np.int32)
+        is_leaf = left == -1
+
+        arrays["feature"][i, :n] = np.where(is_leaf, 0, tree["split_indices"])
+        arrays["threshold"][i, :n] = np.where(is_leaf, 0.0, tree["split_conditions"])
+        arrays["left"][i, :n] = np.where(is_leaf, nodes, left)
+        arrays["right"][i, :n] = np.where(is_leaf, nodes, right)
+        arrays["default_left"][i, :n] = np.asarray(tree["default_left"], dtype=bool)
+        # For leaves XGBoost stores the leaf value in split_conditions
+        arrays["value"][i, :n] = np.where(is_leaf, tree["split_conditions"], 0.0)
+
+    base_score = _parse_float(learner["learner_model_param"]["base_score"])
+    missing = getattr(model, "missing", np.nan)
+    return TreeEnsemble(
+        **arrays,
+        base_margin=float(np.log(base_score / (1.0 - base_score))),
+        n_features=int(learner["learner_model_param"]["num_feature"]),
+        missing=np.nan if missing is None else float(missing),
+    )
+
+
+class TreeEnsemble:
+    """Padded tree arrays plus a batch evaluator (see module docstring)."""
+
+    def __init__(
+        self,
+        feature: np.ndarray,
+        threshold: np.ndarray,
+        left: np.ndarray,
+        right: np.ndarray,
+        default_left: np.ndarray,
+        value: np.ndarray,
+        base_margin: float,
+        n_features: int,
+        missing: float = np.nan,
+        max_depth: Optional[int] = None,
+        max_cells: int = 1 << 22,
+    ):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.default_left = default_left
+        self.value = value
+        self.base_margin = base_margin
+        self.n_features = n_features
+        self.missing = missing
+        self.n_trees = feature.shape[0]
+        self.max_depth = max_depth if max_depth is not None else self._depth()
+        # Rows per evaluation block, so the (rows, trees) work arrays stay bounded
+        self.max_cells = max_cells
+
+    def _depth(self) -> int:
+        """Depth of the deepest tree (steps from the root to the farthest leaf)."""
+        nodes = np.arange(self.left.shape[1])
+        internal = self.left != nodes
+        trees = np.broadcast_to(np.arange(self.n_trees)[:, None], self.left.shape)[internal]
+        depth = np.zeros(self.left.shape, dtype=np.int32)
+        # Relax child depth = parent depth + 1 until stable (one pass per tree level)
+        for _ in range(self.left.shape[1]):
+            child_depth = depth[internal] + 1
+            new = depth.copy()
+            new[trees, self.left[internal]] = child_depth
+            new[trees, self.right[internal]] = child_depth
+            if np.array_equal(new, depth):
+                break
+            depth = new
+        return int(depth.max())
+
+    # ----------------------------------------------------------------------------------
+    # Evaluation
+    # ----------------------------------------------------------------------------------
+
+    def predict_margin(self, X: np.ndarray) -> np.ndarray:
+        """Raw score (log-odds) for each row of a (n_rows, n_features) matrix."""
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected a (n_rows, {self.n_features}) matrix, got shape {X.shape}.")
+        if not np.isnan(self.missing):
+            X = np.where(X == self.missing, np.float32(np.nan), X)
+
+        out = np.empty(len(X), dtype=np.float64)
+        block = max(1, self.max_cells // max(self.n_trees, 1))
+        for start in range(0, len(X), block):
+            out[start: start + block] = self._margin_block(X[start: start + block])
+        return out
+
+    def _margin_block(self, X: np.ndarray) -> np.ndarray:
+        n_rows = len(X)
+        # (trees, nodes) -> flat, indexed by tree_offset + node
+        feature, threshold = self.feature.reshape(-1), self.threshold.reshape(-1)
+        left, right, default_left = self.left.reshape(-1), self.right.reshape(-1), self.default_left.reshape(-1)
+
+        tree_offset = (np.arange(self.n_trees, dtype=np.int64) * self.feature.shape[1])[None, :]
+        node = np.broadcast_to(tree_offset, (n_rows, self.n_trees)).copy()  # all rows at every root
+        for _ in range(self.max_depth):
+            x = np.take_along_axis(X, feature[node], axis=1)
+            go_left = np.where(np.isnan(x), default_left[node], x < threshold[node])
+            node = tree_offset + np.where(go_left, left[node], right[node])
+
+        return self.base_margin + self.value.reshape(-1)[node].sum(axis=1, dtype=np.float64)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """P(failure) for each row (same as XGBClassifier.predict_proba(X)[:, 1])."""
+        return (1.0 / (1.0 + np.exp(-self.predict_margin(X)))).astype(np.float32)
+
+    def warm_up(self, batch_sizes=(1, 64)) -> None:
+        for n in batch_sizes:
+            self.predict_proba(np.zeros((n, self.n_features), dtype=np.float32))
+
+    # ----------------------------------------------------------------------------------
+    # Persistence
+    # ----------------------------------------------------------------------------------
+
+    def save(self, path: str) -> None:
+        """Write the arrays and scalars to an uncompressed .npz file."""
+        np.savez(
+            path,
+            **{name: getattr(self, name) for name in ARRAY_FIELDS},
+            base_margin=np.float64(self.base_margin),
+            n_features=np.int64(self.n_features),
+            missing=np.float64(self.missing),
+            max_depth=np.int64(self.max_depth),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "TreeEnsemble":
+        with np.load(path) as data:
+            arrays: Dict[str, np.ndarray] = {name: data[name] for name in ARRAY_FIELDS}
+            return cls(
+                **arrays,
+                base_margin=float(data["base_margin"]),
+                n_features=int(data["n_features"]),
+                missing=float(data["missing"]),
+                max_depth=int(data["max_depth"]),
+            )
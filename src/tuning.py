@@ -0,0 +1,300 @@
+"""
+Hyperparameter search for the XGBoost failure model on cached, quantized CV folds.
+
+Replaces the `RandomizedSearchCV` of notebook 04, which rebuilt the input matrix from
+the DataFrame for each of its 20 x 3 fits, trained every fit for all `n_estimators`
+rounds and ran `n_jobs=-1` searches of `n_jobs=-1` models (oversubscribed threads).
+
+- `build_cv_folds` quantizes each stratified CV fold once (`QuantileDMatrix`, the
+  histogram bins `tree_method="hist"` trains on); every trial reuses the same folds.
+- `successive_halving` trains all sampled configurations for a small number of rounds,
+  keeps the best 1/eta by mean validation aucpr and continues the survivors from where
+  they stopped (no retraining) with eta times the rounds, up to `max_rounds`. Each fold
+  stops early once validation aucpr has not improved for `early_stopping_rounds`.
+- Cores are split explicitly: `n_parallel` (trial, fold) fits run at once on a thread
+  pool (XGBoost releases the GIL), each with `nthread = cpus // n_parallel`.
+
+A continued booster matches one trained in a single call, except that row / column
+subsampling draws a new random sequence when training resumes.
+
+Scores of configurations trained for fewer rounds are only used to rank them against
+each other within a rung; the best configuration is chosen among those that reached
+the last rung.
+"""
+
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+BASE_PARAMS = {
+    "objective": "binary:logistic",
+    "eval_metric": "aucpr",
+    "tree_method": "hist",
+    "seed": 42,
+}
+
+
+def available_cpus() -> int:
+    """CPUs available to this process."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def split_cores(n_parallel: Optional[int] = None, cpus: Optional[int] = None) -> Tuple[int, int]:
+    """
+    (parallel fits, threads per fit) with parallel x threads <= cpus.
+
+    Default: 2 threads per fit (small folds gain little from more threads per model,
+    and parallel fits keep every core busy between XGBoost's per-round sync points).
+    """
+    cpus = cpus or available_cpus()
+    if n_parallel is None:
+        n_parallel = max(1, cpus // 2)
+    n_parallel = max(1, min(n_parallel, cpus))
+    return n_parallel, max(1, cpus // n_parallel)
+
+
+def default_search_space(y: np.ndarray) -> Dict[str, List]:
+    """Notebook 04's search space; the number of rounds is left to halving + early stopping."""
+    y = np.asarray(y)
+    scale_pos_weight = float((y == 0).sum() / max((y == 1).sum(), 1))
+    return {
+        "max_depth": [3, 4, 5, 6],
+        "learning_rate": [0.01, 0.03, 0.05, 0.1],
+        "subsample": [0.7, 0.8, 0.9, 1.0],
+        "colsample_bytree": [0.6, 0.7, 0.8, 1.0],
+        "min_child_weight": [1, 3, 5, 7],
+        "scale_pos_weight": [scale_pos_weight * 0.5, scale_pos_weight, scale_pos_weight * 1.5],
+    }
+
+
+def sample_configurations(space: Dict[str, List], n_configs: int, seed: int = 42) -> List[Dict]:
+    """
+    Up to `n_configs` distinct random configurations from a grid of candidate values
+    (all of them if the grid is smaller).
+    """
+    names = sorted(space)
+    sizes = [len(space[name]) for name in names]
+    n_total = int(np.prod(sizes))
+    rng = np.random.default_rng(seed)
+    flat = rng.choice(n_total, size=min(n_configs, n_total), replace=False)
+
+    configs = []
+    for index in flat:
+        config = {}
+        for name, size in zip(reversed(names), reversed(sizes)):
+            index, position = divmod(int(index), size)
+            value = space[name][position]
+            config[name] = value.item() if isinstance(value, np.generic) else value
+        configs.append({name: config[name] for name in names})
+    return configs
+
+
+class CVFold:
+    """
+    One stratified CV split, quantized once: training and validation DMatrix, and the
+    `max_bin` they were quantized with (training on them must use the same value).
+    """
+
+    def __init__(self, dtrain, dvalid, n_train: int, n_valid: int, max_bin: int = 256):
+        self.dtrain = dtrain
+        self.dvalid = dvalid
+        self.n_train = n_train
+        self.n_valid = n_valid
+        self.max_bin = max_bin
+
+
+def build_cv_folds(
+    X,
+    y,
+    n_splits: int = 3,
+    max_bin: int = 256,
+    nthread: Optional[int] = None,
+    seed: int = 42,
+) -> List[CVFold]:
+    """
+    Stratified K-fold splits of (X, y) as `QuantileDMatrix` pairs.
+
+    The validation matrix of each fold uses the training matrix's bin edges (ref=),
+    as XGBoost requires for evaluation during training. The float32 copies of the
+    fold rows are dropped once quantized, so the folds hold ~1 byte per cell.
+    """
+    import xgboost as xgb
+    from sklearn.model_selection import StratifiedKFold
+
+    X = np.ascontiguousarray(np.asarray(X, dtype=np.float32))
+    y = np.asarray(y).astype(np.int32)
+    nthread = nthread or available_cpus()
+
+    folds = []
+    splitter = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=seed)
+    for train_idx, valid_idx in splitter.split(X, y):
+        dtrain = xgb.QuantileDMatrix(X[train_idx], label=y[train_idx], max_bin=max_bin, nthread=nthread)
+        dvalid = xgb.QuantileDMatrix(X[valid_idx], label=y[valid_idx], ref=dtrain, max_bin=max_bin,
+                                     nthread=nthread)
+        folds.append(CVFold(dtrain, dvalid, len(train_idx), len(valid_idx), max_bin))
+    return folds
+
+
+class Trial:
+    """A configuration with one booster and its validation aucpr history per fold."""
+
+    def __init__(self, trial_id: int, params: Dict, n_folds: int):
+        self.trial_id = trial_id
+        self.params = params
+        self.boosters = [None] * n_folds
+        self.history: List[List[float]] = [[] for _ in range(n_folds)]
+        self.rung = 0
+
+    def fold_stopped(self, fold: int, early_stopping_rounds: int) -> bool:
+        history = self.history[fold]
+        return bool(history) and len(history) - 1 - int(np.argmax(history)) >= early_stopping_rounds
+
+    @property
+    def rounds(self) -> int:
+        return max(len(h) for h in self.history)
+
+    @property
+    def score(self) -> float:
+        """Mean over folds of the best validation aucpr so far."""
+        return float(np.mean([max(h) if h else 0.0 for h in self.history]))
+
+    @property
+    def best_rounds(self) -> int:
+        """Mean over folds of the number of rounds at the best validation aucpr."""
+        return int(round(np.mean([int(np.argmax(h)) + 1 if h else 0 for h in self.history])))
+
+    def summary(self) -> Dict:
+        return {
+            "trial_id": self.trial_id,
+            "params": self.params,
+            "rung": self.rung,
+            "rounds_trained": self.rounds,
+            "best_rounds": self.best_rounds,
+            "cv_aucpr": self.score,
+            "fold_aucpr": [max(h) if h else None for h in self.history],
+        }
+
+
+def _train_fold(trial: Trial, fold_index: int, fold: CVFold, target_rounds: int,
+                early_stopping_rounds: int, nthread: int) -> None:
+    """Continue one (trial, fold) booster up to `target_rounds` rounds in total."""
+    import xgboost as xgb
+
+    extra_rounds = target_rounds - len(trial.history[fold_index])
+    if extra_rounds <= 0 or trial.fold_stopped(fold_index, early_stopping_rounds):
+        return
+
+    evals_result: Dict = {}
+    trial.boosters[fold_index] = xgb.train(
+        {**BASE_PARAMS, **trial.params, "max_bin": fold.max_bin, "nthread": nthread},
+        fold.dtrain,
+        num_boost_round=extra_rounds,
+        evals=[(fold.dvalid, "valid")],
+        early_stopping_rounds=early_stopping_rounds,
+        evals_result=evals_result,
+        xgb_model=trial.boosters[fold_index],
+        verbose_eval=False,
+    )
+    trial.history[fold_index].extend(float(v) for v in evals_result["valid"]["aucpr"])
+
+
+def rung_rounds(min_rounds: int, max_rounds: int, eta: int) -> List[int]:
+    """Total boosting rounds at each rung: min_rounds, min_rounds * eta, ..., max_rounds."""
+    rounds = [min_rounds]
+    while rounds[-1] < max_rounds:
+        rounds.append(min(rounds[-1] * eta, max_rounds))
+    return rounds
+
+
+def successive_halving(
+    folds: List[CVFold],
+    configs: List[Dict],
+    min_rounds: int = 10,
+    max_rounds: int = 1000,
+    eta: int = 3,
+    early_stopping_rounds: int = 50,
+    n_parallel: Optional[int] = None,
+    cpus: Optional[int] = None,
+    verbose: bool = True,
+) -> Dict:
+    """
+    Search `configs` on the cached `folds` (see module docstring).
+
+    Returns {"best_params", "best_rounds", "best_cv_aucpr", "trials", "rungs",
+    "n_parallel", "nthread", "elapsed_s"}; "trials" holds one summary per
+    configuration, best first.
+    """
+    n_parallel, nthread = split_cores(n_parallel, cpus)
+    trials = [Trial(i, params, len(folds)) for i, params in enumerate(configs)]
+    survivors = list(trials)
+    schedule = rung_rounds(min_rounds, max_rounds, eta)
+    rungs = []
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=n_parallel) as pool:
+        for rung, target_rounds in enumerate(schedule):
+            jobs = [
+                pool.submit(_train_fold, trial, i, fold, target_rounds, early_stopping_rounds, nthread)
+                for trial in survivors
+                for i, fold in enumerate(folds)
+            ]
+            for job in jobs:
+                job.result()
+            for trial in survivors:
+                trial.rung = rung
+
+            survivors.sort(key=lambda t: t.score, reverse=True)
+            rungs.append({
+                "rung": rung,
+                "rounds": target_rounds,
+                "configs": len(survivors),
+                "best_cv_aucpr": survivors[0].score,
+                "elapsed_s": time.perf_counter() - start,
+            })
+            if verbose:
+                print(f"  rung {rung}: {len(survivors):>4} configs x {len(folds)} folds @ {target_rounds:>5} rounds  "
+                      f"best cv aucpr={survivors[0].score:.4f}  ({time.perf_counter() - start:.1f}s)")
+            if rung < len(schedule) - 1:
+                survivors = survivors[: max(1, math.ceil(len(survivors) / eta))]
+
+    ranked = sorted(trials, key=lambda t: (t.rung, t.score), reverse=True)
+    best = ranked[0]
+    return {
+        "best_params": best.params,
+        "best_rounds": best.best_rounds,
+        "best_cv_aucpr": best.score,
+        "trials": [t.summary() for t in ranked],
+        "rungs": rungs,
+        "n_parallel": n_parallel,
+        "nthread": nthread,
+        "elapsed_s": time.perf_counter() - start,
+    }
+
+
+def fit_tuned_model(X, y, params: Dict, n_estimators: int, n_jobs: Optional[int] = None,
+                    max_bin: int = 256):
+    """
+    Final `XGBClassifier` on all training rows with the tuned params and round count,
+    binned with the `max_bin` of the CV folds the params were tuned on.
+    Pass X as a DataFrame to keep the feature names on the model, like notebook 04.
+    """
+    from xgboost import XGBClassifier
+
+    model = XGBClassifier(
+        objective="binary:logistic",
+        eval_metric="aucpr",
+        tree_method="hist",
+        max_bin=max_bin,
+        n_estimators=n_estimators,
+        n_jobs=n_jobs or available_cpus(),
+        random_state=42,
+        **params,
+    )
+    model.fit(X, np.asarray(y).astype(int))
+    return model